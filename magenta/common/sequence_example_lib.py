@@ -44,6 +44,80 @@ def make_sequence_example(inputs, labels):
   return tf.train.SequenceExample(feature_lists=feature_lists)
 
 
+def make_compact_sequence_example(input_indices, labels, dense_inputs=None):
+  """Returns a compact SequenceExample for the given one-hot inputs and labels.
+
+  Instead of storing each input vector in full, only the indices of its one-hot
+  entries are stored, along with any dense features that follow them. An input
+  vector of size `input_size` with `num_dense` dense features is then
+  expanded as a vector of size `input_size - num_dense` that is 1.0 at each
+  index and 0.0 elsewhere, followed by the dense features. `get_padded_batch`
+  does this expansion in the graph.
+
+  Args:
+    input_indices: A list of index lists, one per step. Each index list has the
+        same length and contains distinct indices of one-hot entries.
+    labels: A list of ints.
+    dense_inputs: An optional list of dense feature vectors, one per step. Each
+        dense feature vector is a list of floats with the same length.
+
+  Returns:
+    A tf.train.SequenceExample containing input indices, dense inputs, and
+    labels.
+  """
+  index_features = [
+      tf.train.Feature(int64_list=tf.train.Int64List(value=indices))
+      for indices in input_indices]
+  label_features = [
+      tf.train.Feature(int64_list=tf.train.Int64List(value=[label]))
+      for label in labels]
+  feature_list = {
+      'input_indices': tf.train.FeatureList(feature=index_features),
+      'labels': tf.train.FeatureList(feature=label_features)
+  }
+  if dense_inputs is not None:
+    feature_list['dense_inputs'] = tf.train.FeatureList(feature=[
+        tf.train.Feature(float_list=tf.train.FloatList(value=dense_input))
+        for dense_input in dense_inputs])
+  feature_lists = tf.train.FeatureLists(feature_list=feature_list)
+  return tf.train.SequenceExample(feature_lists=feature_lists)
+
+
+def get_compact_input_shape(file_list):
+  """Returns the shape of compact inputs in the given TFRecord files.
+
+  Only the first SequenceExample with at least one step is inspected, so all
+  SequenceExamples in `file_list` are assumed to have the same format.
+
+  Args:
+    file_list: A list of paths to TFRecord files containing SequenceExamples.
+
+  Returns:
+    A tuple (num_indices, num_dense) with the number of one-hot indices and
+    dense features per step if the SequenceExamples were made by
+    `make_compact_sequence_example`, or None if they contain full input
+    vectors or no SequenceExample has any steps.
+  """
+  for tfrecord_file in file_list:
+    for serialized in tf.python_io.tf_record_iterator(tfrecord_file):
+      feature_list = tf.train.SequenceExample.FromString(
+          serialized).feature_lists.feature_list
+      if 'input_indices' not in feature_list:
+        if feature_list['inputs'].feature:
+          return None
+        continue
+      if not feature_list['input_indices'].feature:
+        continue
+      num_indices = len(
+          feature_list['input_indices'].feature[0].int64_list.value)
+      num_dense = 0
+      if 'dense_inputs' in feature_list:
+        num_dense = len(
+            feature_list['dense_inputs'].feature[0].float_list.value)
+      return num_indices, num_dense
+  return None
+
+
 def _shuffle_inputs(input_tensors, capacity, min_after_dequeue, num_threads):
   """Shuffles tensors in `input_tensors`, maintaining grouping."""
   shuffle_queue = tf.RandomShuffleQueue(
@@ -76,6 +150,10 @@ def get_padded_batch(file_list, batch_size, input_size,
         SequenceExamples.
     shuffle: Whether to shuffle the batches.
 
+  SequenceExamples made by `make_compact_sequence_example` are detected with
+  `get_compact_input_shape` and their inputs are expanded to full input vectors
+  before batching.
+
   Returns:
     inputs: A tensor of shape [batch_size, num_steps, input_size] of floats32s.
     labels: A tensor of shape [batch_size, num_steps] of int64s.
@@ -88,15 +166,34 @@ def get_padded_batch(file_list, batch_size, input_size,
   reader = tf.TFRecordReader()
   _, serialized_example = reader.read(file_queue)
 
-  sequence_features = {
-      'inputs': tf.FixedLenSequenceFeature(shape=[input_size],
-                                           dtype=tf.float32),
-      'labels': tf.FixedLenSequenceFeature(shape=[],
-                                           dtype=tf.int64)}
+  compact_input_shape = get_compact_input_shape(file_list)
+  if compact_input_shape is None:
+    sequence_features = {
+        'inputs': tf.FixedLenSequenceFeature(shape=[input_size],
+                                             dtype=tf.float32),
+        'labels': tf.FixedLenSequenceFeature(shape=[],
+                                             dtype=tf.int64)}
+  else:
+    num_indices, num_dense = compact_input_shape
+    sequence_features = {
+        'input_indices': tf.FixedLenSequenceFeature(shape=[num_indices],
+                                                    dtype=tf.int64),
+        'labels': tf.FixedLenSequenceFeature(shape=[],
+                                             dtype=tf.int64)}
+    if num_dense:
+      sequence_features['dense_inputs'] = tf.FixedLenSequenceFeature(
+          shape=[num_dense], dtype=tf.float32)
 
   _, sequence = tf.parse_single_sequence_example(
       serialized_example, sequence_features=sequence_features)
 
+  if compact_input_shape is not None:
+    inputs = tf.reduce_sum(
+        tf.one_hot(sequence['input_indices'], input_size - num_dense), axis=1)
+    if num_dense:
+      inputs = tf.concat([inputs, sequence['dense_inputs']], 1)
+    sequence['inputs'] = inputs
+
   length = tf.shape(sequence['inputs'])[0]
   input_tensors = [sequence['inputs'], sequence['labels'], length]
 
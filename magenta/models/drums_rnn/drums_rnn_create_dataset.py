@@ -35,7 +35,8 @@ from magenta.protobuf import music_pb2
 
 FLAGS = tf.app.flags.FLAGS
 tf.app.flags.DEFINE_string('input', None,
-                           'TFRecord to read NoteSequence protos from.')
+                           'TFRecord to read NoteSequence protos from, or a '
+                           'glob pattern of TFRecord shards.')
 tf.app.flags.DEFINE_string('output_dir', None,
                            'Directory to write training and eval TFRecord '
                            'files. The TFRecord files are populated with '
@@ -67,8 +68,10 @@ def get_pipeline(config, eval_ratio):
   for mode in ['eval', 'training']:
     time_change_splitter = note_sequence_pipelines.TimeChangeSplitter(
         name='TimeChangeSplitter_' + mode)
+    # The quantizer is the only consumer of the splitter's outputs.
     quantizer = note_sequence_pipelines.Quantizer(
-        steps_per_quarter=config.steps_per_quarter, name='Quantizer_' + mode)
+        steps_per_quarter=config.steps_per_quarter, owns_input=True,
+        name='Quantizer_' + mode)
     drums_extractor = drum_pipelines.DrumsExtractor(
         min_bars=7, max_steps=512, gap_bars=1.0, name='DrumsExtractor_' + mode)
     encoder_pipeline = encoder_decoder.EncoderPipeline(
@@ -95,7 +98,8 @@ def main(unused_argv):
   FLAGS.output_dir = os.path.expanduser(FLAGS.output_dir)
   pipeline.run_pipeline_serial(
       pipeline_instance,
-      pipeline.tf_record_iterator(FLAGS.input, pipeline_instance.input_type),
+      pipeline.sharded_tf_record_iterator(
+          FLAGS.input, pipeline_instance.input_type),
       FLAGS.output_dir)
 
 
@@ -13,6 +13,8 @@
 # limitations under the License.
 """Tests for melody_rnn_create_dataset."""
 
+import time
+
 # internal imports
 import tensorflow as tf
 import magenta
@@ -75,5 +77,44 @@ class MelodyRNNPipelineTest(tf.test.TestCase):
     self.assertEqual(expected_result, result)
 
 
+class MelodyRNNPipelineBenchmark(tf.test.Benchmark):
+  """Measures the per-input cost of output validation in the dataset DAG."""
+
+  def _run(self, max_validated_inputs, num_inputs=20):
+    config = melody_rnn_model.MelodyRnnConfig(
+        None,
+        magenta.music.OneHotEventSequenceEncoderDecoder(
+            magenta.music.MelodyOneHotEncoding(0, 127)),
+        tf.contrib.training.HParams(),
+        min_note=0,
+        max_note=127,
+        transpose_to_key=0)
+    note_sequence = music_pb2.NoteSequence()
+    note_sequence.time_signatures.add(numerator=4, denominator=4)
+    note_sequence.tempos.add(qpm=120)
+    # Many short melodies separated by rests, so the extractor produces many
+    # outputs per input.
+    magenta.music.testing_lib.add_track_to_sequence(
+        note_sequence, 0,
+        [(48 + (i * 7) % 24, 100, i * 0.25 + (i // 64) * 4.0,
+          (i + 1) * 0.25 + (i // 64) * 4.0) for i in range(64 * 100)])
+
+    pipeline_inst = melody_rnn_create_dataset.get_pipeline(
+        config, eval_ratio=0.0)
+    pipeline_inst.max_validated_inputs = max_validated_inputs
+    start = time.time()
+    for _ in range(num_inputs):
+      pipeline_inst.transform(note_sequence)
+    return (time.time() - start) / num_inputs
+
+  def benchmarkValidated(self):
+    self.report_benchmark(
+        name='melody_rnn_dag_validated', iters=1, wall_time=self._run(None))
+
+  def benchmarkTrusted(self):
+    self.report_benchmark(
+        name='melody_rnn_dag_trusted', iters=1, wall_time=self._run(0))
+
+
 if __name__ == '__main__':
   tf.test.main()
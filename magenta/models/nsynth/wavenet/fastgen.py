@@ -20,8 +20,10 @@ Chang, S., Zhang, Y., ... Huang, T. (2017).
 Fast Generation For Convolutional Autoregressive Models, 1-5.
 """
 import os
+import struct
+import threading
 import numpy as np
-from scipy.io import wavfile
+from six.moves import queue
 import tensorflow as tf
 
 from magenta.models.nsynth import utils
@@ -29,25 +31,64 @@ from magenta.models.nsynth.wavenet.h512_bo16 import Config
 from magenta.models.nsynth.wavenet.h512_bo16 import FastGenerationConfig
 
 
-def sample_categorical(pmf):
+# Decoded audio value of each of the 256 mu-law categories.
+MU_LAW_AUDIO_VALUES = utils.inv_mu_law_numpy(np.arange(256) - 128)
+
+
+def sample_categorical(pmf, temperature=1.0, rng=None):
   """Sample from a categorical distribution.
 
+  Samples every row of the batch at once.
+
   Args:
     pmf: Probablity mass function. Output of a softmax over categories.
       Array of shape [batch_size, number of categories]. Rows sum to 1.
+    temperature: Float to divide the log probabilities by before sampling.
+      Greater than 1.0 makes samples more random, less than 1.0 makes them
+      less random. [1.0]
+    rng: A numpy RandomState to draw random values from. If None, the global
+      numpy random state is used. [None]
 
   Returns:
     idxs: Array of size [batch_size, 1]. Integer of category sampled.
+
+  Raises:
+    ValueError: If temperature is not positive.
   """
+  if temperature <= 0:
+    raise ValueError("temperature must be positive, got %s" % temperature)
   if pmf.ndim == 1:
     pmf = np.expand_dims(pmf, 0)
-  batch_size = pmf.shape[0]
+  if temperature != 1.0:
+    with np.errstate(divide="ignore"):
+      logits = np.log(pmf) / temperature
+    pmf = np.exp(logits - np.max(logits, axis=1, keepdims=True))
+    pmf /= np.sum(pmf, axis=1, keepdims=True)
+  if rng is None:
+    rng = np.random
+  batch_size, num_categories = pmf.shape
   cdf = np.cumsum(pmf, axis=1)
-  rand_vals = np.random.rand(batch_size)
-  idxs = np.zeros([batch_size, 1])
-  for i in range(batch_size):
-    idxs[i] = cdf[i].searchsorted(rand_vals[i])
-  return idxs
+  rand_vals = rng.rand(batch_size)
+  # Equivalent to cdf[i].searchsorted(rand_vals[i]) for each row, limited to
+  # the last category in case the cdf rounds to less than 1.
+  idxs = np.sum(cdf < rand_vals[:, np.newaxis], axis=1, keepdims=True)
+  return np.minimum(idxs, num_categories - 1)
+
+
+def sample_audio(pmf, temperature=1.0, rng=None):
+  """Sample mu-law categories and decode them to audio.
+
+  Args:
+    pmf: Probablity mass function over the 256 mu-law categories. Array of
+      shape [batch_size, 256]. Rows sum to 1.
+    temperature: Float to divide the log probabilities by before sampling. [1.0]
+    rng: A numpy RandomState to draw random values from. If None, the global
+      numpy random state is used. [None]
+
+  Returns:
+    audio: Float32 array of size [batch_size, 1]. The sampled audio values.
+  """
+  return MU_LAW_AUDIO_VALUES[sample_categorical(pmf, temperature, rng)]
 
 
 def load_nsynth(batch_size=1, sample_length=64000):
@@ -151,22 +192,136 @@ def load_batch(files, sample_length=64000):
 
 
 def save_batch(batch_audio, batch_save_paths):
+  """Save a batch of audio as float32 WAV files.
+
+  Args:
+    batch_audio: Array of shape [batch_size, num_samples].
+    batch_save_paths: Iterable of output file names.
+  """
   for audio, name in zip(batch_audio, batch_save_paths):
     tf.logging.info("Saving: %s" % name)
-    wavfile.write(name, 16000, audio)
+    writer = WavWriter(name)
+    try:
+      writer.write(audio)
+    finally:
+      writer.close()
+
+
+class WavWriter(object):
+  """Writes a mono float32 WAV file incrementally.
+
+  Each write appends only the new samples and patches the sizes in the header
+  in place. The file layout matches what scipy.io.wavfile.write produces for
+  float32 audio.
+  """
+
+  def __init__(self, path, sample_rate=16000):
+    self._file = open(path, "wb")
+    self._sample_rate = sample_rate
+    self._num_samples = 0
+    self._file.write(self._header())
+
+  def _header(self):
+    data_size = 4 * self._num_samples
+    return b"".join([
+        b"RIFF", struct.pack("<I", 50 + data_size), b"WAVE",
+        # IEEE float format, one channel, 4 bytes per sample.
+        b"fmt ", struct.pack("<IHHIIHHH", 18, 3, 1, self._sample_rate,
+                             4 * self._sample_rate, 4, 32, 0),
+        b"fact", struct.pack("<II", 4, self._num_samples),
+        b"data", struct.pack("<I", data_size)])
+
+  def write(self, samples):
+    """Appends samples to the file.
+
+    Args:
+      samples: 1-D array of audio samples.
+    """
+    self._file.seek(0, os.SEEK_END)
+    self._file.write(np.asarray(samples, dtype="<f4").tobytes())
+    self._num_samples += len(samples)
+    self._file.seek(0)
+    self._file.write(self._header())
+    self._file.flush()
+
+  def close(self):
+    self._file.close()
+
+
+class AsyncBatchWavWriter(object):
+  """Appends a batch of audio to WAV files from a background thread."""
+
+  def __init__(self, save_paths, sample_rate=16000):
+    """Opens a WAV file for each path and starts the writer thread.
+
+    Args:
+      save_paths: Iterable of output file names.
+      sample_rate: Sample rate of the audio. [16000]
+    """
+    self._writers = []
+    for name in save_paths:
+      tf.logging.info("Saving: %s" % name)
+      self._writers.append(WavWriter(name, sample_rate))
+    self._queue = queue.Queue()
+    self._error = None
+    self._thread = threading.Thread(target=self._run)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def _run(self):
+    while True:
+      batch_audio = self._queue.get()
+      if batch_audio is None:
+        return
+      if self._error is not None:
+        continue
+      try:
+        for writer, audio in zip(self._writers, batch_audio):
+          writer.write(audio)
+      except Exception as e:  # pylint: disable=broad-except
+        self._error = e
+
+  def write(self, batch_audio):
+    """Queues new samples to append to each file.
+
+    Args:
+      batch_audio: Array of shape [batch_size, num_samples] with the samples
+        to append, one row per file. It is copied, so it may be modified after
+        this call returns.
+    """
+    self._queue.put(np.array(batch_audio, dtype=np.float32))
+
+  def close(self):
+    """Waits for queued samples to be written and closes the files.
+
+    Raises:
+      Exception: Any exception raised while writing the files.
+    """
+    self._queue.put(None)
+    self._thread.join()
+    for writer in self._writers:
+      writer.close()
+    if self._error is not None:
+      raise self._error
 
 
 def synthesize(encodings,
                save_paths,
                checkpoint_path="model.ckpt-200000",
-               samples_per_save=1000):
+               samples_per_save=1000,
+               temperature=1.0,
+               seed=None):
   """Synthesize audio from an array of embeddings.
 
   Args:
     encodings: Numpy array with shape [batch_size, time, dim].
     save_paths: Iterable of output file names.
     checkpoint_path: Location of the pretrained model. [model.ckpt-200000]
-    samples_per_save: Save files after every amount of generated samples.
+    samples_per_save: Append newly generated samples to the files after every
+      amount of generated samples. The files are written in the background.
+    temperature: Sampling temperature for each audio sample. [1.0]
+    seed: Seed for sampling, or None to use the global numpy random state.
+      [None]
   """
   hop_length = Config().ae_hop_length
   # Get lengths
@@ -174,6 +329,8 @@ def synthesize(encodings,
   encoding_length = encodings.shape[1]
   total_length = encoding_length * hop_length
 
+  rng = np.random.RandomState(seed) if seed is not None else None
+
   session_config = tf.ConfigProto(allow_soft_placement=True)
   with tf.Graph().as_default(), tf.Session(config=session_config) as sess:
     net = load_fastgen_nsynth(batch_size=batch_size)
@@ -186,18 +343,23 @@ def synthesize(encodings,
     # Regenerate the audio file sample by sample
     audio_batch = np.zeros((batch_size, total_length,), dtype=np.float32)
     audio = np.zeros([batch_size, 1])
+    num_saved = 0
 
-    for sample_i in range(total_length):
-      enc_i = sample_i // hop_length
-      pmf = sess.run(
-          [net["predictions"], net["push_ops"]],
-          feed_dict={net["X"]: audio,
-                     net["encoding"]: encodings[:, enc_i, :]})[0]
-      sample_bin = sample_categorical(pmf)
-      audio = utils.inv_mu_law_numpy(sample_bin - 128)
-      audio_batch[:, sample_i] = audio[:, 0]
-      if sample_i % 100 == 0:
-        tf.logging.info("Sample: %d" % sample_i)
-      if sample_i % samples_per_save == 0:
-        save_batch(audio_batch, save_paths)
-  save_batch(audio_batch, save_paths)
+    writer = AsyncBatchWavWriter(save_paths)
+    try:
+      for sample_i in range(total_length):
+        enc_i = sample_i // hop_length
+        pmf = sess.run(
+            [net["predictions"], net["push_ops"]],
+            feed_dict={net["X"]: audio,
+                       net["encoding"]: encodings[:, enc_i, :]})[0]
+        audio = sample_audio(pmf, temperature, rng)
+        audio_batch[:, sample_i] = audio[:, 0]
+        if sample_i % 100 == 0:
+          tf.logging.info("Sample: %d" % sample_i)
+        if sample_i % samples_per_save == 0:
+          writer.write(audio_batch[:, num_saved:sample_i + 1])
+          num_saved = sample_i + 1
+      writer.write(audio_batch[:, num_saved:])
+    finally:
+      writer.close()
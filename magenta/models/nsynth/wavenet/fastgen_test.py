@@ -0,0 +1,126 @@
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for fastgen."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+# internal imports
+
+import numpy as np
+from scipy.io import wavfile
+import tensorflow as tf
+
+from magenta.models.nsynth.wavenet import fastgen
+
+
+class SampleCategoricalTest(tf.test.TestCase):
+
+  def setUp(self):
+    self.pmf = np.tile([[0.2, 0.5, 0.3]], (20000, 1))
+
+  def testDistribution(self):
+    rng = np.random.RandomState(0)
+    idxs = fastgen.sample_categorical(self.pmf, rng=rng)
+    self.assertEqual((20000, 1), idxs.shape)
+    self.assertAllClose([0.2, 0.5, 0.3],
+                        np.bincount(idxs[:, 0], minlength=3) / len(idxs),
+                        atol=0.02)
+
+  def testTemperature(self):
+    rng = np.random.RandomState(0)
+    for temperature in [0.5, 2.0]:
+      # Dividing the log probabilities by the temperature raises the
+      # probabilities to the power 1 / temperature.
+      expected = np.array([0.2, 0.5, 0.3]) ** (1.0 / temperature)
+      expected /= np.sum(expected)
+      idxs = fastgen.sample_categorical(self.pmf, temperature, rng)
+      self.assertAllClose(expected,
+                          np.bincount(idxs[:, 0], minlength=3) / len(idxs),
+                          atol=0.02)
+
+    # A low temperature almost always picks the most likely category.
+    idxs = fastgen.sample_categorical(self.pmf, 0.05, rng)
+    self.assertGreater(np.mean(idxs == 1), 0.99)
+
+  def testSameSamplesForSameSeed(self):
+    idxs = fastgen.sample_categorical(
+        self.pmf, 0.8, np.random.RandomState(1))
+    self.assertAllEqual(
+        idxs,
+        fastgen.sample_categorical(self.pmf, 0.8, np.random.RandomState(1)))
+
+  def testNonPositiveTemperature(self):
+    for temperature in [0.0, -1.0]:
+      with self.assertRaises(ValueError):
+        fastgen.sample_categorical(self.pmf, temperature)
+
+
+class WavWriterTest(tf.test.TestCase):
+
+  def setUp(self):
+    rng = np.random.RandomState(0)
+    self.batch_audio = rng.uniform(-1.0, 1.0, (3, 250)).astype(np.float32)
+
+  def assertMatchesScipy(self, audio, path, sample_rate=16000):
+    expected_path = path + '.expected.wav'
+    wavfile.write(expected_path, sample_rate, audio)
+    with open(expected_path, 'rb') as f:
+      expected = f.read()
+    with open(path, 'rb') as f:
+      self.assertEqual(expected, f.read())
+
+  def testWavWriter(self):
+    path = os.path.join(self.get_temp_dir(), 'wav_writer.wav')
+    writer = fastgen.WavWriter(path, sample_rate=8000)
+    for start, end in [(0, 1), (1, 100), (100, 100), (100, 250)]:
+      writer.write(self.batch_audio[0, start:end])
+    writer.close()
+    self.assertMatchesScipy(self.batch_audio[0], path, sample_rate=8000)
+
+  def testAsyncBatchWavWriter(self):
+    paths = [os.path.join(self.get_temp_dir(), 'async_%d.wav' % i)
+             for i in range(len(self.batch_audio))]
+    writer = fastgen.AsyncBatchWavWriter(paths)
+    batch_audio = np.zeros_like(self.batch_audio)
+    for start, end in [(0, 1), (1, 120), (120, 250)]:
+      batch_audio[:, start:end] = self.batch_audio[:, start:end]
+      writer.write(batch_audio[:, start:end])
+      # The queued samples are copies, so the buffer can be reused.
+      batch_audio[:, start:end] = 0.0
+    writer.close()
+    for audio, path in zip(self.batch_audio, paths):
+      self.assertMatchesScipy(audio, path)
+
+  def testAsyncBatchWavWriterRaisesWriteError(self):
+    paths = [os.path.join(self.get_temp_dir(), 'async_error.wav')]
+    writer = fastgen.AsyncBatchWavWriter(paths)
+    writer._writers[0].close()
+    writer.write(self.batch_audio[:1])
+    with self.assertRaises(ValueError):
+      writer.close()
+
+  def testSaveBatch(self):
+    paths = [os.path.join(self.get_temp_dir(), 'save_batch_%d.wav' % i)
+             for i in range(len(self.batch_audio))]
+    fastgen.save_batch(self.batch_audio, paths)
+    for audio, path in zip(self.batch_audio, paths):
+      self.assertMatchesScipy(audio, path)
+
+
+if __name__ == '__main__':
+  tf.test.main()
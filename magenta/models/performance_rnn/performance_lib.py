@@ -41,7 +41,14 @@ MAX_SHIFT_STEPS = 100
 
 
 class PerformanceEvent(object):
-  """Class for storing events in a performance."""
+  """Class for storing events in a performance.
+
+  Performance events are immutable, and there are only a few hundred distinct
+  ones, so they are interned: constructing a PerformanceEvent with the same
+  type and value as an existing one returns the existing object.
+  """
+
+  __slots__ = ('event_type', 'event_value')
 
   # Start of a new note.
   NOTE_ON = 1
@@ -52,7 +59,15 @@ class PerformanceEvent(object):
   # Change current velocity.
   VELOCITY = 4
 
-  def __init__(self, event_type, event_value):
+  # Interned events, keyed by (event_type, event_value).
+  _interned = {}
+
+  def __new__(cls, event_type, event_value):
+    try:
+      return cls._interned[(event_type, event_value)]
+    except KeyError:
+      pass
+
     if not PerformanceEvent.NOTE_ON <= event_type <= PerformanceEvent.VELOCITY:
       raise ValueError('Invalid event type: %s' % event_type)
 
@@ -67,8 +82,22 @@ class PerformanceEvent(object):
       if not 1 <= event_value <= MAX_NUM_VELOCITY_BINS:
         raise ValueError('Invalid velocity value: %s' % event_value)
 
-    self.event_type = event_type
-    self.event_value = event_value
+    event = super(PerformanceEvent, cls).__new__(cls)
+    object.__setattr__(event, 'event_type', event_type)
+    object.__setattr__(event, 'event_value', event_value)
+    return cls._interned.setdefault((event_type, event_value), event)
+
+  def __setattr__(self, name, value):
+    raise AttributeError('PerformanceEvent is immutable')
+
+  def __reduce__(self):
+    return PerformanceEvent, (self.event_type, self.event_value)
+
+  def __copy__(self):
+    return self
+
+  def __deepcopy__(self, unused_memo):
+    return self
 
   def __repr__(self):
     return 'PerformanceEvent(%r, %r)' % (self.event_type, self.event_value)
@@ -79,6 +108,12 @@ class PerformanceEvent(object):
     return (self.event_type == other.event_type and
             self.event_value == other.event_value)
 
+  def __ne__(self, other):
+    return not self == other
+
+  def __hash__(self):
+    return hash((self.event_type, self.event_value))
+
 
 class Performance(events_lib.EventSequence):
   """Stores a polyphonic sequence as a stream of performance events.
@@ -123,6 +158,9 @@ class Performance(events_lib.EventSequence):
       self._events = []
       self._steps_per_second = steps_per_second
 
+    # The number of steps is kept up to date as events are added and removed.
+    self._num_steps = self._count_steps(self._events)
+
     self._start_step = start_step
     self._num_velocity_bins = num_velocity_bins
 
@@ -134,8 +172,15 @@ class Performance(events_lib.EventSequence):
   def steps_per_second(self):
     return self._steps_per_second
 
+  @staticmethod
+  def _count_steps(events):
+    """Returns the total number of steps shifted by the given events."""
+    return sum(event.event_value for event in events
+               if event.event_type == PerformanceEvent.TIME_SHIFT)
+
   def _append_steps(self, num_steps):
     """Adds steps to the end of the sequence."""
+    self._num_steps += num_steps
     if (self._events and
         self._events[-1].event_type == PerformanceEvent.TIME_SHIFT and
         self._events[-1].event_value < MAX_SHIFT_STEPS):
@@ -174,6 +219,7 @@ class Performance(events_lib.EventSequence):
           self._events.pop()
       else:
         self._events.pop()
+    self._num_steps -= steps_trimmed
 
   def set_length(self, steps, from_left=False):
     """Sets the length of the sequence to the specified number of steps.
@@ -208,6 +254,8 @@ class Performance(events_lib.EventSequence):
     if not isinstance(event, PerformanceEvent):
       raise ValueError('Invalid performance event: %s' % event)
     self._events.append(event)
+    if event.event_type == PerformanceEvent.TIME_SHIFT:
+      self._num_steps += event.event_value
 
   def truncate(self, num_events):
     """Truncates this Performance to the specified number of events.
@@ -216,6 +264,7 @@ class Performance(events_lib.EventSequence):
       num_events: The number of events to which this performance will be
           truncated.
     """
+    self._num_steps -= self._count_steps(self._events[num_events:])
     self._events = self._events[:num_events]
 
   def __len__(self):
@@ -260,11 +309,7 @@ class Performance(events_lib.EventSequence):
     Returns:
       Length of the sequence in quantized steps.
     """
-    steps = 0
-    for event in self:
-      if event.event_type == PerformanceEvent.TIME_SHIFT:
-        steps += event.event_value
-    return steps
+    return self._num_steps
 
   @staticmethod
   def _from_quantized_sequence(quantized_sequence, start_step=0,
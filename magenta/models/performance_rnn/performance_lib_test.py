@@ -13,6 +13,9 @@
 # limitations under the License.
 """Tests for performance_lib."""
 
+import copy
+import pickle
+
 # internal imports
 import tensorflow as tf
 
@@ -296,6 +299,46 @@ class PerformanceLibTest(tf.test.TestCase):
 
     self.assertEqual(100, performance.num_steps)
 
+  def testNumStepsTracksChanges(self):
+    pe = performance_lib.PerformanceEvent
+    testing_lib.add_track_to_sequence(
+        self.note_sequence, 0,
+        [(60, 100, 0.0, 4.0), (64, 100, 0.0, 3.0), (67, 100, 1.0, 2.0)])
+    quantized_sequence = sequences_lib.quantize_note_sequence_absolute(
+        self.note_sequence, steps_per_second=100)
+    performance = performance_lib.Performance(quantized_sequence)
+    self.assertEqual(400, performance.num_steps)
+
+    performance.append(pe(pe.NOTE_ON, 72))
+    performance.append(pe(pe.TIME_SHIFT, 25))
+    self.assertEqual(425, performance.num_steps)
+
+    performance.set_length(560)
+    self.assertEqual(560, performance.num_steps)
+    performance.set_length(430)
+    self.assertEqual(430, performance.num_steps)
+
+    performance.truncate(5)
+    self.assertEqual(200, performance.num_steps)
+
+    copied_performance = copy.deepcopy(performance)
+    copied_performance.append(pe(pe.TIME_SHIFT, 10))
+    self.assertEqual(210, copied_performance.num_steps)
+    self.assertEqual(200, performance.num_steps)
+
+  def testInternedEvents(self):
+    pe = performance_lib.PerformanceEvent
+    event = pe(pe.TIME_SHIFT, 10)
+    self.assertIs(event, pe(event_type=pe.TIME_SHIFT, event_value=10))
+    self.assertIs(event, copy.deepcopy(event))
+    self.assertIs(event, pickle.loads(pickle.dumps(event)))
+    self.assertNotEqual(event, pe(pe.TIME_SHIFT, 11))
+    self.assertEqual(hash(event), hash(pe(pe.TIME_SHIFT, 10)))
+    with self.assertRaises(AttributeError):
+      event.event_value = 11
+    with self.assertRaises(ValueError):
+      pe(pe.TIME_SHIFT, performance_lib.MAX_SHIFT_STEPS + 1)
+
   def testExtractPerformances(self):
     testing_lib.add_track_to_sequence(
         self.note_sequence, 0, [(60, 100, 0.0, 4.0)])
@@ -19,15 +19,23 @@ import tensorflow as tf
 import magenta
 
 from magenta.models.performance_rnn import performance_encoder_decoder
+from magenta.models.performance_rnn import performance_lib
 from magenta.models.shared import events_rnn_model
 
 
+def _time_shift_steps(event):
+  """Returns the number of quantized steps a performance event shifts time."""
+  if event.event_type == performance_lib.PerformanceEvent.TIME_SHIFT:
+    return event.event_value
+  return 0
+
+
 class PerformanceRnnModel(events_rnn_model.EventSequenceRnnModel):
   """Class for RNN performance generation models."""
 
   def generate_performance(
       self, num_steps, primer_sequence, temperature=1.0, beam_size=1,
-      branch_factor=1, steps_per_iteration=1):
+      branch_factor=1, steps_per_iteration=1, max_time_steps=None):
     """Generate a performance track from a primer performance track.
 
     Args:
@@ -42,13 +50,18 @@ class PerformanceRnnModel(events_rnn_model.EventSequenceRnnModel):
       branch_factor: An integer, beam search branch factor to use.
       steps_per_iteration: An integer, number of steps to take per beam search
           iteration.
+      max_time_steps: If not None, stop generating once the performance spans
+          this many quantized time steps, including the primer, even if it
+          has fewer than `num_steps` events.
 
     Returns:
       The generated Performance object (which begins with the provided primer
       track).
     """
     return self._generate_events(num_steps, primer_sequence, temperature,
-                                 beam_size, branch_factor, steps_per_iteration)
+                                 beam_size, branch_factor, steps_per_iteration,
+                                 time_steps_fn=_time_shift_steps,
+                                 max_time_steps=max_time_steps)
 
   def performance_log_likelihood(self, sequence):
     """Evaluate the log likelihood of a performance.
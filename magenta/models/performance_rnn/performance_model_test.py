@@ -0,0 +1,138 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks for performance_model."""
+
+import copy
+import time
+
+# internal imports
+import tensorflow as tf
+import magenta
+
+from magenta.models.performance_rnn import performance_encoder_decoder
+from magenta.models.performance_rnn import performance_lib
+from magenta.models.performance_rnn import performance_model
+from magenta.models.shared import events_rnn_model
+
+NUM_STEPS = 2048
+BEAM_SIZE = 8
+BRANCH_FACTOR = 4
+
+
+class PerformanceRnnModelBenchmark(tf.test.Benchmark):
+  """Measures beam search generation of long performances."""
+
+  def _primer(self):
+    primer = performance_lib.Performance(steps_per_second=100)
+    primer.append(performance_lib.PerformanceEvent(
+        performance_lib.PerformanceEvent.NOTE_ON, 60))
+    primer.append(performance_lib.PerformanceEvent(
+        performance_lib.PerformanceEvent.TIME_SHIFT, 10))
+    return primer
+
+  def _branch(self, branch_fn):
+    """Times branching the beam as it grows to NUM_STEPS events."""
+    event_sequences = [self._primer() for _ in range(BEAM_SIZE)]
+    event = performance_lib.PerformanceEvent(
+        performance_lib.PerformanceEvent.TIME_SHIFT, 1)
+    start = time.time()
+    for _ in range(NUM_STEPS):
+      all_event_sequences = [branch_fn(events)
+                             for events in event_sequences * BRANCH_FACTOR]
+      for events in all_event_sequences:
+        events.append(event)
+      event_sequences = all_event_sequences[:BEAM_SIZE]
+    return time.time() - start
+
+  def benchmarkBranchDeepCopy(self):
+    self.report_benchmark(
+        name='performance_beam_branch_deepcopy', iters=1,
+        wall_time=self._branch(copy.deepcopy))
+
+  def benchmarkBranchShared(self):
+    def fork(events):
+      if not isinstance(events, events_rnn_model._EventSequenceBranch):
+        events = events_rnn_model._EventSequenceBranch(events)
+      return events.fork()
+    self.report_benchmark(
+        name='performance_beam_branch_shared', iters=1,
+        wall_time=self._branch(fork))
+
+  def _model(self, batch_size):
+    """Returns a PerformanceRnnModel with a small, untrained graph."""
+    config = performance_model.PerformanceRnnConfig(
+        None,
+        magenta.music.OneHotEventSequenceEncoderDecoder(
+            performance_encoder_decoder.PerformanceOneHotEncoding()),
+        tf.contrib.training.HParams(
+            batch_size=batch_size,
+            rnn_layer_sizes=[64],
+            dropout_keep_prob=1.0,
+            clip_norm=3,
+            learning_rate=0.001))
+    model = performance_model.PerformanceRnnModel(config)
+    graph = model._build_graph_for_generation()
+    with graph.as_default():
+      model._session = tf.Session()
+      model._session.run(tf.global_variables_initializer())
+    return model
+
+  def benchmarkBeamSearch(self):
+    model = self._model(BEAM_SIZE * BRANCH_FACTOR)
+    start = time.time()
+    model.generate_performance(
+        NUM_STEPS, self._primer(), beam_size=BEAM_SIZE,
+        branch_factor=BRANCH_FACTOR)
+    wall_time = time.time() - start
+    model.close()
+
+    self.report_benchmark(
+        name='performance_beam_search_%d_steps' % NUM_STEPS, iters=1,
+        wall_time=wall_time)
+
+  def _generate_seconds(self, model, seconds, stop_early):
+    """Generates like PerformanceRnnSequenceGenerator, for `seconds` seconds.
+
+    Returns:
+      The wall time and the number of RNN steps taken.
+    """
+    primer = self._primer()
+    max_time_steps = primer.num_steps + seconds * primer.steps_per_second
+    # The sequence generator's guess of 40 RNN steps per second.
+    num_steps = len(primer) + 40 * seconds
+    start = time.time()
+    performance = model.generate_performance(
+        num_steps, primer,
+        max_time_steps=max_time_steps if stop_early else None)
+    return time.time() - start, len(performance) - len(primer)
+
+  def benchmarkTimeStepBudget(self):
+    model = self._model(1)
+    seconds = 30
+    full_time, full_rnn_steps = self._generate_seconds(model, seconds, False)
+    early_time, early_rnn_steps = self._generate_seconds(model, seconds, True)
+    model.close()
+
+    self.report_benchmark(
+        name='performance_generate_%d_seconds' % seconds, iters=1,
+        wall_time=full_time, extras={'rnn_steps': full_rnn_steps})
+    self.report_benchmark(
+        name='performance_generate_%d_seconds_stop_early' % seconds, iters=1,
+        wall_time=early_time,
+        extras={'rnn_steps': early_rnn_steps,
+                'rnn_steps_saved': full_rnn_steps - early_rnn_steps})
+
+
+if __name__ == '__main__':
+  tf.test.main()
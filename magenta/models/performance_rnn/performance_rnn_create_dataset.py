@@ -37,7 +37,8 @@ from magenta.protobuf import music_pb2
 
 FLAGS = tf.app.flags.FLAGS
 tf.app.flags.DEFINE_string('input', None,
-                           'TFRecord to read NoteSequence protos from.')
+                           'TFRecord to read NoteSequence protos from, or a '
+                           'glob pattern of TFRecord shards.')
 tf.app.flags.DEFINE_string('output_dir', None,
                            'Directory to write training and eval TFRecord '
                            'files. The TFRecord files are populated with '
@@ -46,6 +47,10 @@ tf.app.flags.DEFINE_string('config', 'performance', 'The config to use')
 tf.app.flags.DEFINE_float('eval_ratio', 0.1,
                           'Fraction of input to set aside for eval set. '
                           'Partition is randomly selected.')
+tf.app.flags.DEFINE_boolean('compact_inputs', False,
+                            'If true, store the one-hot inputs of each '
+                            'SequenceExample as class indices rather than as '
+                            'full input vectors.')
 tf.app.flags.DEFINE_string('log', 'INFO',
                            'The threshold for what messages will be logged '
                            'DEBUG, INFO, WARN, ERROR, or FATAL.')
@@ -73,7 +78,8 @@ class PerformanceExtractor(pipeline.Pipeline):
     return performances
 
 
-def get_pipeline(config, min_events, max_events, eval_ratio):
+def get_pipeline(config, min_events, max_events, eval_ratio,
+                 compact_inputs=False):
   """Returns the Pipeline instance which creates the RNN dataset.
 
   Args:
@@ -81,6 +87,7 @@ def get_pipeline(config, min_events, max_events, eval_ratio):
     min_events: Minimum number of events for an extracted sequence.
     max_events: Maximum number of events for an extracted sequence.
     eval_ratio: Fraction of input to set aside for evaluation set.
+    compact_inputs: If True, output SequenceExamples with compact inputs.
 
   Returns:
     A pipeline.Pipeline instance.
@@ -104,8 +111,10 @@ def get_pipeline(config, min_events, max_events, eval_ratio):
         stretch_factors, name='StretchPipeline_' + mode)
     splitter = note_sequence_pipelines.Splitter(
         hop_size_seconds=30.0, name='Splitter_' + mode)
+    # The quantizer is the only consumer of the splitter's outputs.
     quantizer = note_sequence_pipelines.Quantizer(
-        steps_per_second=config.steps_per_second, name='Quantizer_' + mode)
+        steps_per_second=config.steps_per_second, owns_input=True,
+        name='Quantizer_' + mode)
     transposition_pipeline = note_sequence_pipelines.TranspositionPipeline(
         transposition_range, name='TranspositionPipeline_' + mode)
     perf_extractor = PerformanceExtractor(
@@ -114,7 +123,7 @@ def get_pipeline(config, min_events, max_events, eval_ratio):
         name='PerformanceExtractor_' + mode)
     encoder_pipeline = encoder_decoder.EncoderPipeline(
         performance_lib.Performance, config.encoder_decoder,
-        name='EncoderPipeline_' + mode)
+        name='EncoderPipeline_' + mode, compact=compact_inputs)
 
     dag[sustain_pipeline] = partitioner[mode + '_performances']
     dag[stretch_pipeline] = sustain_pipeline
@@ -135,13 +144,15 @@ def main(unused_argv):
       min_events=32,
       max_events=512,
       eval_ratio=FLAGS.eval_ratio,
+      compact_inputs=FLAGS.compact_inputs,
       config=performance_model.default_configs[FLAGS.config])
 
   input_dir = os.path.expanduser(FLAGS.input)
   output_dir = os.path.expanduser(FLAGS.output_dir)
   pipeline.run_pipeline_serial(
       pipeline_instance,
-      pipeline.tf_record_iterator(input_dir, pipeline_instance.input_type),
+      pipeline.sharded_tf_record_iterator(
+          input_dir, pipeline_instance.input_type),
       output_dir)
 
 
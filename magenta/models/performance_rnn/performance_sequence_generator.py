@@ -153,8 +153,11 @@ class PerformanceRnnSequenceGenerator(mm.BaseSequenceGenerator):
       tf.logging.info(
           'Need to generate %d more steps for this sequence, will try asking '
           'for %d RNN steps' % (steps_to_gen, rnn_steps_to_gen))
+      # Stop as soon as the generate section is filled, rather than always
+      # generating all the requested RNN steps.
       performance = self._model.generate_performance(
-          len(performance) + rnn_steps_to_gen, performance, **args)
+          len(performance) + rnn_steps_to_gen, performance,
+          max_time_steps=total_steps, **args)
 
       if not self.fill_generate_section:
         # In the interest of speed just go through this loop once, which may not
@@ -0,0 +1,386 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Batched generation for concurrent event sequence RNN requests.
+
+An EventSequenceRnnModel generates each request on its own, so when a request
+has fewer event sequences than the model batch size, most of each batch is
+padding. StepBatcher collects the model inputs for generation steps from many
+concurrent requests and packs them into shared model batches, one step at a
+time. BatchingSequenceGenerator wraps a sequence generator so that concurrent
+calls to `generate` from different threads share model batches this way.
+"""
+
+import collections
+import threading
+import time
+
+# internal imports
+
+import numpy as np
+import six
+
+from magenta.common import state_util
+from magenta.models.shared import events_rnn_model
+import magenta.music as mm
+from magenta.pipelines import statistics
+
+# Buckets for the fraction of each model batch holding real model inputs.
+OCCUPANCY_BUCKETS = [0.0, 0.125, 0.25, 0.5, 0.75, 1.0]
+# Buckets for the time in seconds a generation step waits to start running.
+QUEUE_LATENCY_BUCKETS = [0.0, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0]
+
+
+class _StepRequest(object):
+  """A generation step for some event sequences, waiting to be batched.
+
+  Attributes:
+    inputs: A list of model inputs, one per event sequence.
+    initial_states: A list of initial RNN states, one per event sequence.
+    temperature: The softmax temperature.
+    key: Model inputs can only share a batch if they have the same key, the
+        number of input steps and the temperature.
+    final_states: A list of final RNN states, filled in as rows are run.
+    softmax: A list of softmax outputs, filled in as rows are run.
+    next_row: The index of the next row to add to a batch.
+    rows_remaining: The number of rows that have not been run yet.
+    submit_time: The time the step was submitted.
+    start_time: The time the first row of the step started running, or None.
+    error: The exception raised while running a row, or None.
+    done: A threading.Event set once all rows have run or an error occurred.
+  """
+
+  def __init__(self, inputs, initial_states, temperature):
+    self.inputs = inputs
+    self.initial_states = initial_states
+    self.temperature = temperature
+    self.key = (len(inputs[0]), temperature)
+    self.final_states = [None] * len(inputs)
+    self.softmax = [None] * len(inputs)
+    self.next_row = 0
+    self.rows_remaining = len(inputs)
+    self.submit_time = time.time()
+    self.start_time = None
+    self.error = None
+    self.done = threading.Event()
+
+
+class StepBatcher(object):
+  """Packs generation steps from concurrent requests into shared batches.
+
+  Each call to `run_steps` submits one row per event sequence and blocks until
+  they have all run. A single worker thread takes pending rows in the order
+  they were submitted and runs them in batches of the model batch size. Rows
+  can only share a batch if they have the same number of input steps and the
+  same temperature. Partial batches are padded, but the worker waits up to
+  `max_wait_seconds` for more rows to fill a batch first.
+
+  The batcher keeps statistics on how full each batch is and how long steps
+  wait before they start running.
+  """
+
+  def __init__(self, model, max_wait_seconds=0.005):
+    """Constructs a StepBatcher.
+
+    Args:
+      model: An initialized EventSequenceRnnModel whose model graph outputs a
+          softmax.
+      max_wait_seconds: The maximum time in seconds to wait for more rows to
+          fill a batch before running it.
+    """
+    self._model = model
+    self._max_wait_seconds = max_wait_seconds
+    self._condition = threading.Condition()
+    self._pending = collections.deque()
+    self._worker = None
+    self._closed = False
+
+    self._stats = [
+        statistics.Counter('step_requests'),
+        statistics.Counter('batches'),
+        statistics.Counter('batch_rows'),
+        statistics.Counter('padding_rows'),
+        statistics.Histogram('batch_occupancy', OCCUPANCY_BUCKETS),
+        statistics.Histogram('queue_latency_seconds', QUEUE_LATENCY_BUCKETS)]
+    (self._requests_counter, self._batches_counter, self._rows_counter,
+     self._padding_counter, self._occupancy_histogram,
+     self._latency_histogram) = self._stats
+
+  def get_stats(self):
+    """Returns copies of the batching statistics.
+
+    Returns:
+      A list of statistics.Statistic objects: counts of step requests,
+      batches, batch rows, and padding rows, a histogram of the fraction of
+      each batch holding real rows, and a histogram of how long step requests
+      waited before they started running.
+    """
+    with self._condition:
+      return [stat.copy() for stat in self._stats]
+
+  def run_steps(self, inputs, initial_states, temperature):
+    """Runs the model on the given inputs, sharing batches with other calls.
+
+    Args:
+      inputs: A Python list of model inputs, one per event sequence. All inputs
+          must have the same number of steps.
+      initial_states: A list of structures for the initial RNN states, one for
+          each event sequence.
+      temperature: The softmax temperature.
+
+    Returns:
+      final_states: The final RNN states, a list the same size as
+          `initial_states`.
+      softmax: The softmax output for each input, a 3-D numpy array of shape
+          [len(inputs), num_steps, num_classes].
+
+    Raises:
+      mm.SequenceGeneratorException: If the batcher has been closed.
+      Exception: Any exception raised while running the model.
+    """
+    request = _StepRequest(inputs, initial_states, temperature)
+    with self._condition:
+      if self._closed:
+        raise mm.SequenceGeneratorException('StepBatcher has been closed')
+      if self._worker is None:
+        self._worker = threading.Thread(target=self._run_worker)
+        self._worker.daemon = True
+        self._worker.start()
+      self._pending.append(request)
+      self._requests_counter.increment()
+      self._condition.notify()
+
+    request.done.wait()
+    if request.error is not None:
+      raise request.error
+    return request.final_states, np.array(request.softmax)
+
+  def close(self):
+    """Runs any pending rows and stops the worker thread."""
+    with self._condition:
+      self._closed = True
+      self._condition.notify()
+      worker = self._worker
+    if worker is not None:
+      worker.join()
+
+  def _num_pending_rows(self, key):
+    """Returns the number of rows waiting to run with the given key."""
+    return sum(len(request.inputs) - request.next_row
+               for request in self._pending if request.key == key)
+
+  def _next_batch(self, batch_size):
+    """Waits for pending rows and takes a batch of them.
+
+    Args:
+      batch_size: The maximum number of rows to take.
+
+    Returns:
+      A list of (step request, row index) tuples that share a key, or None if
+      the batcher is closed and there are no pending rows.
+    """
+    with self._condition:
+      while not self._pending:
+        if self._closed:
+          return None
+        self._condition.wait()
+
+      # The oldest pending request decides which rows go into this batch.
+      key = self._pending[0].key
+      deadline = time.time() + self._max_wait_seconds
+      while not self._closed and self._num_pending_rows(key) < batch_size:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+          break
+        self._condition.wait(remaining)
+
+      rows = []
+      for request in list(self._pending):
+        if request.key != key:
+          continue
+        while request.next_row < len(request.inputs) and len(rows) < batch_size:
+          rows.append((request, request.next_row))
+          request.next_row += 1
+        if request.next_row == len(request.inputs):
+          self._pending.remove(request)
+        if len(rows) == batch_size:
+          break
+      return rows
+
+  def _run_worker(self):
+    """Runs batches of pending rows until the batcher is closed."""
+    batch_size = self._model._batch_size()  # pylint: disable=protected-access
+    while True:
+      rows = self._next_batch(batch_size)
+      if rows is None:
+        return
+      self._run_rows(rows, batch_size)
+
+  def _run_rows(self, rows, batch_size):
+    """Runs a batch of rows and hands the results to their step requests.
+
+    Args:
+      rows: A list of (step request, row index) tuples that share a key.
+      batch_size: The model batch size.
+    """
+    start_time = time.time()
+    temperature = rows[0][0].temperature
+    pad_amt = batch_size - len(rows)
+    inputs = [request.inputs[i] for request, i in rows]
+    initial_states = [request.initial_states[i] for request, i in rows]
+    inputs += [inputs[-1]] * pad_amt
+
+    error = None
+    try:
+      # pylint: disable=protected-access
+      final_state, softmax = self._model._run_batch(
+          inputs, state_util.batch(initial_states, batch_size), temperature)
+      # pylint: enable=protected-access
+      final_states = state_util.unbatch(final_state, batch_size)
+    except Exception as e:  # pylint: disable=broad-except
+      error = e
+
+    with self._condition:
+      self._batches_counter.increment()
+      self._rows_counter.increment(len(rows))
+      self._padding_counter.increment(pad_amt)
+      self._occupancy_histogram.increment(len(rows) / float(batch_size))
+      for request, _ in rows:
+        if request.start_time is None:
+          request.start_time = start_time
+          self._latency_histogram.increment(
+              start_time - request.submit_time)
+
+      for j, (request, i) in enumerate(rows):
+        if request.done.is_set():
+          continue
+        if error is not None:
+          # Give up on the whole request; its remaining rows are dropped.
+          request.error = error
+          if request in self._pending:
+            self._pending.remove(request)
+          request.done.set()
+          continue
+        request.final_states[i] = final_states[j]
+        request.softmax[i] = softmax[j]
+        request.rows_remaining -= 1
+        if not request.rows_remaining:
+          request.done.set()
+
+
+class BatchingSequenceGenerator(object):
+  """Serves concurrent generation requests using shared model batches.
+
+  Wraps a sequence generator for an EventSequenceRnnModel. `generate` can be
+  called concurrently from many threads. Each call runs the wrapped generator
+  in its own thread, but the model inputs for each generation step are packed
+  into batches shared with the other calls by a StepBatcher. Each call still
+  returns its own result independently.
+
+  There is no asyncio support in Python 2; asyncio code can call `generate`
+  through `loop.run_in_executor` with a thread pool.
+  """
+
+  def __init__(self, generator, max_wait_seconds=0.005):
+    """Constructs a BatchingSequenceGenerator.
+
+    Args:
+      generator: A BaseSequenceGenerator whose model is an
+          EventSequenceRnnModel with a softmax output. It should not be used
+          directly while wrapped.
+      max_wait_seconds: The maximum time in seconds to wait for more model
+          inputs to fill a batch before running it.
+
+    Raises:
+      mm.SequenceGeneratorException: If the generator's model does not support
+          batched generation.
+    """
+    model = generator._model  # pylint: disable=protected-access
+    if not isinstance(model, events_rnn_model.EventSequenceRnnModel):
+      raise mm.SequenceGeneratorException(
+          'Batched generation requires an EventSequenceRnnModel, got %s' %
+          type(model).__name__)
+    if (six.get_unbound_function(type(model)._generate_step_for_batch) is not
+        six.get_unbound_function(
+            events_rnn_model.EventSequenceRnnModel._generate_step_for_batch)):
+      raise mm.SequenceGeneratorException(
+          'Batched generation does not support %s, which does not generate '
+          'events from a softmax output' % type(model).__name__)
+
+    self._generator = generator
+    self._model = model
+    self._max_wait_seconds = max_wait_seconds
+    self._lock = threading.Lock()
+    self._batcher = None
+
+  @property
+  def details(self):
+    """Returns a GeneratorDetails description of the wrapped generator."""
+    return self._generator.details
+
+  def get_stats(self):
+    """Returns the batching statistics; see StepBatcher.get_stats."""
+    with self._lock:
+      if self._batcher is None:
+        return []
+      return self._batcher.get_stats()
+
+  def initialize(self):
+    """Initializes the wrapped generator and starts batching model steps.
+
+    If already initialized, this is a no-op.
+    """
+    with self._lock:
+      if self._batcher is not None:
+        return
+      self._generator.initialize()
+      self._batcher = StepBatcher(self._model, self._max_wait_seconds)
+      self._model.set_step_batcher(self._batcher)
+
+  def close(self):
+    """Finishes pending model steps and closes the wrapped generator.
+
+    Generation calls still in progress will fail.
+    """
+    with self._lock:
+      if self._batcher is None:
+        return
+      self._batcher.close()
+      self._model.set_step_batcher(None)
+      self._batcher = None
+      self._generator.close()
+
+  def __enter__(self):
+    """When used as a context manager, initializes the generator."""
+    self.initialize()
+    return self
+
+  def __exit__(self, *args):
+    """When used as a context manager, closes the generator."""
+    self.close()
+
+  def generate(self, input_sequence, generator_options):
+    """Generates a sequence, sharing model batches with concurrent calls.
+
+    Also initializes the generator if not yet initialized.
+
+    Args:
+      input_sequence: An input NoteSequence to base the generation on.
+      generator_options: A GeneratorOptions proto with options to use for
+          generation.
+
+    Returns:
+      The generated NoteSequence proto.
+    """
+    self.initialize()
+    return self._generator.generate(input_sequence, generator_options)
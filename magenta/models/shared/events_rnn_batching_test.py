@@ -0,0 +1,237 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for events_rnn_batching."""
+
+import threading
+
+# internal imports
+import numpy as np
+import tensorflow as tf
+import magenta
+
+from magenta.models.shared import events_rnn_batching
+from magenta.models.shared import events_rnn_model
+from magenta.music import testing_lib
+
+
+class MockModel(events_rnn_model.EventSequenceRnnModel):
+  """Model whose softmax is its inputs and whose state counts steps."""
+
+  def __init__(self, batch_size):
+    super(MockModel, self).__init__(None)
+    self.batch_size = batch_size
+    self.batches = []
+
+  def _batch_size(self):
+    return self.batch_size
+
+  def _run_batch(self, inputs, initial_state, temperature):
+    self.batches.append((len(inputs), temperature))
+    inputs = np.array(inputs)
+    return initial_state + inputs.shape[1], inputs / temperature
+
+
+class MockSession(object):
+  """Session whose graph has a single RNN state of zeros."""
+
+  def __init__(self, batch_size):
+    self.graph = self
+    self.batch_size = batch_size
+
+  def get_collection(self, name):
+    return [name]
+
+  def run(self, unused_fetches):
+    return np.zeros([self.batch_size, 1])
+
+
+class CountingModel(events_rnn_model.EventSequenceRnnModel):
+  """Model that deterministically generates events from a step count.
+
+  The RNN state counts the input steps run so far. The softmax for the last
+  step puts all its probability on the class following the last input class,
+  offset by that count, so generation depends on both the inputs and the
+  state of each event sequence.
+  """
+
+  def __init__(self, batch_size, num_classes):
+    super(CountingModel, self).__init__(
+        events_rnn_model.EventSequenceRnnConfig(
+            None,
+            magenta.music.OneHotEventSequenceEncoderDecoder(
+                testing_lib.TrivialOneHotEncoding(num_classes)),
+            None))
+    self._session = MockSession(batch_size)
+    self.batch_size = batch_size
+    self.num_classes = num_classes
+    self.num_batches = 0
+
+  def _batch_size(self):
+    return self.batch_size
+
+  def _run_batch(self, inputs, initial_state, temperature):
+    self.num_batches += 1
+    inputs = np.array(inputs)
+    final_state = initial_state + inputs.shape[1]
+    softmax = np.full(inputs.shape, 1.0 / self.num_classes)
+    softmax[:, -1, :] = 0.0
+    next_classes = (np.argmax(inputs[:, -1, :], axis=1) + 1 +
+                    final_state[:, 0].astype(int)) % self.num_classes
+    softmax[range(len(inputs)), -1, next_classes] = 1.0
+    return final_state, softmax
+
+
+class MockGenerator(object):
+  """Generator that extends primer events using a model."""
+
+  def __init__(self, model):
+    self._model = model
+    self.details = None
+
+  def initialize(self):
+    pass
+
+  def close(self):
+    pass
+
+  def generate(self, primer_events, num_steps):
+    return self._model._generate_events(num_steps, primer_events)
+
+
+class StepBatcherTest(tf.test.TestCase):
+
+  def _run_concurrently(self, batcher, steps):
+    """Calls batcher.run_steps for each step from its own thread."""
+    results = [None] * len(steps)
+
+    def run(i):
+      results[i] = batcher.run_steps(*steps[i])
+
+    threads = [threading.Thread(target=run, args=(i,))
+               for i in range(len(steps))]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    return results
+
+  def testPacksConcurrentSteps(self):
+    model = MockModel(batch_size=4)
+    batcher = events_rnn_batching.StepBatcher(model, max_wait_seconds=10.0)
+    steps = [([[[1.0, 0.0]], [[0.0, 1.0]]], [np.zeros(3), np.ones(3)], 1.0),
+             ([[[0.5, 0.5]], [[0.25, 0.75]]], [np.zeros(3), np.zeros(3)], 1.0)]
+    results = self._run_concurrently(batcher, steps)
+    batcher.close()
+
+    self.assertEqual([(4, 1.0)], model.batches)
+    for (inputs, initial_states, _), (final_states, softmax) in zip(
+        steps, results):
+      self.assertAllEqual(np.array(inputs), softmax)
+      for initial_state, final_state in zip(initial_states, final_states):
+        self.assertAllEqual(initial_state + 1, final_state)
+
+    stats = dict((stat.name, stat) for stat in batcher.get_stats())
+    self.assertEqual(2, stats['step_requests'].count)
+    self.assertEqual(1, stats['batches'].count)
+    self.assertEqual(4, stats['batch_rows'].count)
+    self.assertEqual(0, stats['padding_rows'].count)
+    self.assertEqual(1, stats['batch_occupancy'].counters[1.0])
+
+  def testSeparatesStepsByKey(self):
+    model = MockModel(batch_size=4)
+    batcher = events_rnn_batching.StepBatcher(model, max_wait_seconds=0.1)
+    steps = [([[[1.0, 0.0]]], [np.zeros(3)], 1.0),
+             ([[[1.0, 0.0]]], [np.zeros(3)], 0.5),
+             ([[[1.0, 0.0], [0.0, 1.0]]], [np.zeros(3)], 1.0)]
+    results = self._run_concurrently(batcher, steps)
+    batcher.close()
+
+    self.assertEqual(3, len(model.batches))
+    self.assertAllEqual([[[2.0, 0.0]]], results[1][1])
+    self.assertAllEqual(np.full(3, 2.0), results[2][0][0])
+    stats = dict((stat.name, stat) for stat in batcher.get_stats())
+    self.assertEqual(9, stats['padding_rows'].count)
+    self.assertEqual(3, stats['batch_occupancy'].counters[0.25])
+
+  def testSplitsLargeSteps(self):
+    model = MockModel(batch_size=2)
+    batcher = events_rnn_batching.StepBatcher(model, max_wait_seconds=0.0)
+    inputs = [[[float(i), 0.0]] for i in range(5)]
+    final_states, softmax = batcher.run_steps(inputs, [np.zeros(1)] * 5, 1.0)
+    batcher.close()
+
+    self.assertEqual(3, len(model.batches))
+    self.assertAllEqual(np.array(inputs), softmax)
+    self.assertEqual(5, len(final_states))
+
+  def testError(self):
+    model = MockModel(batch_size=2)
+    model._run_batch = lambda *args: 1 / 0
+    batcher = events_rnn_batching.StepBatcher(model, max_wait_seconds=0.0)
+    with self.assertRaises(ZeroDivisionError):
+      batcher.run_steps([[[1.0]]], [np.zeros(1)], 1.0)
+    batcher.close()
+    with self.assertRaises(magenta.music.SequenceGeneratorException):
+      batcher.run_steps([[[1.0]]], [np.zeros(1)], 1.0)
+
+
+class BatchingSequenceGeneratorTest(tf.test.TestCase):
+
+  def testUnsupportedModel(self):
+    class MockGenerator(object):
+
+      def __init__(self, model):
+        self._model = model
+
+    with self.assertRaises(magenta.music.SequenceGeneratorException):
+      events_rnn_batching.BatchingSequenceGenerator(MockGenerator(object()))
+
+  def testConcurrentGenerate(self):
+    primers = [[0, 1], [2, 3], [4, 5]]
+    num_steps = 10
+    model = CountingModel(batch_size=len(primers), num_classes=7)
+    generator = MockGenerator(model)
+    expected = [generator.generate(list(primer), num_steps)
+                for primer in primers]
+    self.assertEqual(len(primers) * (num_steps - 2), model.num_batches)
+
+    # Each call generates one event sequence at a time, so a step can only
+    # fill a batch by sharing it with the other calls.
+    model.num_batches = 0
+    batching_generator = events_rnn_batching.BatchingSequenceGenerator(
+        generator, max_wait_seconds=10.0)
+    results = [None] * len(primers)
+
+    def run(i):
+      results[i] = batching_generator.generate(list(primers[i]), num_steps)
+
+    threads = [threading.Thread(target=run, args=(i,))
+               for i in range(len(primers))]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    stats = dict((stat.name, stat) for stat in batching_generator.get_stats())
+    batching_generator.close()
+
+    self.assertEqual(expected, results)
+    self.assertEqual(num_steps - 2, model.num_batches)
+    self.assertEqual(len(primers) * (num_steps - 2),
+                     stats['step_requests'].count)
+    self.assertEqual(num_steps - 2, stats['batches'].count)
+    self.assertEqual(0, stats['padding_rows'].count)
+
+
+if __name__ == '__main__':
+  tf.test.main()
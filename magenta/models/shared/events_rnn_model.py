@@ -31,6 +31,114 @@ class EventSequenceRnnModelException(Exception):
   pass
 
 
+class _EventSequenceBranch(object):
+  """An event sequence that shares its history with other branches.
+
+  Beam search repeatedly forks each event sequence into several branches.
+  Deep copying the full event sequence for every branch makes each iteration
+  linear in the sequence length. Instead, a branch holds a base event sequence
+  that is never modified, plus a persistent linked list of the events appended
+  since. Forking a branch (via `fork` or `copy.deepcopy`) takes constant time,
+  and branches share the events they have in common.
+
+  Branches support the list-like operations encoder/decoders use during
+  generation: `len`, indexing, slicing, iteration, and `append`. Indexing
+  events near the end of the branch is fast; indexing older appended events
+  walks the list. Use `to_event_sequence` to get a regular event sequence.
+
+  A branch can also keep a running count of the time steps its events span,
+  so beam search can stop once the event sequences are long enough in time.
+  """
+
+  def __init__(self, base, tail=None, num_appended=0, time_steps_fn=None,
+               num_time_steps=None):
+    """Constructs an _EventSequenceBranch.
+
+    Args:
+      base: The event sequence this branch extends. It will not be modified.
+      tail: The last node of the linked list of appended events, a tuple
+          (event, previous_node), or None if no events have been appended.
+      num_appended: The number of appended events in the linked list.
+      time_steps_fn: An optional function that returns the number of time
+          steps an event advances the sequence. If None, time steps are not
+          counted.
+      num_time_steps: The number of time steps spanned by the events in the
+          branch. If None and `time_steps_fn` is given, it is computed from
+          `base`, which must not have appended events.
+    """
+    self._base = base
+    self._tail = tail
+    self._num_appended = num_appended
+    self._time_steps_fn = time_steps_fn
+    if time_steps_fn is not None and num_time_steps is None:
+      num_time_steps = sum(time_steps_fn(event) for event in base)
+    self._num_time_steps = num_time_steps
+
+  @property
+  def num_time_steps(self):
+    """Number of time steps spanned by the events, or None if not counted."""
+    return self._num_time_steps
+
+  def fork(self):
+    """Returns a new branch with the same events as this one."""
+    return _EventSequenceBranch(self._base, self._tail, self._num_appended,
+                                self._time_steps_fn, self._num_time_steps)
+
+  def __deepcopy__(self, memo=None):
+    return self.fork()
+
+  def _appended_events(self):
+    """Returns a list of the appended events, in order."""
+    events = []
+    node = self._tail
+    while node is not None:
+      event, node = node
+      events.append(event)
+    events.reverse()
+    return events
+
+  def append(self, event):
+    """Appends the event to the end of this branch."""
+    self._tail = (event, self._tail)
+    self._num_appended += 1
+    if self._time_steps_fn is not None:
+      self._num_time_steps += self._time_steps_fn(event)
+
+  def __len__(self):
+    return len(self._base) + self._num_appended
+
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      return list(self)[i]
+    length = len(self)
+    if i < 0:
+      i += length
+    if not 0 <= i < length:
+      raise IndexError('event sequence index out of range')
+    if i < len(self._base):
+      return self._base[i]
+    node = self._tail
+    for _ in range(length - 1 - i):
+      node = node[1]
+    return node[0]
+
+  def __getslice__(self, i, j):
+    return self.__getitem__(slice(i, j))
+
+  def __iter__(self):
+    for event in self._base:
+      yield event
+    for event in self._appended_events():
+      yield event
+
+  def to_event_sequence(self):
+    """Returns a copy of the base event sequence with all events appended."""
+    events = copy.deepcopy(self._base)
+    for event in self._appended_events():
+      events.append(event)
+    return events
+
+
 class EventSequenceRnnModel(mm.BaseModel):
   """Class for RNN event sequence generation models.
 
@@ -48,6 +156,7 @@ class EventSequenceRnnModel(mm.BaseModel):
     """
     super(EventSequenceRnnModel, self).__init__()
     self._config = config
+    self._step_batcher = None
 
   def _build_graph_for_generation(self):
     return events_rnn_graph.build_graph('generate', self._config)
@@ -56,16 +165,25 @@ class EventSequenceRnnModel(mm.BaseModel):
     """Extracts the batch size from the graph."""
     return self._session.graph.get_collection('inputs')[0].shape[0].value
 
-  def _generate_step_for_batch(self, event_sequences, inputs, initial_state,
-                               temperature):
-    """Extends a batch of event sequences by a single step each.
+  def set_step_batcher(self, step_batcher):
+    """Sets the object that runs the model for each generation step.
 
-    This method modifies the event sequences in place.
+    By default, each call to generate events runs the model on its own
+    batches, padding partial batches. A step batcher instead lets concurrent
+    generation calls share model batches.
+
+    Args:
+      step_batcher: An object with a `run_steps(inputs, initial_states,
+          temperature)` method that returns the final RNN states and a numpy
+          array of softmax outputs for each model input, such as an
+          events_rnn_batching.StepBatcher. Or None to run the model directly.
+    """
+    self._step_batcher = step_batcher
+
+  def _run_batch(self, inputs, initial_state, temperature):
+    """Runs the model on a batch of inputs.
 
     Args:
-      event_sequences: A list of event sequences, each of which is a Python
-          list-like object. The list of event sequences should have length equal
-          to `self._batch_size()`. These are extended by this method.
       inputs: A Python list of model inputs, with length equal to
           `self._batch_size()`.
       initial_state: A numpy array containing the initial RNN state, where
@@ -75,14 +193,9 @@ class EventSequenceRnnModel(mm.BaseModel):
     Returns:
       final_state: The final RNN state, a numpy array the same size as
           `initial_state`.
-      loglik: The log-likelihood of the chosen softmax value for each event
-          sequence, a 1-D numpy array of length
-          `self._batch_size()`. If `inputs` is a full-length inputs batch, the
-          log-likelihood of each entire sequence up to and including the
-          generated step will be computed and returned.
+      softmax: The softmax output for each step of each input, a 3-D numpy
+          array of shape [batch_size, num_steps, num_classes].
     """
-    assert len(event_sequences) == self._batch_size()
-
     graph_inputs = self._session.graph.get_collection('inputs')[0]
     graph_initial_state = self._session.graph.get_collection('initial_state')
     graph_final_state = self._session.graph.get_collection('final_state')
@@ -95,9 +208,25 @@ class EventSequenceRnnModel(mm.BaseModel):
     # placeholder exists in the graph.
     if graph_temperature:
       feed_dict[graph_temperature[0]] = temperature
-    final_state, softmax = self._session.run(
-        [graph_final_state, graph_softmax], feed_dict)
+    return self._session.run([graph_final_state, graph_softmax], feed_dict)
+
+  def _extend_event_sequences(self, event_sequences, softmax):
+    """Extends event sequences with events sampled from the softmax output.
+
+    This method modifies the event sequences in place.
 
+    Args:
+      event_sequences: A list of event sequences, each of which is a Python
+          list-like object.
+      softmax: The softmax output for each event sequence, a 3-D numpy array
+          of shape [len(event_sequences), num_steps, num_classes].
+
+    Returns:
+      The log-likelihood of the chosen softmax value for each event sequence,
+      a 1-D numpy array of length `len(event_sequences)`. If `softmax` covers
+      more than a single step, the log-likelihood of each entire sequence up to
+      and including the generated step is returned.
+    """
     if softmax.shape[1] > 1:
       # The inputs batch is longer than a single step, so we also want to
       # compute the log-likelihood of the event sequences up until the step
@@ -111,13 +240,45 @@ class EventSequenceRnnModel(mm.BaseModel):
         event_sequences, softmax)
     p = softmax[range(len(event_sequences)), -1, indices]
 
-    return final_state, loglik + np.log(p)
+    return loglik + np.log(p)
+
+  def _generate_step_for_batch(self, event_sequences, inputs, initial_state,
+                               temperature):
+    """Extends a batch of event sequences by a single step each.
+
+    This method modifies the event sequences in place.
+
+    Args:
+      event_sequences: A list of event sequences, each of which is a Python
+          list-like object. The list of event sequences should have length equal
+          to `self._batch_size()`. These are extended by this method.
+      inputs: A Python list of model inputs, with length equal to
+          `self._batch_size()`.
+      initial_state: A numpy array containing the initial RNN state, where
+          `initial_state.shape[0]` is equal to `self._batch_size()`.
+      temperature: The softmax temperature.
+
+    Returns:
+      final_state: The final RNN state, a numpy array the same size as
+          `initial_state`.
+      loglik: The log-likelihood of the chosen softmax value for each event
+          sequence, a 1-D numpy array of length
+          `self._batch_size()`. If `inputs` is a full-length inputs batch, the
+          log-likelihood of each entire sequence up to and including the
+          generated step will be computed and returned.
+    """
+    assert len(event_sequences) == self._batch_size()
+
+    final_state, softmax = self._run_batch(inputs, initial_state, temperature)
+    return final_state, self._extend_event_sequences(event_sequences, softmax)
 
   def _generate_step(self, event_sequences, inputs, initial_states,
                      temperature):
     """Extends a list of event sequences by a single step each.
 
-    This method modifies the event sequences in place.
+    This method modifies the event sequences in place. If a step batcher has
+    been set, the model inputs are run in batches shared with other concurrent
+    generation calls.
 
     Args:
       event_sequences: A list of event sequence objects, which are extended by
@@ -137,6 +298,12 @@ class EventSequenceRnnModel(mm.BaseModel):
           log-likelihood of each entire sequence up to and including the
           generated step will be computed and returned.
     """
+    if self._step_batcher is not None:
+      final_states, softmax = self._step_batcher.run_steps(
+          inputs, initial_states, temperature)
+      return final_states, self._extend_event_sequences(
+          event_sequences, softmax)
+
     # Split the sequences to extend into batches matching the model batch size.
     batch_size = self._batch_size()
     num_seqs = len(event_sequences)
@@ -189,7 +356,9 @@ class EventSequenceRnnModel(mm.BaseModel):
 
     Returns:
       all_event_sequences: A list of event sequences, with `branch_factor` times
-          as many event sequences as the initial list.
+          as many event sequences as the initial list. If the event sequences
+          are _EventSequenceBranch objects, the new branches share history with
+          them rather than copying it.
       all_final_state: A list of structures for the initial RNN states, with a
           length equal to the length of `all_event_sequences`.
       all_loglik: A 1-D numpy array of event sequence log-likelihoods, with
@@ -240,7 +409,8 @@ class EventSequenceRnnModel(mm.BaseModel):
 
   def _beam_search(self, events, num_steps, temperature, beam_size,
                    branch_factor, steps_per_iteration, control_events=None,
-                   modify_events_callback=None):
+                   modify_events_callback=None, time_steps_fn=None,
+                   max_time_steps=None):
     """Generates an event sequence using beam search.
 
     Initially, the beam is filled with `beam_size` copies of the initial event
@@ -264,6 +434,11 @@ class EventSequenceRnnModel(mm.BaseModel):
     After the final iteration, the single event sequence in the beam with
     highest likelihood will be returned.
 
+    If `time_steps_fn` and `max_time_steps` are given, the search also stops
+    early, after the pruning phase of the first iteration in which every event
+    sequence in the beam spans at least `max_time_steps` time steps. The
+    returned event sequence may then have fewer than `num_steps` events.
+
     Args:
       events: The initial event sequence, a Python list-like object.
       num_steps: The integer length in steps of the final event sequence, after
@@ -282,12 +457,26 @@ class EventSequenceRnnModel(mm.BaseModel):
           Can be used to inject events rather than having them generated. If not
           None, will be called with 3 arguments after every event: the current
           EventSequenceEncoderDecoder, a list of current EventSequences, and a
-          list of current encoded event inputs.
+          list of current encoded event inputs. The EventSequences are
+          list-like branches that share history; they support indexing,
+          iteration, and `append`.
+      time_steps_fn: An optional function that returns the number of time
+          steps an event advances the sequence, e.g. the number of quantized
+          steps for a time shift event.
+      max_time_steps: The integer number of time steps, including those of the
+          initial event sequence, after which generation can stop early. Only
+          used if `time_steps_fn` is not None.
 
     Returns:
       The highest-likelihood event sequence as computed by the beam search.
     """
-    event_sequences = [copy.deepcopy(events) for _ in range(beam_size)]
+    if time_steps_fn is None:
+      max_time_steps = None
+
+    # Each sequence in the beam is a branch sharing history with the others, so
+    # branching does not copy the whole event sequence.
+    initial_branch = _EventSequenceBranch(events, time_steps_fn=time_steps_fn)
+    event_sequences = [initial_branch.fork() for _ in range(beam_size)]
     graph_initial_state = self._session.graph.get_collection('initial_state')
     loglik = np.zeros(beam_size)
 
@@ -316,9 +505,17 @@ class EventSequenceRnnModel(mm.BaseModel):
     num_iterations = (num_steps -
                       first_iteration_num_steps) / steps_per_iteration
 
-    for _ in range(num_iterations):
+    for i in range(num_iterations):
       event_sequences, final_state, loglik = self._prune_branches(
           event_sequences, final_state, loglik, k=beam_size)
+      if max_time_steps is not None and all(
+          branch.num_time_steps >= max_time_steps
+          for branch in event_sequences):
+        tf.logging.info(
+            'Beam search reached %d time steps, skipping the last %d of %d '
+            'steps', max_time_steps, (num_iterations - i) * steps_per_iteration,
+            num_steps)
+        break
       if control_events is not None:
         # We are conditioning on a control sequence.
         inputs = self._config.encoder_decoder.get_inputs_batch(
@@ -341,11 +538,12 @@ class EventSequenceRnnModel(mm.BaseModel):
     tf.logging.info('Beam search yields sequence with log-likelihood: %f ',
                     loglik[0])
 
-    return event_sequences[0]
+    return event_sequences[0].to_event_sequence()
 
   def _generate_events(self, num_steps, primer_events, temperature=1.0,
                        beam_size=1, branch_factor=1, steps_per_iteration=1,
-                       control_events=None, modify_events_callback=None):
+                       control_events=None, modify_events_callback=None,
+                       time_steps_fn=None, max_time_steps=None):
     """Generate an event sequence from a primer sequence.
 
     Args:
@@ -369,13 +567,21 @@ class EventSequenceRnnModel(mm.BaseModel):
           None, will be called with 3 arguments after every event: the current
           EventSequenceEncoderDecoder, a list of current EventSequences, and a
           list of current encoded event inputs.
+      time_steps_fn: An optional function that returns the number of time
+          steps an event advances the sequence. Used with `max_time_steps` to
+          stop generation early.
+      max_time_steps: If not None, generation may stop before `num_steps` once
+          the generated event sequences span this many time steps, including
+          the primer. Requires `time_steps_fn`.
 
     Returns:
       The generated event sequence (which begins with the provided primer).
+      If generation stopped early, it has fewer than `num_steps` events.
 
     Raises:
       EventSequenceRnnModelException: If the primer sequence has zero length or
-          is not shorter than num_steps.
+          is not shorter than num_steps, or if `max_time_steps` is given
+          without `time_steps_fn`.
     """
     if (control_events is not None and
         not isinstance(self._config.encoder_decoder,
@@ -393,12 +599,16 @@ class EventSequenceRnnModel(mm.BaseModel):
     if control_events is not None and len(control_events) < num_steps:
       raise EventSequenceRnnModelException(
           'control sequence must be at least `num_steps`')
+    if max_time_steps is not None and time_steps_fn is None:
+      raise EventSequenceRnnModelException(
+          '`max_time_steps` requires `time_steps_fn`')
 
     events = primer_events
     if num_steps > len(primer_events):
       events = self._beam_search(events, num_steps - len(events), temperature,
                                  beam_size, branch_factor, steps_per_iteration,
-                                 control_events, modify_events_callback)
+                                 control_events, modify_events_callback,
+                                 time_steps_fn, max_time_steps)
     return events
 
   def _evaluate_batch_log_likelihood(self, event_sequences, inputs,
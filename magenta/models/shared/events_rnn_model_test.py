@@ -0,0 +1,173 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for events_rnn_model."""
+
+import copy
+
+# internal imports
+import numpy as np
+import tensorflow as tf
+import magenta
+
+from magenta.models.shared import events_rnn_model
+from magenta.music import testing_lib
+
+
+class MockSession(object):
+  """Session whose graph has a single RNN state of zeros."""
+
+  def __init__(self, batch_size):
+    self.graph = self
+    self.batch_size = batch_size
+
+  def get_collection(self, name):
+    return [name]
+
+  def run(self, unused_fetches):
+    return np.zeros([self.batch_size, 1])
+
+
+class MockModel(events_rnn_model.EventSequenceRnnModel):
+  """Model that always generates event 1, except in some batch rows.
+
+  Event sequences in `stalled_rows` of each batch always get event 0 instead.
+  """
+
+  def __init__(self, batch_size, stalled_rows=()):
+    super(MockModel, self).__init__(
+        events_rnn_model.EventSequenceRnnConfig(
+            None,
+            magenta.music.OneHotEventSequenceEncoderDecoder(
+                testing_lib.TrivialOneHotEncoding(2)),
+            None))
+    self._session = MockSession(batch_size)
+    self.batch_size = batch_size
+    self.stalled_rows = stalled_rows
+
+  def _batch_size(self):
+    return self.batch_size
+
+  def _run_batch(self, inputs, initial_state, temperature):
+    inputs = np.array(inputs)
+    softmax = np.full(inputs.shape, 0.5)
+    softmax[:, -1, :] = [0.0, 1.0]
+    for row in self.stalled_rows:
+      softmax[row, -1, :] = [1.0, 0.0]
+    return initial_state, softmax
+
+
+class EventSequenceBranchTest(tf.test.TestCase):
+
+  def setUp(self):
+    self.base = magenta.music.Melody([60, -2, 62, -1])
+
+  def testListOperations(self):
+    branch = events_rnn_model._EventSequenceBranch(self.base)
+    branch.append(64)
+    branch.append(-2)
+
+    self.assertEqual(6, len(branch))
+    self.assertEqual([60, -2, 62, -1, 64, -2], list(branch))
+    self.assertEqual(60, branch[0])
+    self.assertEqual(64, branch[4])
+    self.assertEqual(-2, branch[-1])
+    self.assertEqual(-1, branch[-3])
+    self.assertEqual([62, -1, 64], branch[2:5])
+    self.assertEqual([60, -2, 62, -1, 64], branch[:-1])
+    with self.assertRaises(IndexError):
+      _ = branch[6]
+    with self.assertRaises(IndexError):
+      _ = branch[-7]
+
+  def testForkSharesHistory(self):
+    branch = events_rnn_model._EventSequenceBranch(self.base)
+    branch.append(64)
+    fork = branch.fork()
+    deep_copy = copy.deepcopy(branch)
+    branch.append(65)
+    fork.append(67)
+    deep_copy.append(-1)
+
+    self.assertEqual([60, -2, 62, -1, 64, 65], list(branch))
+    self.assertEqual([60, -2, 62, -1, 64, 67], list(fork))
+    self.assertEqual([60, -2, 62, -1, 64, -1], list(deep_copy))
+    self.assertEqual([60, -2, 62, -1], list(self.base))
+
+  def testToEventSequence(self):
+    branch = events_rnn_model._EventSequenceBranch(self.base)
+    branch.append(64)
+    branch.append(-2)
+    melody = branch.to_event_sequence()
+
+    self.assertTrue(isinstance(melody, magenta.music.Melody))
+    self.assertEqual(magenta.music.Melody([60, -2, 62, -1, 64, -2]), melody)
+    self.assertEqual(4, len(self.base))
+
+  def testCountTimeSteps(self):
+    # Count each note onset as two time steps.
+    time_steps_fn = lambda event: 2 if event >= 0 else 0
+    branch = events_rnn_model._EventSequenceBranch(
+        self.base, time_steps_fn=time_steps_fn)
+    self.assertEqual(4, branch.num_time_steps)
+    branch.append(64)
+    fork = branch.fork()
+    branch.append(-2)
+    fork.append(65)
+
+    self.assertEqual(6, branch.num_time_steps)
+    self.assertEqual(8, fork.num_time_steps)
+    self.assertEqual(8, copy.deepcopy(fork).num_time_steps)
+    self.assertIsNone(
+        events_rnn_model._EventSequenceBranch(self.base).num_time_steps)
+
+
+class EventSequenceRnnModelTest(tf.test.TestCase):
+
+  def setUp(self):
+    # Event 1 advances the sequence by a time step, event 0 does not.
+    self.time_steps_fn = lambda event: event
+
+  def testGenerateEventsStopsAtMaxTimeSteps(self):
+    # (beam_size, branch_factor, steps_per_iteration)
+    for beam_size, branch_factor, steps_per_iteration in [
+        (1, 1, 1), (2, 2, 1), (3, 2, 3)]:
+      model = MockModel(batch_size=beam_size * branch_factor)
+      events = model._generate_events(
+          100, [1], beam_size=beam_size, branch_factor=branch_factor,
+          steps_per_iteration=steps_per_iteration,
+          time_steps_fn=self.time_steps_fn, max_time_steps=10)
+      self.assertEqual([1] * 10, events)
+
+  def testGenerateEventsWaitsForAllBranches(self):
+    # The first event sequence in the beam reaches the time step budget, but
+    # the second never advances, so generation runs for all steps.
+    model = MockModel(batch_size=2, stalled_rows=[1])
+    events = model._generate_events(
+        100, [1], beam_size=2, branch_factor=1,
+        time_steps_fn=self.time_steps_fn, max_time_steps=10)
+    self.assertEqual(100, len(events))
+
+    events = model._generate_events(
+        100, [1], beam_size=1, branch_factor=1,
+        time_steps_fn=self.time_steps_fn, max_time_steps=10)
+    self.assertEqual(10, len(events))
+
+  def testGenerateEventsMaxTimeStepsWithoutTimeStepsFn(self):
+    model = MockModel(batch_size=1)
+    with self.assertRaises(events_rnn_model.EventSequenceRnnModelException):
+      model._generate_events(100, [1], max_time_steps=10)
+
+
+if __name__ == '__main__':
+  tf.test.main()
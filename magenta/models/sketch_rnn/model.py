@@ -471,3 +471,155 @@ def sample(sess, model, seq_len=250, temperature=1.0, greedy_mode=False,
     prev_state = next_state
 
   return strokes, mixture_params
+
+
+def _adjust_temp_batch(pdf, temp):
+  """Applies a softmax temperature to each row of a batch of pdfs."""
+  pdf = np.log(pdf) / temp
+  pdf -= pdf.max(axis=1, keepdims=True)
+  pdf = np.exp(pdf)
+  pdf /= pdf.sum(axis=1, keepdims=True)
+  return pdf
+
+
+def _get_pi_idx_batch(pdf, temp=1.0, greedy=False):
+  """Samples one index from each row of a batch of pdfs, optionally greedily."""
+  if greedy:
+    return np.argmax(pdf, axis=1)
+  pdf = _adjust_temp_batch(pdf, temp)
+  x = np.random.random_sample((pdf.shape[0], 1))
+  # The first index whose cumulative probability reaches x, as in `sample`.
+  idx = (np.cumsum(pdf, axis=1) < x).sum(axis=1)
+  return np.minimum(idx, pdf.shape[1] - 1)
+
+
+def _sample_gaussian_2d_batch(mu1, mu2, s1, s2, rho, temp=1.0, greedy=False):
+  """Samples a point from each of a batch of bivariate Gaussians."""
+  if greedy:
+    return mu1, mu2
+  s1 = s1 * temp * temp
+  s2 = s2 * temp * temp
+  n1, n2 = np.random.randn(2, mu1.shape[0])
+  x1 = mu1 + s1 * n1
+  x2 = mu2 + s2 * (rho * n1 + np.sqrt(1 - rho * rho) * n2)
+  return x1, x2
+
+
+def sample_batch(sess, model, num_samples=None, seq_len=250, temperature=1.0,
+                 greedy_mode=False, z=None):
+  """Samples a batch of sequences from a pre-trained model in lockstep.
+
+  Each model step runs all sketches in a batch at once, and mixture components,
+  pen states and offsets are sampled for the whole batch with NumPy. Sketches
+  that reach their end-of-sketch token stop changing, and sampling stops once
+  every sketch in the batch has ended.
+
+  `model` must be built with `max_seq_len` 1, like the model used by `sample`.
+  Its `batch_size` is the number of sketches run together; more samples are
+  drawn in several batches.
+
+  Args:
+    sess: The TensorFlow session holding the model variables.
+    model: The sampling Model.
+    num_samples: The number of sketches to sample. Defaults to the number of
+        rows in `z`, or to the model batch size if `z` is None.
+    seq_len: The maximum number of strokes in each sketch.
+    temperature: The sampling temperature.
+    greedy_mode: If True, take the most likely mixture component, pen state and
+        offset at each step instead of sampling.
+    z: An optional array of latent vectors, one row per sketch, used if the
+        model is conditional. Random latent vectors are used if None.
+
+  Returns:
+    strokes: A [num_samples, seq_len, 5] float32 array of sketches in stroke-5
+        format. Rows after a sketch's end-of-sketch token are [0, 0, 0, 0, 1].
+    lengths: An int array with the number of strokes in each sketch, counting
+        the end-of-sketch token.
+
+  Raises:
+    ValueError: If `z` is given and does not have `num_samples` rows.
+  """
+  batch_size = model.hps.batch_size
+  if num_samples is None:
+    num_samples = batch_size if z is None else len(z)
+  if z is not None and len(z) != num_samples:
+    raise ValueError('z has %d latent vectors but num_samples is %d' %
+                     (len(z), num_samples))
+  if z is None:
+    z = np.random.randn(num_samples, model.hps.z_size)
+
+  strokes = np.zeros((num_samples, seq_len, 5), dtype=np.float32)
+  strokes[:, :, 4] = 1
+  lengths = np.full(num_samples, seq_len, dtype=np.int64)
+
+  for start in range(0, num_samples, batch_size):
+    end = min(start + batch_size, num_samples)
+    # Pad the last batch by repeating its final latent vector.
+    batch_z = z[start:end]
+    if end - start < batch_size:
+      batch_z = np.concatenate(
+          [batch_z, np.repeat(batch_z[-1:], batch_size - len(batch_z), 0)])
+    batch_strokes, batch_lengths = _sample_one_batch(
+        sess, model, batch_z, seq_len, temperature, greedy_mode)
+    strokes[start:end] = batch_strokes[:end - start]
+    lengths[start:end] = batch_lengths[:end - start]
+
+  return strokes, lengths
+
+
+def _sample_one_batch(sess, model, z, seq_len, temperature, greedy_mode):
+  """Samples one model batch of sketches for `sample_batch`."""
+  batch_size = model.hps.batch_size
+  prev_x = np.zeros((batch_size, 1, 5), dtype=np.float32)
+  prev_x[:, 0, 2] = 1  # initially, we want to see beginning of new stroke
+
+  if not model.hps.conditional:
+    prev_state = sess.run(model.initial_state)
+  else:
+    prev_state = sess.run(model.initial_state, feed_dict={model.batch_z: z})
+
+  strokes = np.zeros((batch_size, seq_len, 5), dtype=np.float32)
+  strokes[:, :, 4] = 1
+  lengths = np.full(batch_size, seq_len, dtype=np.int64)
+  active = np.ones(batch_size, dtype=bool)
+  rows = np.arange(batch_size)
+
+  for i in range(seq_len):
+    feed = {
+        model.input_x: prev_x,
+        model.sequence_lengths: [1] * batch_size,
+        model.initial_state: prev_state
+    }
+    if model.hps.conditional:
+      feed[model.batch_z] = z
+
+    params = sess.run([
+        model.pi, model.mu1, model.mu2, model.sigma1, model.sigma2, model.corr,
+        model.pen, model.final_state
+    ], feed)
+
+    [o_pi, o_mu1, o_mu2, o_sigma1, o_sigma2, o_corr, o_pen, next_state] = params
+
+    idx = _get_pi_idx_batch(o_pi, temperature, greedy_mode)
+    idx_eos = _get_pi_idx_batch(o_pen, temperature, greedy_mode)
+    next_x1, next_x2 = _sample_gaussian_2d_batch(
+        o_mu1[rows, idx], o_mu2[rows, idx], o_sigma1[rows, idx],
+        o_sigma2[rows, idx], o_corr[rows, idx], np.sqrt(temperature),
+        greedy_mode)
+
+    next_x = np.zeros((batch_size, 5), dtype=np.float32)
+    next_x[:, 0] = next_x1
+    next_x[:, 1] = next_x2
+    next_x[rows, 2 + idx_eos] = 1
+    strokes[active, i] = next_x[active]
+
+    ended = active & (idx_eos == 2)
+    lengths[ended] = i + 1
+    active &= ~ended
+    if not active.any():
+      break
+
+    prev_x = next_x[:, np.newaxis, :]
+    prev_state = next_state
+
+  return strokes, lengths
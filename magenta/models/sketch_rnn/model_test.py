@@ -0,0 +1,102 @@
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for sketch_rnn model sampling."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+# internal imports
+
+import numpy as np
+import tensorflow as tf
+
+from magenta.models.sketch_rnn import model as sketch_rnn_model
+
+
+class MockModel(object):
+
+  def __init__(self):
+    self.hps = sketch_rnn_model.get_default_hparams()
+
+
+class SampleBatchTest(tf.test.TestCase):
+
+  def setUp(self):
+    np.random.seed(0)
+
+  def testGetPiIdxBatchGreedy(self):
+    pdf = np.array([[0.1, 0.7, 0.2], [0.5, 0.2, 0.3], [0.2, 0.3, 0.5]])
+    self.assertAllEqual(
+        [1, 0, 2], sketch_rnn_model._get_pi_idx_batch(pdf, greedy=True))
+
+  def testGetPiIdxBatchDistribution(self):
+    pdf = np.tile([[0.2, 0.5, 0.3]], (20000, 1))
+    idx = sketch_rnn_model._get_pi_idx_batch(pdf)
+    self.assertAllClose([0.2, 0.5, 0.3],
+                        np.bincount(idx, minlength=3) / len(idx), atol=0.02)
+
+    # A low temperature makes the most likely index more likely still.
+    idx = sketch_rnn_model._get_pi_idx_batch(pdf, temp=0.1)
+    self.assertGreater(np.mean(idx == 1), 0.99)
+
+  def testGetPiIdxBatchClipsIndex(self):
+    # Rounding can leave the cumulative probability of a row just below the
+    # sampled value, in which case the last index is chosen.
+    random_sample = np.random.random_sample
+    np.random.random_sample = np.ones
+    try:
+      idx = sketch_rnn_model._get_pi_idx_batch(np.full((2, 10), 0.1))
+    finally:
+      np.random.random_sample = random_sample
+    self.assertAllEqual([9, 9], idx)
+
+  def testSampleGaussian2dBatchGreedy(self):
+    mu1 = np.array([1.0, -2.0])
+    mu2 = np.array([0.5, 3.0])
+    ones = np.ones(2)
+    x1, x2 = sketch_rnn_model._sample_gaussian_2d_batch(
+        mu1, mu2, ones, ones, 0.5 * ones, greedy=True)
+    self.assertAllEqual(mu1, x1)
+    self.assertAllEqual(mu2, x2)
+
+  def testSampleGaussian2dBatchCovariance(self):
+    num_samples = 50000
+    mu1, mu2, s1, s2, rho, temp = 1.0, -2.0, 0.5, 2.0, -0.6, 0.9
+    x1, x2 = sketch_rnn_model._sample_gaussian_2d_batch(
+        np.full(num_samples, mu1), np.full(num_samples, mu2),
+        np.full(num_samples, s1), np.full(num_samples, s2),
+        np.full(num_samples, rho), temp)
+
+    # The same distribution as the unbatched `sample` draws from.
+    s1 *= temp * temp
+    s2 *= temp * temp
+    cov = [[s1 * s1, rho * s1 * s2], [rho * s1 * s2, s2 * s2]]
+    expected = np.random.multivariate_normal([mu1, mu2], cov, num_samples)
+
+    self.assertAllClose(np.mean(expected, axis=0), [np.mean(x1), np.mean(x2)],
+                        atol=0.05)
+    self.assertAllClose(np.cov(expected.T), np.cov([x1, x2]), atol=0.1)
+
+  def testSampleBatchZSizeMismatch(self):
+    with self.assertRaises(ValueError):
+      sketch_rnn_model.sample_batch(
+          None, MockModel(), num_samples=3, z=np.zeros((2, 4)))
+    with self.assertRaises(ValueError):
+      sketch_rnn_model.sample_batch(
+          None, MockModel(), num_samples=1, z=np.zeros((2, 4)))
+
+
+if __name__ == '__main__':
+  tf.test.main()
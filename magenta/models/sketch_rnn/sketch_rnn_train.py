@@ -50,6 +50,11 @@ tf.app.flags.DEFINE_string(
 tf.app.flags.DEFINE_boolean(
     'resume_training', False,
     'Set to true to load previous checkpoint')
+tf.app.flags.DEFINE_boolean(
+    'convert_to_flat', False,
+    'Set to true to convert local .npz datasets into flat stroke sets next to '
+    'them, which are memory-mapped instead of loaded into memory. Datasets '
+    'that were already converted are always memory-mapped.')
 tf.app.flags.DEFINE_string(
     'hparams', '',
     'Pass in comma-separated key=value pairs such as '
@@ -113,8 +118,14 @@ def download_pretrained_models(
   tf.logging.info('Unzipping complete.')
 
 
-def load_dataset(data_dir, model_params, inference_mode=False):
-  """Loads the .npz file, and splits the set into train/valid/test."""
+def load_dataset(data_dir, model_params, inference_mode=False,
+                 convert_to_flat=False):
+  """Loads the .npz file, and splits the set into train/valid/test.
+
+  Local datasets that were converted with utils.convert_npz_to_flat are
+  memory-mapped instead, so their sketches are only read from disk as batches
+  are built. If convert_to_flat is True, local .npz files are converted first.
+  """
 
   # normalizes the x and y columns usint the training set.
   # applies same scaling factor to valid and test set.
@@ -125,41 +136,55 @@ def load_dataset(data_dir, model_params, inference_mode=False):
   else:
     datasets = [model_params.data_set]
 
-  train_strokes = None
-  valid_strokes = None
-  test_strokes = None
-
-  for dataset in datasets:
-    data_filepath = os.path.join(data_dir, dataset)
-    if data_dir.startswith('http://') or data_dir.startswith('https://'):
-      tf.logging.info('Downloading %s', data_filepath)
-      response = requests.get(data_filepath)
-      data = np.load(StringIO(response.content))
-    else:
-      data = np.load(data_filepath)  # load this into dictionary
-    tf.logging.info('Loaded {}/{}/{} from {}'.format(
-        len(data['train']), len(data['valid']), len(data['test']),
-        dataset))
-    if train_strokes is None:
-      train_strokes = data['train']
-      valid_strokes = data['valid']
-      test_strokes = data['test']
-    else:
-      train_strokes = np.concatenate((train_strokes, data['train']))
-      valid_strokes = np.concatenate((valid_strokes, data['valid']))
-      test_strokes = np.concatenate((test_strokes, data['test']))
-
-  all_strokes = np.concatenate((train_strokes, valid_strokes, test_strokes))
-  num_points = 0
-  for stroke in all_strokes:
-    num_points += len(stroke)
-  avg_len = num_points / len(all_strokes)
+  flat_prefixes = None
+  if not (data_dir.startswith('http://') or data_dir.startswith('https://')):
+    prefixes = [os.path.splitext(os.path.join(data_dir, dataset))[0]
+                for dataset in datasets]
+    if convert_to_flat:
+      for dataset, prefix in zip(datasets, prefixes):
+        if not utils.flat_dataset_exists(prefix):
+          tf.logging.info('Converting %s to flat stroke sets', dataset)
+          utils.convert_npz_to_flat(os.path.join(data_dir, dataset), prefix)
+    if all(utils.flat_dataset_exists(prefix) for prefix in prefixes):
+      flat_prefixes = prefixes
+
+  if flat_prefixes is not None:
+    train_strokes, valid_strokes, test_strokes = utils.load_flat_dataset(
+        flat_prefixes)
+    tf.logging.info('Memory-mapped {}/{}/{} from {}'.format(
+        len(train_strokes), len(valid_strokes), len(test_strokes),
+        ', '.join(datasets)))
+    lengths = np.concatenate(
+        [train_strokes.lengths, valid_strokes.lengths, test_strokes.lengths])
+  else:
+    train_strokes = []
+    valid_strokes = []
+    test_strokes = []
+    for dataset in datasets:
+      data_filepath = os.path.join(data_dir, dataset)
+      if data_dir.startswith('http://') or data_dir.startswith('https://'):
+        tf.logging.info('Downloading %s', data_filepath)
+        response = requests.get(data_filepath)
+        data = np.load(StringIO(response.content))
+      else:
+        data = np.load(data_filepath)  # load this into dictionary
+      tf.logging.info('Loaded {}/{}/{} from {}'.format(
+          len(data['train']), len(data['valid']), len(data['test']),
+          dataset))
+      train_strokes.extend(data['train'])
+      valid_strokes.extend(data['valid'])
+      test_strokes.extend(data['test'])
+    lengths = np.array(
+        [len(stroke)
+         for stroke in train_strokes + valid_strokes + test_strokes])
+
+  avg_len = lengths.sum() / len(lengths)
   tf.logging.info('Dataset combined: {} ({}/{}/{}), avg len {}'.format(
-      len(all_strokes), len(train_strokes), len(valid_strokes),
+      len(lengths), len(train_strokes), len(valid_strokes),
       len(test_strokes), int(avg_len)))
 
   # calculate the max strokes we need.
-  max_seq_len = utils.get_max_len(all_strokes)
+  max_seq_len = int(lengths.max())
   # overwrite the hps with this calculation.
   model_params.max_seq_len = max_seq_len
 
@@ -180,7 +205,7 @@ def load_dataset(data_dir, model_params, inference_mode=False):
   sample_model_params.batch_size = 1  # only sample one at a time
   sample_model_params.max_seq_len = 1  # sample one point at a time
 
-  train_set = utils.DataLoader(
+  train_set = utils.ArrayDataLoader(
       train_strokes,
       model_params.batch_size,
       max_seq_length=model_params.max_seq_len,
@@ -190,7 +215,7 @@ def load_dataset(data_dir, model_params, inference_mode=False):
   normalizing_scale_factor = train_set.calculate_normalizing_scale_factor()
   train_set.normalize(normalizing_scale_factor)
 
-  valid_set = utils.DataLoader(
+  valid_set = utils.ArrayDataLoader(
       valid_strokes,
       eval_model_params.batch_size,
       max_seq_length=eval_model_params.max_seq_len,
@@ -198,7 +223,7 @@ def load_dataset(data_dir, model_params, inference_mode=False):
       augment_stroke_prob=0.0)
   valid_set.normalize(normalizing_scale_factor)
 
-  test_set = utils.DataLoader(
+  test_set = utils.ArrayDataLoader(
       test_strokes,
       eval_model_params.batch_size,
       max_seq_length=eval_model_params.max_seq_len,
@@ -435,7 +460,8 @@ def trainer(model_params):
   for key, val in model_params.values().iteritems():
     tf.logging.info('%s = %s', key, str(val))
   tf.logging.info('Loading data files.')
-  datasets = load_dataset(FLAGS.data_dir, model_params)
+  datasets = load_dataset(FLAGS.data_dir, model_params,
+                          convert_to_flat=FLAGS.convert_to_flat)
 
   train_set = datasets[0]
   valid_set = datasets[1]
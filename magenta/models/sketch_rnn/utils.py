@@ -16,6 +16,7 @@
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
+import os
 import random
 import numpy as np
 
@@ -196,6 +197,112 @@ def get_max_len(strokes):
   return max_len
 
 
+# splits of a sketch-rnn dataset, as stored in its .npz file
+FLAT_SPLITS = ("train", "valid", "test")
+
+
+def _flat_paths(path_prefix):
+  """Return the paths of the points and offsets files of a flat stroke set."""
+  return path_prefix + ".points.npy", path_prefix + ".offsets.npy"
+
+
+def save_flat_strokes(strokes, path_prefix):
+  """Save a list of sketches as one flat array of points and their offsets.
+
+  The points of all sketches are stored, in their original dtype, in
+  `<path_prefix>.points.npy`. `<path_prefix>.offsets.npy` holds the index of
+  the first point of each sketch followed by the total number of points, so
+  the points of sketch i are points[offsets[i]:offsets[i + 1]].
+  """
+  lengths = np.array([len(stroke) for stroke in strokes], dtype=np.int64)
+  offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+  if len(lengths):
+    points = np.concatenate(list(strokes))
+  else:
+    points = np.zeros((0, 3), dtype=np.int16)
+  points_path, offsets_path = _flat_paths(path_prefix)
+  np.save(points_path, points)
+  np.save(offsets_path, offsets)
+
+
+def convert_npz_to_flat(npz_path, path_prefix=None):
+  """Convert a train/valid/test .npz dataset into flat stroke sets.
+
+  Each split is saved with save_flat_strokes under `<path_prefix>.<split>`.
+  path_prefix defaults to npz_path without its extension.
+  """
+  if path_prefix is None:
+    path_prefix = os.path.splitext(npz_path)[0]
+  # the splits are object arrays of sketches, which are pickled
+  data = np.load(npz_path, allow_pickle=True)
+  for split in FLAT_SPLITS:
+    save_flat_strokes(data[split], "%s.%s" % (path_prefix, split))
+  return path_prefix
+
+
+def flat_dataset_exists(path_prefix):
+  """Return whether all splits of a dataset were saved as flat stroke sets."""
+  return all(os.path.exists(path)
+             for split in FLAT_SPLITS
+             for path in _flat_paths("%s.%s" % (path_prefix, split)))
+
+
+def load_flat_dataset(path_prefixes):
+  """Memory-map the train, valid and test splits of several flat datasets."""
+  return [FlatStrokes(["%s.%s" % (prefix, split) for prefix in path_prefixes])
+          for split in FLAT_SPLITS]
+
+
+class FlatStrokes(object):
+  """Read-only sketches memory-mapped from one or more flat stroke sets.
+
+  The sets written by save_flat_strokes are joined without being copied: only
+  their offsets are read into memory, and points are read from disk as
+  sketches are accessed. Sketches are returned in stroke-3 format.
+  """
+
+  def __init__(self, path_prefixes):
+    self._points = []
+    starts = []
+    lengths = []
+    for path_prefix in path_prefixes:
+      points_path, offsets_path = _flat_paths(path_prefix)
+      self._points.append(np.load(points_path, mmap_mode="r"))
+      offsets = np.load(offsets_path)
+      starts.append(offsets[:-1])
+      lengths.append(np.diff(offsets))
+    # index of the set each sketch is stored in, and its first point there
+    self._sources = np.repeat(np.arange(len(lengths)),
+                              [len(l) for l in lengths])
+    self._starts = np.concatenate(starts or [np.zeros(0, dtype=np.int64)])
+    self.lengths = np.concatenate(lengths or [np.zeros(0, dtype=np.int64)])
+
+  def __len__(self):
+    return len(self.lengths)
+
+  def __getitem__(self, i):
+    start = self._starts[i]
+    return np.array(self._points[self._sources[i]][start:start +
+                                                   self.lengths[i]])
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self[i]
+
+  def gather(self, indices):
+    """Return the points of the given sketches, concatenated, as float32."""
+    indices = np.asarray(indices, dtype=np.int64)
+    lengths = self.lengths[indices]
+    rows = np.repeat(self._starts[indices] - np.cumsum(lengths) + lengths,
+                     lengths) + np.arange(lengths.sum())
+    sources = np.repeat(self._sources[indices], lengths)
+    result = np.empty((len(rows), 3), dtype=np.float32)
+    for source in np.unique(sources):
+      mask = sources == source
+      result[mask] = self._points[source][rows[mask]]
+    return result
+
+
 class DataLoader(object):
   """Class for loading data."""
 
@@ -329,3 +436,218 @@ class DataLoader(object):
       result[i, 0, 3] = self.start_stroke_token[3]
       result[i, 0, 4] = self.start_stroke_token[4]
     return result
+
+
+class ArrayDataLoader(object):
+  """Loads sketches into one flat array and serves padded batches.
+
+  Works like DataLoader, but all sketches are kept in a single float32 array
+  of stroke-3 points with an index of offsets, so loading, normalizing and
+  batching are vectorized instead of looping over sketches in Python.
+
+  `random_batch` shuffles the dataset once per epoch instead of for every
+  batch. With fewer sketches than `batch_size`, each batch holds every sketch
+  in a new random order, repeated to fill the batch. Sketches can also be
+  bucketed by length: the shuffled sketches of `bucket_pool_size` batches are
+  sorted by length before they are split into batches, so each batch holds
+  sketches of similar lengths. With
+  `pad_to_max_seq_length` False, batches are then only padded to their longest
+  sketch. The sketch-rnn Model has a fixed sequence length, so batches fed to
+  it must be padded to `max_seq_length`.
+
+  `strokes` may also be a FlatStrokes. Its points then stay on disk and only
+  the sketches of each batch are read, clipped and scaled.
+  """
+
+  def __init__(self,
+               strokes,
+               batch_size=100,
+               max_seq_length=250,
+               scale_factor=1.0,
+               random_scale_factor=0.0,
+               augment_stroke_prob=0.0,
+               limit=1000,
+               bucket_pool_size=1,
+               pad_to_max_seq_length=True):
+    self.batch_size = batch_size  # minibatch size
+    self.max_seq_length = max_seq_length  # N_max in sketch-rnn paper
+    self.scale_factor = scale_factor  # divide offsets by this factor
+    self.random_scale_factor = random_scale_factor  # data augmentation method
+    # Removes large gaps in the data. x and y offsets are clamped to have
+    # absolute value no greater than this limit.
+    self.limit = limit
+    self.augment_stroke_prob = augment_stroke_prob  # data augmentation method
+    self.start_stroke_token = [0, 0, 1, 0, 0]  # S_0 in sketch-rnn paper
+    # number of batches whose sketches are sorted by length together
+    self.bucket_pool_size = bucket_pool_size
+    self.pad_to_max_seq_length = pad_to_max_seq_length
+    # sets self.data (all points in stroke-3 format), self.lengths and
+    # self.offsets (the points of sketch i are data[offsets[i]:offsets[i+1]]),
+    # sorted by size
+    self.preprocess(strokes)
+    self._epoch_batches = []
+
+  def preprocess(self, strokes):
+    """Remove entries from strokes having > max_seq_length points."""
+    if isinstance(strokes, FlatStrokes):
+      lengths = strokes.lengths
+    else:
+      lengths = np.array([len(data) for data in strokes], dtype=np.int64)
+    keep = np.where(lengths <= self.max_seq_length)[0]
+    keep = keep[np.argsort(lengths[keep], kind="mergesort")]
+    count_data = len(keep)
+    if isinstance(strokes, FlatStrokes):
+      # points are clipped and divided by _point_scale as they are read
+      data = None
+      self._flat_strokes = strokes
+      self._flat_indices = keep
+      self._point_scale = self.scale_factor
+    elif count_data:
+      data = np.concatenate([strokes[i] for i in keep]).astype(np.float32)
+    else:
+      data = np.zeros((0, 3), dtype=np.float32)
+    if data is not None:
+      # removes large gaps from the data
+      np.clip(data, -self.limit, self.limit, out=data)
+      data[:, 0:2] /= self.scale_factor
+    self.data = data
+    self.lengths = lengths[keep]
+    self.offsets = np.concatenate([[0], np.cumsum(self.lengths)])
+    print("total images <= max_seq_len is %d" % count_data)
+    self.num_batches = int(count_data / self.batch_size)
+
+  def __len__(self):
+    return len(self.lengths)
+
+  @property
+  def strokes(self):
+    """A list of stroke-3 arrays, one per sketch, sorted by size."""
+    if self.data is None:
+      return np.split(self._points(np.arange(len(self.lengths))),
+                      self.offsets[1:-1])
+    return np.split(self.data, self.offsets[1:-1])
+
+  def random_sample(self):
+    """Return a random sample, in stroke-3 format as used by draw_strokes."""
+    return self._points([np.random.randint(len(self.lengths))])
+
+  def calculate_normalizing_scale_factor(self, chunk_size=10000):
+    """Calculate the normalizing factor explained in appendix of sketch-rnn."""
+    if self.data is not None:
+      return np.std(self.data[:, 0:2], dtype=np.float64)
+    # reads memory-mapped sketches chunk_size at a time
+    count = 0
+    total = 0.0
+    total_squares = 0.0
+    for start in range(0, len(self.lengths), chunk_size):
+      indices = np.arange(start, min(start + chunk_size, len(self.lengths)))
+      xy = self._points(indices)[:, 0:2].astype(np.float64)
+      count += xy.size
+      total += xy.sum()
+      total_squares += np.square(xy).sum()
+    mean = total / count
+    return np.sqrt(max(total_squares / count - mean * mean, 0.0))
+
+  def normalize(self, scale_factor=None):
+    """Normalize entire dataset (delta_x, delta_y) by the scaling factor."""
+    if scale_factor is None:
+      scale_factor = self.calculate_normalizing_scale_factor()
+    self.scale_factor = scale_factor
+    if self.data is None:
+      self._point_scale *= self.scale_factor
+    else:
+      self.data[:, 0:2] /= self.scale_factor
+
+  def _points(self, indices):
+    """Return a copy of the points of the given sketches, concatenated."""
+    indices = np.asarray(indices)
+    if self.data is None:
+      points = self._flat_strokes.gather(self._flat_indices[indices])
+      # removes large gaps from the data
+      np.clip(points, -self.limit, self.limit, out=points)
+      points[:, 0:2] /= self._point_scale
+      return points
+    lengths = self.lengths[indices]
+    starts = np.repeat(self.offsets[indices] - np.cumsum(lengths) + lengths,
+                       lengths)
+    return self.data[starts + np.arange(len(starts))]
+
+  def _shuffle_epoch(self):
+    """Shuffles the sketches into the batches of a new epoch."""
+    if not len(self.lengths):
+      raise ValueError("no sketches with at most %d points to batch" %
+                       self.max_seq_length)
+    # with fewer sketches than batch_size, an epoch is one batch of the
+    # shuffled sketches repeated
+    num_batches = max(self.num_batches, 1)
+    num_sketches = num_batches * self.batch_size
+    perm = np.resize(np.random.permutation(len(self.lengths)), num_sketches)
+    if self.bucket_pool_size > 1:
+      pool = self.batch_size * self.bucket_pool_size
+      for start in range(0, num_sketches, pool):
+        indices = perm[start:start + pool]
+        perm[start:start + pool] = indices[
+            np.argsort(self.lengths[indices], kind="mergesort")]
+    # batches are popped off the end of the list
+    self._epoch_batches = list(perm.reshape(num_batches, self.batch_size))
+    if self.bucket_pool_size > 1:
+      np.random.shuffle(self._epoch_batches)
+
+  def _get_batch_from_indices(self, indices):
+    """Given a list of indices, return the potentially augmented batch."""
+    indices = np.asarray(indices)
+    lengths = self.lengths[indices]
+    points = self._points(indices)
+    if self.random_scale_factor:
+      # stretch the x and y axis of each sketch randomly [1-e, 1+e]
+      scale = ((np.random.random((len(indices), 2)) - 0.5) * 2 *
+               self.random_scale_factor + 1.0)
+      points[:, 0:2] *= np.repeat(scale, lengths, axis=0)
+    x_batch = np.split(points, np.cumsum(lengths)[:-1])
+    if self.augment_stroke_prob > 0:
+      x_batch = [augment_strokes(data, self.augment_stroke_prob)
+                 for data in x_batch]
+      lengths = np.array([len(data) for data in x_batch])
+      points = np.concatenate(x_batch)
+    seq_len = np.array(lengths, dtype=int)
+    if self.pad_to_max_seq_length:
+      max_len = self.max_seq_length
+    else:
+      max_len = seq_len.max()
+    # We return three things: stroke-3 format, stroke-5 format, list of seq_len.
+    return x_batch, self._pad_points(points, seq_len, max_len), seq_len
+
+  def random_batch(self):
+    """Return the next batch of the shuffled training data."""
+    if not self._epoch_batches:
+      self._shuffle_epoch()
+    return self._get_batch_from_indices(self._epoch_batches.pop())
+
+  def get_batch(self, idx):
+    """Get the idx'th batch from the dataset."""
+    assert idx >= 0, "idx must be non negative"
+    assert idx < self.num_batches, "idx must be less than the number of batches"
+    start_idx = idx * self.batch_size
+    indices = np.arange(start_idx, start_idx + self.batch_size)
+    return self._get_batch_from_indices(indices)
+
+  def pad_batch(self, batch, max_len):
+    """Pad the batch to be stroke-5 bigger format as described in paper."""
+    assert len(batch) == self.batch_size
+    lengths = np.array([len(data) for data in batch], dtype=int)
+    return self._pad_points(np.concatenate(batch), lengths, max_len)
+
+  def _pad_points(self, points, lengths, max_len):
+    """Pads concatenated stroke-3 sketches into a stroke-5 batch."""
+    assert lengths.max() <= max_len
+    result = np.zeros((len(lengths), max_len + 1, 5), dtype=float)
+    # put in the first token, as described in sketch-rnn methodology
+    result[:, 0, :] = self.start_stroke_token
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    steps = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths,
+                                             lengths) + 1
+    result[rows, steps, 0:2] = points[:, 0:2]
+    result[rows, steps, 3] = points[:, 2]
+    result[rows, steps, 2] = 1 - points[:, 2]
+    result[np.arange(max_len + 1) > lengths[:, np.newaxis], 4] = 1
+    return result
@@ -0,0 +1,216 @@
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for sketch_rnn utils."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import tempfile
+
+# internal imports
+
+import numpy as np
+import tensorflow as tf
+
+from magenta.models.sketch_rnn import utils
+
+
+def random_sketches(lengths, seed=0):
+  """Returns random int16 stroke-3 sketches with the given numbers of points.
+
+  Some offsets are larger than the default limit of the data loaders.
+  """
+  rng = np.random.RandomState(seed)
+  sketches = []
+  for length in lengths:
+    sketch = rng.randint(-1500, 1500, (length, 3))
+    sketch[:, 2] = rng.randint(0, 2, length)
+    sketches.append(sketch.astype(np.int16))
+  return sketches
+
+
+class ArrayDataLoaderTest(tf.test.TestCase):
+
+  def setUp(self):
+    np.random.seed(0)
+    # Every sketch has a different length, so sorting by length is
+    # unambiguous and each sketch can be recognized by its length. Ten of the
+    # sketches are longer than max_seq_length.
+    self.lengths = np.random.permutation(np.arange(5, 55))
+    self.strokes = random_sketches(self.lengths)
+
+  def assertBatchesEqual(self, expected, actual):
+    expected_x, expected_padded, expected_seq_len = expected
+    actual_x, actual_padded, actual_seq_len = actual
+    self.assertEqual(len(expected_x), len(actual_x))
+    for expected_data, actual_data in zip(expected_x, actual_x):
+      self.assertAllClose(expected_data, actual_data)
+    self.assertAllClose(expected_padded, actual_padded)
+    self.assertAllEqual(expected_seq_len, actual_seq_len)
+
+  def testMatchesDataLoader(self):
+    data_loader = utils.DataLoader(
+        self.strokes, batch_size=8, max_seq_length=44, scale_factor=2.0)
+    array_loader = utils.ArrayDataLoader(
+        self.strokes, batch_size=8, max_seq_length=44, scale_factor=2.0)
+    self.assertEqual(40, len(array_loader))
+    self.assertEqual(data_loader.num_batches, array_loader.num_batches)
+    for expected, actual in zip(data_loader.strokes, array_loader.strokes):
+      self.assertAllClose(expected, actual)
+
+    scale_factor = array_loader.calculate_normalizing_scale_factor()
+    self.assertAllClose(data_loader.calculate_normalizing_scale_factor(),
+                        scale_factor, rtol=1e-5)
+    data_loader.normalize(scale_factor)
+    array_loader.normalize(scale_factor)
+
+    for i in range(array_loader.num_batches):
+      self.assertBatchesEqual(data_loader.get_batch(i),
+                              array_loader.get_batch(i))
+    batch = data_loader.get_batch(1)[0]
+    self.assertAllClose(data_loader.pad_batch(batch, 50),
+                        array_loader.pad_batch(batch, 50))
+
+  def testRandomBatchVisitsEachSketchOncePerEpoch(self):
+    for bucket_pool_size in [1, 2, 5]:
+      loader = utils.ArrayDataLoader(
+          self.strokes, batch_size=8, max_seq_length=44,
+          bucket_pool_size=bucket_pool_size)
+      for _ in range(2):
+        seq_lens = [loader.random_batch()[2]
+                    for _ in range(loader.num_batches)]
+        self.assertEqual(sorted(range(5, 45)),
+                         sorted(np.concatenate(seq_lens)))
+
+  def testRandomBatchWithFewerSketchesThanBatchSize(self):
+    for bucket_pool_size in [1, 2]:
+      loader = utils.ArrayDataLoader(
+          self.strokes[:3], batch_size=8, max_seq_length=60,
+          bucket_pool_size=bucket_pool_size)
+      self.assertEqual(0, loader.num_batches)
+      for _ in range(2):
+        _, padded, seq_len = loader.random_batch()
+        self.assertEqual((8, 61, 5), padded.shape)
+        # Every sketch is in the batch, repeated as evenly as possible.
+        counts = [np.sum(seq_len == length) for length in self.lengths[:3]]
+        self.assertEqual([2, 3, 3], sorted(counts))
+
+  def testRandomBatchWithNoSketches(self):
+    loader = utils.ArrayDataLoader(
+        self.strokes, batch_size=8, max_seq_length=4)
+    self.assertEqual(0, len(loader))
+    with self.assertRaises(ValueError):
+      loader.random_batch()
+
+  def testBucketedBatchesPaddedToLongestSketch(self):
+    loader = utils.ArrayDataLoader(
+        self.strokes, batch_size=8, max_seq_length=44, bucket_pool_size=5,
+        pad_to_max_seq_length=False)
+    batches = [loader.random_batch() for _ in range(loader.num_batches)]
+    for x_batch, padded, seq_len in batches:
+      self.assertEqual((8, seq_len.max() + 1, 5), padded.shape)
+      for data, length in zip(x_batch, seq_len):
+        self.assertEqual(length, len(data))
+
+    # The whole epoch is sorted by length, so the batches hold sketches of
+    # consecutive lengths.
+    self.assertEqual(
+        [list(range(start, start + 8)) for start in range(5, 45, 8)],
+        sorted(sorted(seq_len) for _, _, seq_len in batches))
+
+    loader.pad_to_max_seq_length = True
+    self.assertEqual((8, 45, 5), loader.random_batch()[1].shape)
+
+
+class FlatStrokesTest(tf.test.TestCase):
+
+  def setUp(self):
+    np.random.seed(0)
+    # Each split of each dataset gets sketches of different lengths.
+    lengths = np.random.permutation(np.arange(5, 65))
+    data_dir = tempfile.mkdtemp(dir=self.get_temp_dir())
+    self.datasets = []
+    for i, name in enumerate(['cat.npz', 'dog.npz']):
+      dataset = {}
+      for j, split in enumerate(utils.FLAT_SPLITS):
+        split_lengths = lengths[(3 * i + j) * 10:(3 * i + j + 1) * 10]
+        dataset[split] = np.empty(len(split_lengths), dtype=object)
+        dataset[split][:] = random_sketches(split_lengths, seed=3 * i + j)
+      path = os.path.join(data_dir, name)
+      np.savez(path, **dataset)
+      self.datasets.append((path, dataset))
+
+  def testConvertAndLoadFlatDataset(self):
+    prefixes = []
+    for path, _ in self.datasets:
+      prefix = os.path.splitext(path)[0]
+      self.assertFalse(utils.flat_dataset_exists(prefix))
+      self.assertEqual(prefix, utils.convert_npz_to_flat(path))
+      self.assertTrue(utils.flat_dataset_exists(prefix))
+      prefixes.append(prefix)
+
+    flat_splits = utils.load_flat_dataset(prefixes)
+    for split, flat_strokes in zip(utils.FLAT_SPLITS, flat_splits):
+      expected = (list(self.datasets[0][1][split]) +
+                  list(self.datasets[1][1][split]))
+      self.assertEqual(len(expected), len(flat_strokes))
+      self.assertAllEqual([len(data) for data in expected],
+                          flat_strokes.lengths)
+      for expected_data, data in zip(expected, flat_strokes):
+        self.assertEqual(np.int16, data.dtype)
+        self.assertAllEqual(expected_data, data)
+      self.assertAllEqual(expected[13], flat_strokes[13])
+
+      # Sketches from both datasets, out of order and repeated.
+      indices = [12, 3, 19, 0, 3, 10]
+      self.assertAllEqual(
+          np.concatenate([expected[i] for i in indices]).astype(np.float32),
+          flat_strokes.gather(indices))
+
+  def testArrayDataLoaderMatchesInMemory(self):
+    prefixes = [utils.convert_npz_to_flat(path) for path, _ in self.datasets]
+    flat_strokes = utils.load_flat_dataset(prefixes)[0]
+    strokes = (list(self.datasets[0][1]['train']) +
+               list(self.datasets[1][1]['train']))
+    flat_loader = utils.ArrayDataLoader(
+        flat_strokes, batch_size=4, max_seq_length=50, scale_factor=2.0)
+    array_loader = utils.ArrayDataLoader(
+        strokes, batch_size=4, max_seq_length=50, scale_factor=2.0)
+    self.assertEqual(len(array_loader), len(flat_loader))
+    self.assertEqual(array_loader.num_batches, flat_loader.num_batches)
+
+    # Computed from chunks of memory-mapped sketches.
+    scale_factor = array_loader.calculate_normalizing_scale_factor()
+    self.assertAllClose(
+        scale_factor,
+        flat_loader.calculate_normalizing_scale_factor(chunk_size=3),
+        rtol=1e-5)
+    array_loader.normalize(scale_factor)
+    flat_loader.normalize(scale_factor)
+
+    for expected, actual in zip(array_loader.strokes, flat_loader.strokes):
+      self.assertAllClose(expected, actual)
+    for i in range(array_loader.num_batches):
+      expected_x, expected_padded, expected_seq_len = array_loader.get_batch(i)
+      actual_x, actual_padded, actual_seq_len = flat_loader.get_batch(i)
+      for expected_data, actual_data in zip(expected_x, actual_x):
+        self.assertAllClose(expected_data, actual_data)
+      self.assertAllClose(expected_padded, actual_padded)
+      self.assertAllEqual(expected_seq_len, actual_seq_len)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -18,6 +18,7 @@ from magenta.music.chord_symbols_lib import chord_symbol_bass
 from magenta.music.chord_symbols_lib import chord_symbol_pitches
 from magenta.music.chord_symbols_lib import chord_symbol_quality
 from magenta.music.chord_symbols_lib import chord_symbol_root
+from magenta.music.chord_symbols_lib import ChordSymbolCache
 from magenta.music.chord_symbols_lib import ChordSymbolException
 from magenta.music.chord_symbols_lib import pitches_to_chord_symbol
 from magenta.music.chord_symbols_lib import transpose_chord_symbol
@@ -40,10 +40,14 @@ transposition only modifies the root and bass, leaving the chord kind and scale
 degree modifications unchanged.
 """
 
+import collections
 import itertools
 import re
+import threading
 
+# internal imports
 from magenta.music import constants
+from magenta.pipelines import statistics
 
 # Chord quality enum.
 CHORD_QUALITY_MAJOR = 0
@@ -444,16 +448,27 @@ def _pitch_class_to_midi(step, alter):
   return (_STEPS_MIDI[step] + alter) % 12
 
 
+# Scale step of each scale degree name used when naming chords from pitches.
+_SCALE_DEGREE_STEPS = dict(
+    (degree_str, _parse_degree(degree_str)[0])
+    for degree_strs in _SCALE_DEGREES for degree_str in degree_strs)
+
+# Chord kind abbreviations and scale degree sets, largest chord kinds first.
+# Chord kinds of the same size stay in the order of _CHORD_KINDS.
+_CHORD_KIND_DEGREE_SETS = [
+    (abbrev, degree_set) for _, abbrev, degree_set in sorted(
+        [(-len(degrees), abbrevs[0], frozenset(degrees))
+         for abbrevs, degrees in _CHORD_KINDS],
+        key=lambda kind: kind[0])]
+
+
 def _largest_chord_kind_from_degrees(degrees):
   """Find the largest chord that is contained in a set of scale degrees."""
-  best_chord_abbrev = None
-  best_chord_degrees = []
-  for chord_abbrevs, chord_degrees in _CHORD_KINDS:
-    if len(chord_degrees) <= len(best_chord_degrees):
-      continue
-    if not set(chord_degrees) - set(degrees):
-      best_chord_abbrev, best_chord_degrees = chord_abbrevs[0], chord_degrees
-  return best_chord_abbrev
+  degrees = set(degrees)
+  for chord_abbrev, chord_degrees in _CHORD_KIND_DEGREE_SETS:
+    if chord_degrees <= degrees:
+      return chord_abbrev
+  return None
 
 
 def _largest_chord_kind_from_relative_pitches(relative_pitches):
@@ -462,8 +477,7 @@ def _largest_chord_kind_from_relative_pitches(relative_pitches):
   best_chord_abbrev = None
   best_degrees = []
   for degrees in itertools.product(*scale_degrees):
-    degree_steps = [_parse_degree(degree_str)[0]
-                    for degree_str in degrees]
+    degree_steps = [_SCALE_DEGREE_STEPS[degree_str] for degree_str in degrees]
     if len(degree_steps) > len(set(degree_steps)):
       # This set of scale degrees has duplicates, which we do not currently
       # allow.
@@ -582,17 +596,38 @@ def pitches_to_chord_symbol(pitches):
 
   # Convert to pitch classes and dedupe.
   pitch_classes = set(pitch % 12 for pitch in pitches)
-
-  # Try using the bass note as root first.
   bass = min(pitches) % 12
-  pitch_classes = [bass] + list(pitch_classes - set([bass]))
+
+  figure = _pitch_classes_to_chord_symbol(bass, pitch_classes)
+  if figure is None:
+    raise ChordSymbolException(
+        'Unable to determine chord symbol from pitches: %s' % str(pitches))
+  return figure
+
+
+def _pitch_classes_to_chord_symbol(bass, pitch_classes):
+  """Converts a bass pitch class and set of pitch classes to a chord symbol.
+
+  Args:
+    bass: The integer pitch class of the lowest pitch.
+    pitch_classes: A set of integer pitch classes, including `bass`.
+
+  Returns:
+    A chord symbol figure string representing the chord, or None if no known
+    chord symbol corresponds to the pitch classes.
+  """
+  # Try using the bass note as root first. The remaining pitch classes are
+  # tried in ascending order so that ties between roots, and the order of the
+  # resulting modifications, don't depend on set iteration order.
+  pitch_classes = [bass] + sorted(pitch_classes - set([bass]))
 
   # Try each pitch class in turn as root.
   best_root = None
   best_abbrev = None
   best_degrees = []
   for root in pitch_classes:
-    relative_pitches = set((pitch - root) % 12 for pitch in pitch_classes)
+    relative_pitches = sorted(set((pitch - root) % 12
+                                  for pitch in pitch_classes))
     abbrev, degrees = _largest_chord_kind_from_relative_pitches(
         relative_pitches)
     if abbrev is not None:
@@ -604,8 +639,7 @@ def pitches_to_chord_symbol(pitches):
         best_degrees = degrees
 
   if best_root is None:
-    raise ChordSymbolException(
-        'Unable to determine chord symbol from pitches: %s' % str(pitches))
+    return None
 
   root_str = _pitch_class_to_string(*_transpose_pitch_class('C', 0, best_root))
   kind_str = best_abbrev
@@ -629,6 +663,105 @@ def pitches_to_chord_symbol(pitches):
     return '%s%s%s/%s' % (root_str, kind_str, modifications_str, bass_str)
 
 
+class ChordSymbolCache(object):
+  """Bounded LRU cache of chord symbols inferred from pitches.
+
+  The chord symbol inferred for a set of pitches depends only on the set of
+  pitch classes and the bass pitch class, and real music repeats the same few
+  dozen such sets constantly. This cache maps each (bass, pitch class set) pair
+  to its chord symbol, discarding the least recently used entries beyond
+  `max_size`. Pitch sets with no known chord symbol are cached too.
+
+  Chord symbols are inferred from pitch classes in ascending order, so a cached
+  chord symbol is always the one `pitches_to_chord_symbol` returns for the same
+  pitches, even for ambiguous pitch sets.
+
+  Cache hits and misses are counted; see `get_stats`. The cache is thread-safe.
+  """
+
+  def __init__(self, max_size=4096):
+    """Constructs a ChordSymbolCache.
+
+    Args:
+      max_size: The maximum number of chord symbols to cache.
+    """
+    self._max_size = max_size
+    self._figures = collections.OrderedDict()
+    self._lock = threading.Lock()
+    self._hits = 0
+    self._misses = 0
+
+  @property
+  def hits(self):
+    """The number of chord symbols found in the cache."""
+    return self._hits
+
+  @property
+  def misses(self):
+    """The number of chord symbols not found in the cache."""
+    return self._misses
+
+  def __len__(self):
+    return len(self._figures)
+
+  def clear(self):
+    """Removes all cached chord symbols and resets the hit and miss counts."""
+    with self._lock:
+      self._figures.clear()
+      self._hits = 0
+      self._misses = 0
+
+  def get_stats(self):
+    """Returns `statistics.Counter` objects counting cache hits and misses."""
+    with self._lock:
+      return [statistics.Counter('chord_cache_hits', self._hits),
+              statistics.Counter('chord_cache_misses', self._misses)]
+
+  def pitches_to_chord_symbol(self, pitches):
+    """Converts a set of pitches to a chord symbol, using the cache.
+
+    See the module-level `pitches_to_chord_symbol`.
+
+    Args:
+      pitches: A python list of integer pitch values.
+
+    Returns:
+      A chord symbol figure string representing the chord containing the
+      specified pitches.
+
+    Raises:
+      ChordSymbolException: If no known chord symbol corresponds to the provided
+          pitches.
+    """
+    if not pitches:
+      return constants.NO_CHORD
+
+    bass = min(pitches) % 12
+    key = (bass, tuple(sorted(set(pitch % 12 for pitch in pitches))))
+
+    with self._lock:
+      hit = key in self._figures
+      if hit:
+        # Move the entry to the most recently used end.
+        figure = self._figures.pop(key)
+        self._figures[key] = figure
+        self._hits += 1
+      else:
+        self._misses += 1
+
+    if not hit:
+      figure = _pitch_classes_to_chord_symbol(bass, set(key[1]))
+      with self._lock:
+        self._figures[key] = figure
+        while len(self._figures) > self._max_size:
+          self._figures.popitem(last=False)
+
+    if figure is None:
+      raise ChordSymbolException(
+          'Unable to determine chord symbol from pitches: %s' % str(pitches))
+    return figure
+
+
 def chord_symbol_pitches(figure):
   """Return the pitch classes contained in a chord.
 
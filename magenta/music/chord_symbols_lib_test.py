@@ -220,5 +220,56 @@ class ChordSymbolFunctionsTest(tf.test.TestCase):
     self.assertEqual(CHORD_QUALITY_OTHER, quality)
 
 
+class ChordSymbolCacheTest(tf.test.TestCase):
+
+  def testPitchesToChordSymbol(self):
+    cache = chord_symbols_lib.ChordSymbolCache()
+    for pitches in [[60, 64, 67], [59, 62, 67], [63, 67, 70, 72, 74],
+                    [67, 71, 72, 74, 77], [60, 64, 68, 70, 75], []]:
+      self.assertEqual(chord_symbols_lib.pitches_to_chord_symbol(pitches),
+                       cache.pitches_to_chord_symbol(pitches))
+
+  def testHitsAndMisses(self):
+    cache = chord_symbols_lib.ChordSymbolCache()
+    self.assertEqual('C', cache.pitches_to_chord_symbol([60, 64, 67]))
+    # Other voicings with the same bass pitch class are cache hits.
+    self.assertEqual('C', cache.pitches_to_chord_symbol([48, 67, 76, 72]))
+    self.assertEqual('C', cache.pitches_to_chord_symbol(set([60, 64, 67])))
+    # Changing the bass pitch class is a miss.
+    self.assertEqual('C/E', cache.pitches_to_chord_symbol([52, 60, 67]))
+    self.assertEqual(2, cache.hits)
+    self.assertEqual(2, cache.misses)
+    self.assertEqual(2, len(cache))
+
+    stats = dict((stat.name, stat.count) for stat in cache.get_stats())
+    self.assertEqual({'chord_cache_hits': 2, 'chord_cache_misses': 2}, stats)
+
+    cache.clear()
+    self.assertEqual(0, cache.hits)
+    self.assertEqual(0, cache.misses)
+    self.assertEqual(0, len(cache))
+
+  def testLeastRecentlyUsedEviction(self):
+    cache = chord_symbols_lib.ChordSymbolCache(max_size=2)
+    cache.pitches_to_chord_symbol([60, 64, 67])
+    cache.pitches_to_chord_symbol([62, 65, 69])
+    cache.pitches_to_chord_symbol([60, 64, 67])
+    # Evicts the D minor chord, the least recently used.
+    cache.pitches_to_chord_symbol([64, 67, 71])
+    self.assertEqual(2, len(cache))
+    cache.pitches_to_chord_symbol([60, 64, 67])
+    self.assertEqual(2, cache.hits)
+    cache.pitches_to_chord_symbol([62, 65, 69])
+    self.assertEqual(2, cache.hits)
+    self.assertEqual(4, cache.misses)
+
+  def testInvalidChord(self):
+    cache = chord_symbols_lib.ChordSymbolCache()
+    for _ in range(2):
+      with self.assertRaises(chord_symbols_lib.ChordSymbolException):
+        cache.pitches_to_chord_symbol(range(60, 72))
+    self.assertEqual(1, cache.hits)
+
+
 if __name__ == '__main__':
   tf.test.main()
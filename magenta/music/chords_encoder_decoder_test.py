@@ -181,6 +181,15 @@ class PitchChordsEncoderDecoderTest(tf.test.TestCase):
                 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
     self.assertEquals(expected, input_)
 
+  def testEventsToCompactInputs(self):
+    # The chord inputs are not one-hot, so the default compact inputs store
+    # them as dense features.
+    events = [NO_CHORD, 'C', 'F#m', 'G/F']
+    input_indices, dense_inputs = self.enc.events_to_compact_inputs(events)
+    self.assertEqual([[], [], [], []], input_indices)
+    self.assertEqual(self.enc.events_to_inputs(events), dense_inputs)
+
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -205,20 +205,81 @@ class EventSequenceEncoderDecoder(object):
     """
     pass
 
-  def encode(self, events):
+  def events_to_inputs(self, events):
+    """Returns the input vectors for every position in the event sequence.
+
+    Subclasses can override this to encode the whole sequence at once, which is
+    much faster than calling self.events_to_input for each position.
+
+    Args:
+      events: A list-like sequence of events.
+
+    Returns:
+      A list of len(events) input vectors, where the ith input vector is the
+      one returned by self.events_to_input for position i.
+    """
+    return [self.events_to_input(events, i) for i in range(len(events))]
+
+  def events_to_labels(self, events):
+    """Returns the labels for every position in the event sequence.
+
+    Subclasses can override this to encode the whole sequence at once, which is
+    much faster than calling self.events_to_label for each position.
+
+    Args:
+      events: A list-like sequence of events.
+
+    Returns:
+      A list of len(events) labels, where the ith label is the one returned by
+      self.events_to_label for position i.
+    """
+    return [self.events_to_label(events, i) for i in range(len(events))]
+
+  def events_to_compact_inputs(self, events):
+    """Returns the compact input vectors for every position in the sequence.
+
+    A compact input vector is the list of indices of its one-hot entries and
+    the list of its remaining dense features. The dense features come after
+    all the one-hot entries in the full input vector.
+
+    This default implementation has no knowledge of which input features are
+    one-hot, so it stores every input vector from self.events_to_inputs as
+    dense features with an empty index list. Encoders whose input vectors are
+    mostly one-hot should override this to store their one-hot indices.
+
+    Args:
+      events: A list-like sequence of events.
+
+    Returns:
+      input_indices: A list of len(events) index lists, each with the same
+          length.
+      dense_inputs: A list of len(events) dense feature vectors, each a list
+          of floats with the same length, or None if the input vectors have no
+          dense features.
+    """
+    return [[] for _ in range(len(events))], self.events_to_inputs(events)
+
+  def encode(self, events, compact=False):
     """Returns a SequenceExample for the given event sequence.
 
     Args:
       events: A list-like sequence of events.
+      compact: If True, store the inputs in the compact format returned by
+          self.events_to_compact_inputs rather than as full input vectors.
+          `sequence_example_lib.get_padded_batch` expands compact inputs back
+          to full input vectors.
 
     Returns:
       A tf.train.SequenceExample containing inputs and labels.
     """
-    inputs = []
-    labels = []
-    for i in range(len(events) - 1):
-      inputs.append(self.events_to_input(events, i))
-      labels.append(self.events_to_label(events, i + 1))
+    labels = self.events_to_labels(events)[1:]
+    if compact:
+      input_indices, dense_inputs = self.events_to_compact_inputs(events)
+      if dense_inputs is not None:
+        dense_inputs = dense_inputs[:-1]
+      return sequence_example_lib.make_compact_sequence_example(
+          input_indices[:-1], labels, dense_inputs)
+    inputs = self.events_to_inputs(events)[:-1]
     return sequence_example_lib.make_sequence_example(inputs, labels)
 
   def get_inputs_batch(self, event_sequences, full_length=False):
@@ -241,12 +302,10 @@ class EventSequenceEncoderDecoder(object):
     """
     inputs_batch = []
     for events in event_sequences:
-      inputs = []
       if full_length:
-        for i in range(len(events)):
-          inputs.append(self.events_to_input(events, i))
+        inputs = self.events_to_inputs(events)
       else:
-        inputs.append(self.events_to_input(events, len(events) - 1))
+        inputs = [self.events_to_input(events, len(events) - 1)]
       inputs_batch.append(inputs)
     return inputs_batch
 
@@ -365,6 +424,47 @@ class OneHotEventSequenceEncoderDecoder(EventSequenceEncoderDecoder):
     """
     return self._one_hot_encoding.encode_event(events[position])
 
+  def events_to_inputs(self, events):
+    """Returns the one-hot input vectors for every position in the sequence.
+
+    Args:
+      events: A list-like sequence of events.
+
+    Returns:
+      A list of len(events) input vectors, each a list of floats.
+    """
+    indices = np.array(
+        [self._one_hot_encoding.encode_event(event) for event in events],
+        dtype=np.int64)
+    inputs = np.zeros([len(indices), self.input_size])
+    inputs[np.arange(len(indices)), indices] = 1.0
+    return inputs.tolist()
+
+  def events_to_compact_inputs(self, events):
+    """Returns the compact input vectors for every position in the sequence.
+
+    Args:
+      events: A list-like sequence of events.
+
+    Returns:
+      input_indices: A list of len(events) single-index lists.
+      dense_inputs: None, since the input vectors are entirely one-hot.
+    """
+    input_indices = [[self._one_hot_encoding.encode_event(event)]
+                     for event in events]
+    return input_indices, None
+
+  def events_to_labels(self, events):
+    """Returns the labels for every position in the event sequence.
+
+    Args:
+      events: A list-like sequence of events.
+
+    Returns:
+      A list of len(events) labels, each an integer.
+    """
+    return [self._one_hot_encoding.encode_event(event) for event in events]
+
   def class_index_to_event(self, class_index, events):
     """Returns the event for the given class index.
 
@@ -529,6 +629,146 @@ class LookbackEventSequenceEncoderDecoder(EventSequenceEncoderDecoder):
     # specific event.
     return self._one_hot_encoding.encode_event(events[position])
 
+  def _lookback_repeats(self, events):
+    """Returns which events repeat the event at each lookback distance.
+
+    Args:
+      events: A list of events.
+
+    Returns:
+      A list with a boolean numpy array for each lookback distance. Element
+      `position` of the ith array is True if `position` is at least the ith
+      lookback distance and the event at `position` equals the event that
+      lookback distance earlier.
+    """
+    repeats = []
+    for lookback_distance in self._lookback_distances:
+      is_repeat = np.zeros(len(events), dtype=bool)
+      is_repeat[lookback_distance:] = [
+          event == lookback_event
+          for event, lookback_event in zip(events[lookback_distance:], events)]
+      repeats.append(is_repeat)
+    return repeats
+
+  def _events_to_compact_array(self, events):
+    """Returns the compact input vectors as numpy arrays.
+
+    Args:
+      events: A list of events.
+
+    Returns:
+      input_indices: An int64 numpy array of shape
+          [len(events), 1 + num_lookbacks] with the index of the one-hot entry
+          for the current event and for the next event of each lookback.
+      dense_inputs: A float numpy array of shape
+          [len(events), binary_counter_bits + num_lookbacks] with the binary
+          counters and whether the current event is repeating each lookback.
+    """
+    num_classes = self._one_hot_encoding.num_classes
+    num_lookbacks = len(self._lookback_distances)
+    positions = np.arange(len(events))
+    indices = np.array(
+        [self._one_hot_encoding.encode_event(event) for event in events],
+        dtype=np.int64)
+    default_index = self._one_hot_encoding.encode_event(
+        self._one_hot_encoding.default_event)
+
+    input_indices = np.zeros([len(events), 1 + num_lookbacks], dtype=np.int64)
+    dense_inputs = np.zeros(
+        [len(events), self._binary_counter_bits + num_lookbacks])
+
+    # Last event.
+    input_indices[:, 0] = indices
+
+    # Next event if repeating N positions ago.
+    for i, lookback_distance in enumerate(self._lookback_distances):
+      lookback_positions = positions - lookback_distance + 1
+      lookback_indices = np.where(
+          lookback_positions < 0, default_index,
+          indices[np.maximum(lookback_positions, 0)])
+      input_indices[:, i + 1] = (i + 1) * num_classes + lookback_indices
+
+    # Binary time counter giving the metric location of the *next* event.
+    for i in range(self._binary_counter_bits):
+      dense_inputs[:, i] = np.where(((positions + 1) // 2 ** i) % 2, 1.0, -1.0)
+
+    # Last event is repeating N bars ago.
+    for i, is_repeat in enumerate(self._lookback_repeats(events)):
+      dense_inputs[is_repeat, self._binary_counter_bits + i] = 1.0
+
+    return input_indices, dense_inputs
+
+  def events_to_inputs(self, events):
+    """Returns the input vectors for every position in the event sequence.
+
+    Equivalent to calling self.events_to_input for each position, but each
+    event is only encoded once and the input matrix is built with numpy.
+
+    Args:
+      events: A list-like sequence of events.
+
+    Returns:
+      A list of len(events) input vectors, each a self.input_size length list
+      of floats.
+    """
+    input_indices, dense_inputs = self._events_to_compact_array(list(events))
+    num_dense = dense_inputs.shape[1]
+    inputs = np.zeros([len(input_indices), self.input_size])
+    inputs[np.arange(len(input_indices))[:, np.newaxis], input_indices] = 1.0
+    inputs[:, self.input_size - num_dense:] = dense_inputs
+    return inputs.tolist()
+
+  def events_to_compact_inputs(self, events):
+    """Returns the compact input vectors for every position in the sequence.
+
+    Each index list holds the one-hot index of the current event followed by
+    the one-hot index of the next event for each lookback, offset as in
+    self.events_to_input. The dense features are the binary counters followed
+    by whether the current event is repeating each lookback.
+
+    Args:
+      events: A list-like sequence of events.
+
+    Returns:
+      input_indices: A list of len(events) index lists, each with
+          1 + len(lookback_distances) indices.
+      dense_inputs: A list of len(events) dense feature vectors, each with
+          binary_counter_bits + len(lookback_distances) floats.
+    """
+    input_indices, dense_inputs = self._events_to_compact_array(list(events))
+    return input_indices.tolist(), dense_inputs.tolist()
+
+  def events_to_labels(self, events):
+    """Returns the labels for every position in the event sequence.
+
+    Equivalent to calling self.events_to_label for each position, but each
+    event is only encoded once.
+
+    Args:
+      events: A list-like sequence of events.
+
+    Returns:
+      A list of len(events) labels, each an integer.
+    """
+    events = list(events)
+    num_classes = self._one_hot_encoding.num_classes
+    labels = np.array(
+        [self._one_hot_encoding.encode_event(event) for event in events],
+        dtype=np.int64)
+
+    # More distant repeats take precedence, so they are applied last.
+    for i, is_repeat in enumerate(self._lookback_repeats(events)):
+      labels[is_repeat] = num_classes + i
+
+    if self._lookback_distances:
+      default_event = self._one_hot_encoding.default_event
+      is_default = np.array([event == default_event for event in events],
+                            dtype=bool)
+      is_default[self._lookback_distances[-1]:] = False
+      labels[is_default] = num_classes + len(self._lookback_distances) - 1
+
+    return labels.tolist()
+
   def class_index_to_event(self, class_index, events):
     """Returns the event for the given class index.
 
@@ -686,11 +926,14 @@ class ConditionalEventSequenceEncoderDecoder(object):
                        '(%d control events but %d target events)' % (
                            len(control_events), len(target_events)))
 
-    inputs = []
-    labels = []
-    for i in range(len(target_events) - 1):
-      inputs.append(self.events_to_input(control_events, target_events, i))
-      labels.append(self.events_to_label(target_events, i + 1))
+    control_inputs = self._control_encoder_decoder.events_to_inputs(
+        control_events)
+    target_inputs = self._target_encoder_decoder.events_to_inputs(
+        target_events)
+    inputs = [control_input + target_input
+              for control_input, target_input in zip(control_inputs[1:],
+                                                     target_inputs[:-1])]
+    labels = self._target_encoder_decoder.events_to_labels(target_events)[1:]
     return sequence_example_lib.make_sequence_example(inputs, labels)
 
   def get_inputs_batch(self, control_events, target_event_sequences,
@@ -769,20 +1012,23 @@ class ConditionalEventSequenceEncoderDecoder(object):
 class EncoderPipeline(pipeline.Pipeline):
   """A pipeline that converts an EventSequence to a model encoding."""
 
-  def __init__(self, input_type, encoder_decoder, name=None):
+  def __init__(self, input_type, encoder_decoder, name=None, compact=False):
     """Constructs an EncoderPipeline.
 
     Args:
       input_type: The type this pipeline expects as input.
       encoder_decoder: An EventSequenceEncoderDecoder.
       name: A unique pipeline name.
+      compact: If True, output SequenceExamples with compact inputs. See
+          EventSequenceEncoderDecoder.encode.
     """
     super(EncoderPipeline, self).__init__(
         input_type=input_type,
         output_type=tf.train.SequenceExample,
         name=name)
     self._encoder_decoder = encoder_decoder
+    self._compact = compact
 
   def transform(self, seq):
-    encoded = self._encoder_decoder.encode(seq)
+    encoded = self._encoder_decoder.encode(seq, compact=self._compact)
     return [encoded]
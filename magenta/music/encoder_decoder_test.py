@@ -50,6 +50,20 @@ class OneHotEventSequenceEncoderDecoderTest(tf.test.TestCase):
     self.assertEqual(2, self.enc.events_to_label(events, 3))
     self.assertEqual(0, self.enc.events_to_label(events, 4))
 
+  def testEventsToInputs(self):
+    events = [0, 1, 0, 2, 0]
+    self.assertEqual([[1.0, 0.0, 0.0],
+                      [0.0, 1.0, 0.0],
+                      [1.0, 0.0, 0.0],
+                      [0.0, 0.0, 1.0],
+                      [1.0, 0.0, 0.0]],
+                     self.enc.events_to_inputs(events))
+    self.assertEqual([], self.enc.events_to_inputs([]))
+
+  def testEventsToLabels(self):
+    events = [0, 1, 0, 2, 0]
+    self.assertEqual([0, 1, 0, 2, 0], self.enc.events_to_labels(events))
+
   def testClassIndexToEvent(self):
     events = [0, 1, 0, 2, 0]
     self.assertEqual(0, self.enc.class_index_to_event(0, events))
@@ -68,6 +82,20 @@ class OneHotEventSequenceEncoderDecoderTest(tf.test.TestCase):
         expected_inputs, expected_labels)
     self.assertEqual(sequence_example, expected_sequence_example)
 
+  def testEventsToCompactInputs(self):
+    events = [0, 1, 0, 2, 0]
+    input_indices, dense_inputs = self.enc.events_to_compact_inputs(events)
+    self.assertEqual([[0], [1], [0], [2], [0]], input_indices)
+    self.assertIsNone(dense_inputs)
+
+  def testEncodeCompact(self):
+    events = [0, 1, 0, 2, 0]
+    sequence_example = self.enc.encode(events, compact=True)
+    expected_sequence_example = (
+        sequence_example_lib.make_compact_sequence_example(
+            [[0], [1], [0], [2]], [1, 0, 2, 0]))
+    self.assertEqual(sequence_example, expected_sequence_example)
+
   def testGetInputsBatch(self):
     event_sequences = [[0, 1, 0, 2, 0], [0, 1, 2]]
     expected_inputs_1 = [[1.0, 0.0, 0.0],
@@ -148,6 +176,30 @@ class LookbackEventSequenceEncoderDecoderTest(tf.test.TestCase):
     self.assertEqual(2, self.enc.events_to_label(events, 3))
     self.assertEqual(4, self.enc.events_to_label(events, 4))
 
+  def testEventsToInputs(self):
+    for events in [[], [0], [0, 1, 0, 2, 0], [2, 2, 0, 0, 1, 0, 2, 1, 1, 0]]:
+      self.assertEqual(
+          [self.enc.events_to_input(events, i) for i in range(len(events))],
+          self.enc.events_to_inputs(events))
+
+  def testEventsToLabels(self):
+    for events in [[], [0], [0, 1, 0, 2, 0], [2, 2, 0, 0, 1, 0, 2, 1, 1, 0]]:
+      self.assertEqual(
+          [self.enc.events_to_label(events, i) for i in range(len(events))],
+          self.enc.events_to_labels(events))
+
+  def testEventsToCompactInputs(self):
+    for events in [[], [0], [0, 1, 0, 2, 0], [2, 2, 0, 0, 1, 0, 2, 1, 1, 0]]:
+      input_indices, dense_inputs = self.enc.events_to_compact_inputs(events)
+      expanded_inputs = []
+      for indices, dense_input in zip(input_indices, dense_inputs):
+        self.assertEqual(3, len(indices))
+        input_ = [0.0] * (self.enc.input_size - len(dense_input))
+        for index in indices:
+          input_[index] = 1.0
+        expanded_inputs.append(input_ + dense_input)
+      self.assertEqual(self.enc.events_to_inputs(events), expanded_inputs)
+
   def testClassIndexToEvent(self):
     events = [0, 1, 0, 2, 0]
     self.assertEqual(0, self.enc.class_index_to_event(0, events[:1]))
@@ -201,6 +253,11 @@ class LookbackEventSequenceEncoderDecoderTest(tf.test.TestCase):
     self.assertEqual(2, enc.events_to_label(events, 3))
     self.assertEqual(0, enc.events_to_label(events, 4))
 
+    self.assertEqual(
+        [enc.events_to_input(events, i) for i in range(len(events))],
+        enc.events_to_inputs(events))
+    self.assertEqual([0, 1, 0, 2, 0], enc.events_to_labels(events))
+
     self.assertEqual(0, self.enc.class_index_to_event(0, events[:1]))
     self.assertEqual(1, self.enc.class_index_to_event(1, events[:1]))
     self.assertEqual(2, self.enc.class_index_to_event(2, events[:1]))
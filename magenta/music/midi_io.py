@@ -17,6 +17,8 @@ Input and output wrappers for converting between MIDI and other formats.
 """
 
 from collections import defaultdict
+import math
+import struct
 import sys
 # pylint: disable=g-import-not-at-top
 if sys.version_info.major <= 2:
@@ -27,6 +29,7 @@ import tempfile
 
 
 # internal imports
+import numpy as np
 import pretty_midi
 import tensorflow as tf
 
@@ -44,11 +47,61 @@ pretty_midi.pretty_midi.MAX_TICK = 1e10
 _PRETTY_MIDI_MAJOR_TO_MINOR_OFFSET = 12
 
 
+# Engines midi_to_sequence_proto can decode MIDI file contents with.
+# PRETTY_MIDI_ENGINE loads the file into a pretty_midi.PrettyMIDI object and
+# copies its contents. NATIVE_ENGINE decodes the Standard MIDI File chunks
+# directly into the NoteSequence, following how pretty_midi 0.2.8 interprets
+# them. With that version, both engines produce the same NoteSequences for the
+# MIDI files in the tests. Other files or pretty_midi versions may decode
+# differently.
+PRETTY_MIDI_ENGINE = 'pretty_midi'
+NATIVE_ENGINE = 'native'
+MIDI_ENGINES = [PRETTY_MIDI_ENGINE, NATIVE_ENGINE]
+
+# Number of data bytes following the status byte of each channel message type.
+_CHANNEL_MESSAGE_LENGTHS = {
+    0x8: 2,  # Note off.
+    0x9: 2,  # Note on.
+    0xA: 2,  # Polyphonic aftertouch.
+    0xB: 2,  # Control change.
+    0xC: 1,  # Program change.
+    0xD: 1,  # Channel aftertouch.
+    0xE: 2,  # Pitch bend.
+}
+
+# Number of data bytes following the status byte of system common and real-time
+# messages. Status bytes 0xF0 and 0xF7 start sysex events and 0xFF starts meta
+# events; the remaining status bytes are undefined.
+_SYSTEM_MESSAGE_LENGTHS = {
+    0xF1: 1, 0xF2: 2, 0xF3: 1, 0xF6: 0,
+    0xF8: 0, 0xFA: 0, 0xFB: 0, 0xFC: 0, 0xFE: 0,
+}
+
+# Minimum data lengths of meta events whose data is decoded by mido.
+_META_EVENT_MIN_LENGTHS = {
+    0x20: 1,  # MIDI channel prefix.
+    0x51: 3,  # Set tempo.
+    0x54: 5,  # SMPTE offset.
+    0x58: 4,  # Time signature.
+    0x59: 2,  # Key signature.
+}
+# Types of the meta events known to mido. mido drops the delta time of other
+# meta events.
+_KNOWN_META_EVENTS = frozenset(
+    [0x00, 0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x09, 0x20, 0x21, 0x2F,
+     0x51, 0x54, 0x58, 0x59, 0x7F])
+_META_SEQUENCE_NUMBER = 0x00
+_META_SET_TEMPO = 0x51
+_META_SMPTE_OFFSET = 0x54
+_META_TIME_SIGNATURE = 0x58
+_META_KEY_SIGNATURE = 0x59
+
+
 class MIDIConversionError(Exception):
   pass
 
 
-def midi_to_sequence_proto(midi_data):
+def midi_to_sequence_proto(midi_data, engine=PRETTY_MIDI_ENGINE):
   """Convert MIDI file contents to a tensorflow.magenta.NoteSequence proto.
 
   Converts a MIDI file encoded as a string into a
@@ -59,13 +112,29 @@ def midi_to_sequence_proto(midi_data):
   Args:
     midi_data: A string containing the contents of a MIDI file or populated
         pretty_midi.PrettyMIDI object.
+    engine: One of MIDI_ENGINES, the engine to decode a MIDI file string with.
+        Ignored if midi_data is a pretty_midi.PrettyMIDI object.
 
   Returns:
     A tensorflow.magenta.NoteSequence proto.
 
   Raises:
     MIDIConversionError: An improper MIDI mode was supplied.
+    ValueError: If `engine` is not one of MIDI_ENGINES.
   """
+  if engine not in MIDI_ENGINES:
+    raise ValueError('Unknown MIDI engine: %s' % engine)
+  if (engine == NATIVE_ENGINE and
+      not isinstance(midi_data, pretty_midi.PrettyMIDI)):
+    # pylint: disable=bare-except
+    try:
+      return _native_midi_to_sequence_proto(midi_data)
+    except MIDIConversionError:
+      raise
+    except:
+      raise MIDIConversionError('Midi decoding error %s: %s' %
+                                (sys.exc_info()[0], sys.exc_info()[1]))
+    # pylint: enable=bare-except
 
   # In practice many MIDI files cannot be decoded with pretty_midi. Catch all
   # errors here and try to log a meaningful message. So many different
@@ -175,6 +244,358 @@ def midi_to_sequence_proto(midi_data):
   return sequence
 
 
+class _NativeInstrument(object):
+  """The events of one instrument decoded by the native MIDI engine."""
+
+  def __init__(self, program, is_drum):
+    self.program = program
+    self.is_drum = is_drum
+    # (velocity, pitch, start tick, end tick) tuples.
+    self.notes = []
+    # (bend, tick) tuples.
+    self.pitch_bends = []
+    # (control number, control value, tick) tuples.
+    self.control_changes = []
+
+
+def _read_variable_int(data, pos):
+  """Reads a variable-length quantity, returning it and the next position."""
+  value = 0
+  while True:
+    byte = data[pos]
+    pos += 1
+    value = (value << 7) | (byte & 0x7F)
+    if byte < 0x80:
+      return value, pos
+
+
+def _read_bytes(data, pos, length):
+  """Returns `length` bytes of data starting at `pos`."""
+  if length < 0 or pos + length > len(data):
+    raise MIDIConversionError('Unexpected end of MIDI data')
+  return data[pos:pos + length]
+
+
+def _native_midi_to_sequence_proto(midi_data):
+  """Decodes Standard MIDI File contents directly into a NoteSequence.
+
+  Events are interpreted exactly as pretty_midi (and the mido parser it uses)
+  would interpret them, but without building any intermediate objects: each
+  track is decoded into per-instrument lists of ticks, and all ticks are then
+  converted to seconds in one pass over the tempo map.
+
+  Args:
+    midi_data: A string containing the contents of a MIDI file.
+
+  Returns:
+    A tensorflow.magenta.NoteSequence proto.
+
+  Raises:
+    MIDIConversionError: If the MIDI data could not be decoded.
+  """
+  data = bytearray(midi_data)
+
+  # Decode the header chunk.
+  if len(data) < 8 or data[0:4] != b'MThd':
+    raise MIDIConversionError('MThd not found. Probably not a MIDI file')
+  header_length = struct.unpack_from('>L', data, 4)[0]
+  if header_length < 6 or len(data) < 14:
+    raise MIDIConversionError('Truncated MIDI header')
+  _, num_tracks, resolution = struct.unpack_from('>hhh', data, 8)
+  pos = 8 + header_length
+
+  # Instruments keyed by (program, channel, track), in the order pretty_midi
+  # creates them: when the first note of the instrument ends.
+  instrument_map = {}
+  instruments = []
+  # Instruments holding the pitch bends and control changes of a channel that
+  # occur before its first note, keyed by (channel, track). pretty_midi shares
+  # their event lists with the instruments later created for the channel.
+  stragglers = {}
+
+  def get_instrument(program, channel, track, create_new):
+    """Mirrors pretty_midi's instrument lookup, see _load_instruments."""
+    if (program, channel, track) in instrument_map:
+      return instrument_map[(program, channel, track)]
+    if not create_new and (channel, track) in stragglers:
+      return stragglers[(channel, track)]
+    if create_new:
+      instrument = _NativeInstrument(program, channel == 9)
+      if (channel, track) in stragglers:
+        straggler = stragglers[(channel, track)]
+        instrument.control_changes = straggler.control_changes
+        instrument.pitch_bends = straggler.pitch_bends
+      instrument_map[(program, channel, track)] = instrument
+      instruments.append(instrument)
+    else:
+      instrument = _NativeInstrument(program, False)
+      stragglers[(channel, track)] = instrument
+    return instrument
+
+  # (tick, tempo in microseconds per quarter) tuples from the first track.
+  tempo_events = []
+  # (tick, numerator, denominator) tuples from the first track.
+  time_signature_events = []
+  # (tick, sharps or flats, mode) tuples from the first track.
+  key_signature_events = []
+  max_tick = None
+
+  for track in range(num_tracks):
+    chunk = _read_bytes(data, pos, 8)
+    if chunk[0:4] != b'MTrk':
+      raise MIDIConversionError('No MTrk header at start of track')
+    track_length = struct.unpack_from('>L', chunk, 4)[0]
+    pos += 8
+    track_start = pos
+
+    tick = 0
+    num_events = 0
+    last_status = None
+    program = [0] * 16
+    # Lists of (tick, velocity) of sounding notes, keyed by (channel, pitch).
+    note_ons = defaultdict(list)
+
+    # Like mido, keep reading until exactly the length of the track chunk has
+    # been consumed.
+    while pos - track_start != track_length:
+      delta, pos = _read_variable_int(data, pos)
+      tick += delta
+      num_events += 1
+      status = data[pos]
+      pos += 1
+      running_status = status < 0x80
+      if running_status:
+        if last_status is None:
+          raise MIDIConversionError('Running status without last status')
+        status = last_status
+        # The byte read was the first data byte.
+        pos -= 1
+      elif status != 0xFF:
+        last_status = status
+
+      if status == 0xFF:
+        meta_type = data[pos]
+        length, pos = _read_variable_int(data, pos + 1)
+        meta = _read_bytes(data, pos, length)
+        pos += length
+        if meta_type not in _KNOWN_META_EVENTS:
+          tick -= delta
+        if length < _META_EVENT_MIN_LENGTHS.get(meta_type, 0):
+          raise MIDIConversionError('Meta event 0x%02x is too short' %
+                                    meta_type)
+        if meta_type == _META_SEQUENCE_NUMBER and length == 1:
+          raise MIDIConversionError('Invalid sequence number meta event')
+        if meta_type == _META_SMPTE_OFFSET and (
+            meta[1] > 59 or meta[2] > 59 or meta[4] > 99):
+          raise MIDIConversionError('Invalid SMPTE offset')
+        if meta_type == _META_KEY_SIGNATURE:
+          sharps = meta[0] - 256 if meta[0] > 127 else meta[0]
+          if not -7 <= sharps <= 7 or meta[1] > 1:
+            raise MIDIConversionError('Invalid key signature')
+          if track == 0:
+            key_signature_events.append((tick, sharps, meta[1]))
+        elif track == 0 and meta_type == _META_SET_TEMPO:
+          tempo_events.append(
+              (tick, (meta[0] << 16) | (meta[1] << 8) | meta[2]))
+        elif meta_type == _META_TIME_SIGNATURE:
+          # mido rejects the denominators whose logarithm is inexact.
+          if math.log(2 ** meta[1], 2) != meta[1]:
+            raise MIDIConversionError('Invalid time signature denominator')
+          if track == 0:
+            time_signature_events.append((tick, meta[0], 2 ** meta[1]))
+        continue
+
+      if status == 0xF0 or status == 0xF7:
+        if running_status:
+          # mido drops the data byte read as running status.
+          pos += 1
+        length, pos = _read_variable_int(data, pos)
+        sysex = _read_bytes(data, pos, length)
+        pos += length
+        if sysex and sysex[0] == 0xF0:
+          sysex = sysex[1:]
+        if sysex and sysex[-1] == 0xF7:
+          sysex = sysex[:-1]
+        if any(byte > 127 for byte in sysex):
+          raise MIDIConversionError('Sysex data byte out of range')
+        continue
+
+      if status >= 0xF0:
+        if status not in _SYSTEM_MESSAGE_LENGTHS:
+          raise MIDIConversionError('Undefined status byte 0x%02x' % status)
+        length = _SYSTEM_MESSAGE_LENGTHS[status]
+        if running_status and not length:
+          raise MIDIConversionError('Running status for 0x%02x' % status)
+        message = _read_bytes(data, pos, length)
+        pos += length
+        if any(byte > 127 for byte in message):
+          raise MIDIConversionError('Data byte out of range')
+        continue
+
+      message_type = status >> 4
+      channel = status & 0x0F
+      length = _CHANNEL_MESSAGE_LENGTHS[message_type]
+      message = _read_bytes(data, pos, length)
+      pos += length
+      if any(byte > 127 for byte in message):
+        raise MIDIConversionError('Data byte out of range')
+
+      if message_type == 0xC:
+        program[channel] = message[0]
+      elif message_type == 0x9 and message[1] > 0:
+        note_ons[(channel, message[0])].append((tick, message[1]))
+      elif message_type == 0x8 or message_type == 0x9:
+        key = (channel, message[0])
+        if key not in note_ons:
+          continue
+        # A note off ends all notes of the pitch that started before it.
+        # Notes started at the same tick keep sounding.
+        open_notes = note_ons[key]
+        notes_to_keep = [n for n in open_notes if n[0] == tick]
+        closed_any = False
+        for start_tick, velocity in open_notes:
+          if start_tick == tick:
+            continue
+          closed_any = True
+          get_instrument(program[channel], channel, track, True).notes.append(
+              (velocity, message[0], start_tick, tick))
+        if closed_any and notes_to_keep:
+          note_ons[key] = notes_to_keep
+        else:
+          del note_ons[key]
+      elif message_type == 0xE:
+        get_instrument(
+            program[channel], channel, track, False).pitch_bends.append(
+                ((message[0] | (message[1] << 7)) - 8192, tick))
+      elif message_type == 0xB:
+        get_instrument(
+            program[channel], channel, track, False).control_changes.append(
+                (message[0], message[1], tick))
+
+    if not num_events:
+      raise MIDIConversionError('Empty MIDI track')
+    max_tick = tick if max_tick is None else max(max_tick, tick)
+
+  if max_tick is None:
+    raise MIDIConversionError('MIDI file has no tracks')
+  if max_tick + 1 > pretty_midi.pretty_midi.MAX_TICK:
+    raise MIDIConversionError(
+        'MIDI file has a largest tick of %d, it is likely corrupt' %
+        (max_tick + 1))
+
+  # Build the tempo map as (tick, seconds per tick) tuples the way pretty_midi
+  # does: a tempo at tick 0 replaces the default tempo, and repeated tempos
+  # are ignored.
+  tick_scales = [(0, 60.0 / (120.0 * resolution))]
+  for tick, tempo in tempo_events:
+    if tick == 0:
+      tick_scales = [(0, 60.0 / ((6e7 / tempo) * resolution))]
+    else:
+      tick_scale = 60.0 / ((6e7 / tempo) * resolution)
+      if tick_scale != tick_scales[-1][1]:
+        tick_scales.append((tick, tick_scale))
+  scale_ticks = np.array([tick for tick, _ in tick_scales], dtype=np.int64)
+  scales = np.array([tick_scale for _, tick_scale in tick_scales])
+  # The time of the first tick of each tempo, accumulated in the same order of
+  # operations as pretty_midi so that all times are identical.
+  scale_times = np.zeros(len(tick_scales))
+  for i in range(1, len(tick_scales)):
+    scale_times[i] = scale_times[i - 1] + scales[i - 1] * (
+        scale_ticks[i] - scale_ticks[i - 1])
+
+  def ticks_to_times(ticks):
+    ticks = np.array(ticks, dtype=np.int64)
+    indices = np.searchsorted(scale_ticks, ticks, side='right') - 1
+    return scale_times[indices] + scales[indices] * (
+        ticks - scale_ticks[indices])
+
+  sequence = music_pb2.NoteSequence()
+
+  # Populate header.
+  sequence.ticks_per_quarter = resolution
+  sequence.source_info.parser = music_pb2.NoteSequence.SourceInfo.PRETTY_MIDI
+  sequence.source_info.encoding_type = (
+      music_pb2.NoteSequence.SourceInfo.MIDI)
+
+  # Populate time signatures.
+  times = ticks_to_times([event[0] for event in time_signature_events])
+  for time, (_, numerator, denominator) in zip(times, time_signature_events):
+    if numerator <= 0 or time < 0:
+      raise MIDIConversionError('Invalid time signature')
+    time_signature = sequence.time_signatures.add()
+    time_signature.time = time
+    time_signature.numerator = numerator
+    try:
+      # Denominator can be too large for int32.
+      time_signature.denominator = denominator
+    except ValueError:
+      raise MIDIConversionError('Invalid time signature denominator %d' %
+                                denominator)
+
+  # Populate key signatures.
+  times = ticks_to_times([event[0] for event in key_signature_events])
+  for time, (_, sharps, mode) in zip(times, key_signature_events):
+    if time < 0:
+      raise MIDIConversionError('Invalid key signature time')
+    key_signature = sequence.key_signatures.add()
+    key_signature.time = time
+    if mode == 0:
+      key_signature.key = (sharps * 7) % 12
+      key_signature.mode = key_signature.MAJOR
+    else:
+      key_signature.key = (sharps * 7 + 9) % 12
+      key_signature.mode = key_signature.MINOR
+
+  # Populate tempo changes.
+  for time_in_seconds, tick_scale in zip(scale_times, scales):
+    tempo = sequence.tempos.add()
+    tempo.time = time_in_seconds
+    tempo.qpm = 60.0 / (tick_scale * resolution)
+
+  # Populate notes, pitch bends and control changes, ordered by instrument.
+  # Also set the sequence.total_time as the max end time in the notes.
+  for num_instrument, instrument in enumerate(instruments):
+    start_times = ticks_to_times([note[2] for note in instrument.notes])
+    end_times = ticks_to_times([note[3] for note in instrument.notes])
+    for (velocity, pitch, _, _), start_time, end_time in zip(
+        instrument.notes, start_times, end_times):
+      if end_time < start_time:
+        raise MIDIConversionError('Note ends before it starts')
+      if not sequence.total_time or end_time > sequence.total_time:
+        sequence.total_time = end_time
+      note = sequence.notes.add()
+      note.instrument = num_instrument
+      note.program = instrument.program
+      note.start_time = start_time
+      note.end_time = end_time
+      note.pitch = pitch
+      note.velocity = velocity
+      note.is_drum = instrument.is_drum
+
+  for num_instrument, instrument in enumerate(instruments):
+    times = ticks_to_times([bend[1] for bend in instrument.pitch_bends])
+    for (bend, _), time in zip(instrument.pitch_bends, times):
+      pitch_bend = sequence.pitch_bends.add()
+      pitch_bend.instrument = num_instrument
+      pitch_bend.program = instrument.program
+      pitch_bend.time = time
+      pitch_bend.bend = bend
+      pitch_bend.is_drum = instrument.is_drum
+
+  for num_instrument, instrument in enumerate(instruments):
+    times = ticks_to_times([cc[2] for cc in instrument.control_changes])
+    for (number, value, _), time in zip(instrument.control_changes, times):
+      control_change = sequence.control_changes.add()
+      control_change.instrument = num_instrument
+      control_change.program = instrument.program
+      control_change.time = time
+      control_change.control_number = number
+      control_change.control_value = value
+      control_change.is_drum = instrument.is_drum
+
+  return sequence
+
+
 def sequence_proto_to_pretty_midi(
     sequence, drop_events_n_seconds_after_last_note=None):
   """Convert tensorflow.magenta.NoteSequence proto to a PrettyMIDI.
@@ -239,18 +660,29 @@ def sequence_proto_to_pretty_midi(
   # Populate tempos.
   # TODO(douglaseck): Update this code if pretty_midi adds the ability to
   # write tempo.
-  for seq_tempo in sequence.tempos:
+  # The tick of each tempo is computed from the tempos before it, the same way
+  # pretty_midi's time_to_tick would, so the tick-to-time mapping only needs to
+  # be built once. A tempo less than half a tick after the previous one shares
+  # its tick.
+  # pylint: disable=protected-access
+  last_tick, last_tick_scale = pm._tick_scales[-1]
+  last_tick_time = 0.0
+  for seq_tempo in sorted(sequence.tempos, key=lambda t: t.time):
     # Skip if this tempo was added in the PrettyMIDI constructor.
     if seq_tempo == initial_seq_tempo:
       continue
     if max_event_time and seq_tempo.time > max_event_time:
       continue
     tick_scale = 60.0 / (pm.resolution * seq_tempo.qpm)
-    tick = pm.time_to_tick(seq_tempo.time)
-    # pylint: disable=protected-access
+    tick = last_tick
+    if seq_tempo.time > last_tick_time:
+      tick = int(round(
+          last_tick + (seq_tempo.time - last_tick_time) / last_tick_scale))
+    last_tick_time += last_tick_scale * (tick - last_tick)
+    last_tick, last_tick_scale = tick, tick_scale
     pm._tick_scales.append((tick, tick_scale))
-    pm._update_tick_to_time(0)
-    # pylint: enable=protected-access
+  pm._update_tick_to_time(0)
+  # pylint: enable=protected-access
 
   # Populate instrument events by first gathering notes and other event types
   # in lists then write them sorted to the PrettyMidi object.
@@ -292,11 +724,12 @@ def sequence_proto_to_pretty_midi(
   return pm
 
 
-def midi_file_to_sequence_proto(midi_file):
+def midi_file_to_sequence_proto(midi_file, engine=PRETTY_MIDI_ENGINE):
   """Converts MIDI file to a tensorflow.magenta.NoteSequence proto.
 
   Args:
     midi_file: A string path to a MIDI file.
+    engine: One of MIDI_ENGINES, the engine to decode the MIDI file with.
 
   Returns:
     A tensorflow.magenta.Sequence proto.
@@ -306,7 +739,7 @@ def midi_file_to_sequence_proto(midi_file):
   """
   with tf.gfile.Open(midi_file, 'r') as f:
     midi_as_string = f.read()
-    return midi_to_sequence_proto(midi_as_string)
+    return midi_to_sequence_proto(midi_as_string, engine)
 
 
 def sequence_proto_to_midi_file(sequence, output_file,
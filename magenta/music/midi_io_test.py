@@ -16,6 +16,7 @@
 from collections import defaultdict
 import os.path
 import tempfile
+import time
 
 # internal imports
 import mido
@@ -244,6 +245,31 @@ class MidiIoTest(tf.test.TestCase):
 
     self.CheckPrettyMidiAndSequence(translated_midi, multi_tempo_sequence_proto)
 
+  def testSimpleSequenceToPrettyMidi_ManyTempos(self):
+    source_midi = pretty_midi.PrettyMIDI(self.midi_simple_filename)
+    multi_tempo_sequence_proto = midi_io.midi_to_sequence_proto(source_midi)
+    for i in range(1, 1000):
+      # Each tempo lasts a whole number of ticks, so times survive exactly.
+      multi_tempo_sequence_proto.tempos.add(
+          time=i * 0.25, qpm=60 + i % 10 * 12)
+
+    translated_midi = midi_io.sequence_proto_to_pretty_midi(
+        multi_tempo_sequence_proto)
+
+    self.CheckPrettyMidiAndSequence(translated_midi, multi_tempo_sequence_proto)
+
+  def testSimpleSequenceToPrettyMidi_UnsortedTempos(self):
+    source_midi = pretty_midi.PrettyMIDI(self.midi_simple_filename)
+    multi_tempo_sequence_proto = midi_io.midi_to_sequence_proto(source_midi)
+    multi_tempo_sequence_proto.tempos.add(time=2.0, qpm=120)
+    multi_tempo_sequence_proto.tempos.add(time=1.0, qpm=60)
+
+    translated_midi = midi_io.sequence_proto_to_pretty_midi(
+        multi_tempo_sequence_proto)
+
+    multi_tempo_sequence_proto.tempos.sort(key=lambda t: t.time)
+    self.CheckPrettyMidiAndSequence(translated_midi, multi_tempo_sequence_proto)
+
   def testSimpleSequenceToPrettyMidi_DropEventsAfterLastNote(self):
     source_midi = pretty_midi.PrettyMIDI(self.midi_simple_filename)
     multi_tempo_sequence_proto = midi_io.midi_to_sequence_proto(source_midi)
@@ -342,6 +368,77 @@ class MidiIoTest(tf.test.TestCase):
   def testEventOrdering(self):
     self.CheckReadWriteMidi(self.midi_event_order_filename)
 
+  def CheckNativeEngine(self, filename):
+    """Test that both MIDI engines produce the same NoteSequence."""
+    with tf.gfile.Open(filename, 'rb') as f:
+      midi_data = f.read()
+    pretty_midi_sequence = midi_io.midi_to_sequence_proto(
+        midi_data, engine=midi_io.PRETTY_MIDI_ENGINE)
+    native_sequence = midi_io.midi_to_sequence_proto(
+        midi_data, engine=midi_io.NATIVE_ENGINE)
+    self.assertProtoEquals(pretty_midi_sequence, native_sequence)
+
+  def testNativeEngine(self):
+    self.CheckNativeEngine(self.midi_simple_filename)
+    self.CheckNativeEngine(self.midi_complex_filename)
+    self.CheckNativeEngine(self.midi_is_drum_filename)
+    self.CheckNativeEngine(self.midi_event_order_filename)
+
+  def testNativeEngineDecodingError(self):
+    with tf.gfile.Open(self.midi_simple_filename, 'rb') as f:
+      midi_data = f.read()
+    with self.assertRaises(midi_io.MIDIConversionError):
+      midi_io.midi_to_sequence_proto(
+          'not a midi file', engine=midi_io.NATIVE_ENGINE)
+    with self.assertRaises(midi_io.MIDIConversionError):
+      midi_io.midi_to_sequence_proto(
+          midi_data[:len(midi_data) // 2], engine=midi_io.NATIVE_ENGINE)
+
+  def testUnknownEngine(self):
+    with self.assertRaises(ValueError):
+      midi_io.midi_to_sequence_proto('', engine='unknown')
+
+
+class MidiIoBenchmark(tf.test.Benchmark):
+  """Measures MIDI import with each engine and export with many tempos."""
+
+  def _many_tempo_sequence(self, num_tempos):
+    """Returns a sequence with a new tempo at every note."""
+    sequence = music_pb2.NoteSequence()
+    for i in range(num_tempos):
+      sequence.tempos.add(time=i * 0.25, qpm=60 + i % 10 * 12)
+      sequence.notes.add(pitch=60 + i % 12, velocity=100, start_time=i * 0.25,
+                         end_time=i * 0.25 + 0.2)
+    sequence.total_time = num_tempos * 0.25
+    return sequence
+
+  def benchmarkSequenceProtoToPrettyMidiManyTempos(self):
+    for num_tempos in [1000, 4000]:
+      sequence = self._many_tempo_sequence(num_tempos)
+      start = time.time()
+      midi_io.sequence_proto_to_pretty_midi(sequence)
+      self.report_benchmark(
+          name='sequence_proto_to_pretty_midi_%d_tempos' % num_tempos,
+          iters=1, wall_time=time.time() - start)
+
+  def benchmarkMidiToSequenceProtoEngines(self):
+    midi_data = []
+    for filename in sorted(tf.gfile.Glob(os.path.join(
+        tf.resource_loader.get_data_files_path(), '../testdata/*.mid'))):
+      with tf.gfile.Open(filename, 'rb') as f:
+        midi_data.append(f.read())
+    iters = 20
+    for engine in [midi_io.PRETTY_MIDI_ENGINE, midi_io.NATIVE_ENGINE]:
+      start = time.time()
+      for _ in range(iters):
+        for data in midi_data:
+          midi_io.midi_to_sequence_proto(data, engine=engine)
+      wall_time = (time.time() - start) / iters
+      self.report_benchmark(
+          name='midi_to_sequence_proto_%s_engine' % engine, iters=iters,
+          wall_time=wall_time,
+          extras={'files_per_second': len(midi_data) / wall_time})
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -120,6 +120,63 @@ class MusicXMLParserState(object):
     self.time_signature = None
 
 
+def _get_compressed_score_name(mxlzip):
+  """Returns the name of the MusicXML score file in a compressed MXL archive.
+
+  Args:
+    mxlzip: A zipfile.ZipFile of a .mxl file.
+
+  Returns:
+    The name of the score file within the archive.
+
+  Raises:
+    MusicXMLParseException: if the score file cannot be located.
+  """
+  # A compressed MXL file may contain multiple files, but only one
+  # MusicXML file. Read the META-INF/container.xml file inside of the
+  # MXL file to locate the MusicXML file within the MXL file
+  # http://www.musicxml.com/tutorial/compressed-mxl-files/zip-archive-structure/
+
+  # Raise a MusicXMLParseException if multiple MusicXML files found
+  namelist = mxlzip.namelist()
+  container_file = [x for x in namelist if x == 'META-INF/container.xml']
+  compressed_file_name = ''
+
+  if container_file:
+    try:
+      container = ET.fromstring(mxlzip.read(container_file[0]))
+      for rootfile_tag in container.findall('./rootfiles/rootfile'):
+        if 'media-type' in rootfile_tag.attrib:
+          if rootfile_tag.attrib['media-type'] == MUSICXML_MIME_TYPE:
+            if not compressed_file_name:
+              compressed_file_name = rootfile_tag.attrib['full-path']
+            else:
+              raise MusicXMLParseException(
+                  'Multiple MusicXML files found in compressed archive')
+        else:
+          # No media-type attribute, so assume this is the MusicXML file
+          if not compressed_file_name:
+            compressed_file_name = rootfile_tag.attrib['full-path']
+          else:
+            raise MusicXMLParseException(
+                'Multiple MusicXML files found in compressed archive')
+    except ET.ParseError as exception:
+      raise MusicXMLParseException(exception)
+
+  if not compressed_file_name:
+    raise MusicXMLParseException(
+        'Unable to locate main .xml file in compressed archive.')
+
+  # zip file names are UTF-8 encoded.
+  compressed_file_name = compressed_file_name.encode('utf-8')
+
+  if compressed_file_name not in namelist:
+    raise MusicXMLParseException(
+        'Score file %s not found in zip archive' % compressed_file_name)
+
+  return compressed_file_name
+
+
 class MusicXMLDocument(object):
   """Internal representation of a MusicXML Document.
 
@@ -166,47 +223,7 @@ class MusicXMLDocument(object):
       except zipfile.BadZipfile as exception:
         raise MusicXMLParseException(exception)
 
-      # A compressed MXL file may contain multiple files, but only one
-      # MusicXML file. Read the META-INF/container.xml file inside of the
-      # MXL file to locate the MusicXML file within the MXL file
-      # http://www.musicxml.com/tutorial/compressed-mxl-files/zip-archive-structure/
-
-      # Raise a MusicXMLParseException if multiple MusicXML files found
-      namelist = mxlzip.namelist()
-      container_file = [x for x in namelist if x == 'META-INF/container.xml']
-      compressed_file_name = ''
-
-      if container_file:
-        try:
-          container = ET.fromstring(mxlzip.read(container_file[0]))
-          for rootfile_tag in container.findall('./rootfiles/rootfile'):
-            if 'media-type' in rootfile_tag.attrib:
-              if rootfile_tag.attrib['media-type'] == MUSICXML_MIME_TYPE:
-                if not compressed_file_name:
-                  compressed_file_name = rootfile_tag.attrib['full-path']
-                else:
-                  raise MusicXMLParseException(
-                      'Multiple MusicXML files found in compressed archive')
-            else:
-              # No media-type attribute, so assume this is the MusicXML file
-              if not compressed_file_name:
-                compressed_file_name = rootfile_tag.attrib['full-path']
-              else:
-                raise MusicXMLParseException(
-                    'Multiple MusicXML files found in compressed archive')
-        except ET.ParseError as exception:
-          raise MusicXMLParseException(exception)
-
-      if not compressed_file_name:
-        raise MusicXMLParseException(
-            'Unable to locate main .xml file in compressed archive.')
-
-      # zip file names are UTF-8 encoded.
-      compressed_file_name = compressed_file_name.encode('utf-8')
-
-      if compressed_file_name not in namelist:
-        raise MusicXMLParseException(
-            'Score file %s not found in zip archive' % compressed_file_name)
+      compressed_file_name = _get_compressed_score_name(mxlzip)
 
       score_string = mxlzip.read(compressed_file_name)
       try:
@@ -312,9 +329,7 @@ class MusicXMLDocument(object):
 
     if not key_signatures:
       # If there are no key signatures, add C major at the beginning
-      key_signature = KeySignature(self._state)
-      key_signature.time_position = 0
-      key_signatures.append(key_signature)
+      key_signatures.append(_default_key_signature(self._state))
 
     return key_signatures
 
@@ -336,14 +351,133 @@ class MusicXMLDocument(object):
 
     # If no tempos, add a default of 120 at beginning
     if not tempos:
-      tempo = Tempo(self._state)
-      tempo.qpm = self._state.qpm
-      tempo.time_position = 0
-      tempos.append(tempo)
+      tempos.append(_default_tempo(self._state))
 
     return tempos
 
 
+class StreamingMusicXMLDocument(object):
+  """Streaming representation of a MusicXML Document.
+
+  Unlike MusicXMLDocument, which loads the whole score into an ElementTree and
+  keeps every Part, Measure and Note alive, this class parses the file
+  incrementally and hands out one Measure at a time from `iterate_measures`.
+  The XML of each measure is cleared once it has been processed, and .mxl files
+  are decompressed as they are read, so memory use is proportional to a single
+  measure rather than to the whole score.
+
+  The <part-list> element must come before the <part> elements, as the MusicXML
+  schema requires.
+  """
+
+  def __init__(self, filename):
+    self._filename = filename
+    # Parts without their measures, appended as they are parsed.
+    self.parts = []
+    # ScorePart indexed by id.
+    self._score_parts = {}
+    self.midi_resolution = constants.STANDARD_PPQ
+    self._state = MusicXMLParserState()
+    # Total time in seconds, known once all measures have been parsed.
+    self.total_time_secs = 0
+
+  def _open_score(self):
+    """Opens the score, decompressing .mxl files as they are read.
+
+    Returns:
+      A file object of the uncompressed score.
+
+    Raises:
+      MusicXMLParseException: if the file cannot be parsed.
+    """
+    if self._filename.endswith('.mxl'):
+      try:
+        mxlzip = zipfile.ZipFile(self._filename)
+      except zipfile.BadZipfile as exception:
+        raise MusicXMLParseException(exception)
+      return mxlzip.open(_get_compressed_score_name(mxlzip))
+    else:
+      return open(self._filename, 'rb')
+
+  def iterate_measures(self):
+    """Parses the score and yields its measures in document order.
+
+    Each Part is appended to `self.parts` when it starts, without measures.
+
+    Yields:
+      Tuples (part_index, measure) of the index of the Part in `self.parts`
+      and a parsed Measure.
+
+    Raises:
+      MusicXMLParseException: if the file cannot be parsed.
+    """
+    score_file = self._open_score()
+    try:
+      depth = 0
+      xml_score = None
+      xml_part = None
+      parsed_part_list = False
+      for event, element in ET.iterparse(score_file, events=('start', 'end')):
+        if event == 'start':
+          depth += 1
+          if depth == 1:
+            xml_score = element
+          elif depth == 2 and element.tag == 'part':
+            xml_part = element
+            # The parser may already have added some of the part's measures,
+            # so only its attributes are used here. Its measures are parsed as
+            # each of them ends.
+            self.parts.append(
+                Part(ET.Element(element.tag, element.attrib),
+                     self._score_parts, self._state))
+          continue
+
+        if depth == 3 and xml_part is not None and element.tag == 'measure':
+          yield len(self.parts) - 1, Measure(element, self._state)
+          element.clear()
+          xml_part.clear()
+        elif depth == 2:
+          if element.tag == 'part-list' and not parsed_part_list:
+            for child in element:
+              if child.tag == 'score-part':
+                score_part = ScorePart(child)
+                self._score_parts[score_part.id] = score_part
+            parsed_part_list = True
+          elif element.tag == 'part':
+            xml_part = None
+            if self._state.time_position > self.total_time_secs:
+              self.total_time_secs = self._state.time_position
+          xml_score.clear()
+        depth -= 1
+    except ET.ParseError as exception:
+      raise MusicXMLParseException(exception)
+    finally:
+      score_file.close()
+
+  def get_default_key_signature(self):
+    """Return the C major key signature used when a score has none."""
+    return _default_key_signature(self._state)
+
+  def get_default_tempo(self):
+    """Return the tempo used when the first part of a score has none."""
+    return _default_tempo(self._state)
+
+
+def _default_key_signature(state):
+  """Return a C major key signature at the beginning of a score."""
+  key_signature = KeySignature(state)
+  key_signature.time_position = 0
+  return key_signature
+
+
+def _default_tempo(state):
+  """Return a tempo of the current qpm at the beginning of a score."""
+  tempo = Tempo(state)
+  tempo.qpm = state.qpm
+  tempo.time_position = 0
+  return tempo
+
+
 class ScorePart(object):
   """"Internal representation of a MusicXML <score-part>.
 
@@ -977,5 +977,36 @@ class MusicXMLParserTest(tf.test.TestCase):
         musicxml_reader.musicxml_file_to_sequence_proto(
             temp_file.name)
 
+  def test_streaming(self):
+    """Verify that streaming conversion produces identical NoteSequences."""
+    for filename in [self.flute_scale_filename,
+                     self.clarinet_scale_filename,
+                     self.band_score_filename,
+                     self.compressed_filename,
+                     self.multiple_rootfile_compressed_filename,
+                     self.rhythm_durations_filename,
+                     self.st_anne_filename,
+                     self.atonal_transposition_filename,
+                     self.chord_symbols_filename,
+                     self.unmetered_filename]:
+      self.assertProtoEquals(
+          musicxml_reader.musicxml_file_to_sequence_proto(filename),
+          musicxml_reader.musicxml_file_to_sequence_proto(
+              filename, streaming=True))
+
+  def test_streaming_clears_measures(self):
+    document = musicxml_parser.StreamingMusicXMLDocument(self.st_anne_filename)
+    measures = [measure for _, measure in document.iterate_measures()]
+    self.assertEqual(2, len(document.parts))
+    self.assertTrue(measures)
+    for measure in measures:
+      self.assertEqual(0, len(measure.xml_measure))
+
+  def test_streaming_unpitched_notes(self):
+    with self.assertRaises(musicxml_reader.MusicXMLConversionError):
+      musicxml_reader.musicxml_file_to_sequence_proto(os.path.join(
+          tf.resource_loader.get_data_files_path(),
+          'testdata/unpitched.xml'), streaming=True)
+
 if __name__ == '__main__':
   tf.test.main()
@@ -30,6 +30,86 @@ class MusicXMLConversionError(Exception):
   pass
 
 
+def _new_sequence(musicxml_document):
+  """Returns a NoteSequence with the header fields of a MusicXML document."""
+  sequence = music_pb2.NoteSequence()
+
+  # Standard MusicXML fields.
+  sequence.source_info.source_type = (
+      music_pb2.NoteSequence.SourceInfo.SCORE_BASED)
+  sequence.source_info.encoding_type = (
+      music_pb2.NoteSequence.SourceInfo.MUSIC_XML)
+  sequence.source_info.parser = (
+      music_pb2.NoteSequence.SourceInfo.MAGENTA_MUSIC_XML)
+
+  # Populate header.
+  sequence.ticks_per_quarter = musicxml_document.midi_resolution
+  return sequence
+
+
+def _add_time_signature(sequence, musicxml_time_signature):
+  time_signature = sequence.time_signatures.add()
+  time_signature.time = musicxml_time_signature.time_position
+  time_signature.numerator = musicxml_time_signature.numerator
+  time_signature.denominator = musicxml_time_signature.denominator
+
+
+def _add_key_signature(sequence, musicxml_key):
+  key_signature = sequence.key_signatures.add()
+  key_signature.time = musicxml_key.time_position
+  # The Key enum in music.proto does NOT follow MIDI / MusicXML specs
+  # Convert from MIDI / MusicXML key to music.proto key
+  music_proto_keys = [11, 6, 1, 8, 3, 10, 5, 0, 7, 2, 9, 4, 11, 6, 1]
+  key_signature.key = music_proto_keys[musicxml_key.key + 7]
+  if musicxml_key.mode == "major":
+    key_signature.mode = key_signature.MAJOR
+  elif musicxml_key.mode == "minor":
+    key_signature.mode = key_signature.MINOR
+
+
+def _add_tempo(sequence, musicxml_tempo):
+  tempo = sequence.tempos.add()
+  tempo.time = musicxml_tempo.time_position
+  tempo.qpm = musicxml_tempo.qpm
+
+
+def _add_part_info(sequence, part_index, musicxml_part):
+  part_info = sequence.part_infos.add()
+  part_info.part = part_index
+  part_info.name = musicxml_part.score_part.part_name
+
+
+def _add_measure_notes(sequence, part_index, musicxml_measure):
+  """Adds the notes of a MusicXML measure, skipping rests."""
+  for musicxml_note in musicxml_measure.notes:
+    if not musicxml_note.is_rest:
+      note = sequence.notes.add()
+      note.part = part_index
+      note.voice = musicxml_note.voice
+      note.instrument = musicxml_note.midi_channel
+      note.program = musicxml_note.midi_program
+      note.start_time = musicxml_note.note_duration.time_position
+
+      # Fix negative time errors from incorrect MusicXML
+      if note.start_time < 0:
+        note.start_time = 0
+
+      note.end_time = note.start_time + musicxml_note.note_duration.seconds
+      note.pitch = musicxml_note.pitch[1]  # Index 1 = MIDI pitch number
+      note.velocity = musicxml_note.velocity
+
+      durationratio = musicxml_note.note_duration.duration_ratio()
+      note.numerator = durationratio.numerator
+      note.denominator = durationratio.denominator
+
+
+def _add_chord_symbol(sequence, musicxml_chord_symbol):
+  text_annotation = sequence.text_annotations.add()
+  text_annotation.time = musicxml_chord_symbol.time_position
+  text_annotation.text = musicxml_chord_symbol.get_figure_string()
+  text_annotation.annotation_type = CHORD_SYMBOL
+
+
 def musicxml_to_sequence_proto(musicxml_document):
   """Convert MusicXML file contents to a tensorflow.magenta.NoteSequence proto.
 
@@ -46,93 +126,102 @@ def musicxml_to_sequence_proto(musicxml_document):
   Raises:
     MusicXMLConversionError: An error occurred when parsing the MusicXML file.
   """
-  sequence = music_pb2.NoteSequence()
-
-  # Standard MusicXML fields.
-  sequence.source_info.source_type = (
-      music_pb2.NoteSequence.SourceInfo.SCORE_BASED)
-  sequence.source_info.encoding_type = (
-      music_pb2.NoteSequence.SourceInfo.MUSIC_XML)
-  sequence.source_info.parser = (
-      music_pb2.NoteSequence.SourceInfo.MAGENTA_MUSIC_XML)
-
-  # Populate header.
-  sequence.ticks_per_quarter = musicxml_document.midi_resolution
+  sequence = _new_sequence(musicxml_document)
 
   # Populate time signatures.
   musicxml_time_signatures = musicxml_document.get_time_signatures()
   for musicxml_time_signature in musicxml_time_signatures:
-    time_signature = sequence.time_signatures.add()
-    time_signature.time = musicxml_time_signature.time_position
-    time_signature.numerator = musicxml_time_signature.numerator
-    time_signature.denominator = musicxml_time_signature.denominator
+    _add_time_signature(sequence, musicxml_time_signature)
 
   # Populate key signatures.
   musicxml_key_signatures = musicxml_document.get_key_signatures()
   for musicxml_key in musicxml_key_signatures:
-    key_signature = sequence.key_signatures.add()
-    key_signature.time = musicxml_key.time_position
-    # The Key enum in music.proto does NOT follow MIDI / MusicXML specs
-    # Convert from MIDI / MusicXML key to music.proto key
-    music_proto_keys = [11, 6, 1, 8, 3, 10, 5, 0, 7, 2, 9, 4, 11, 6, 1]
-    key_signature.key = music_proto_keys[musicxml_key.key + 7]
-    if musicxml_key.mode == "major":
-      key_signature.mode = key_signature.MAJOR
-    elif musicxml_key.mode == "minor":
-      key_signature.mode = key_signature.MINOR
+    _add_key_signature(sequence, musicxml_key)
 
   # Populate tempo changes.
   musicxml_tempos = musicxml_document.get_tempos()
   for musicxml_tempo in musicxml_tempos:
-    tempo = sequence.tempos.add()
-    tempo.time = musicxml_tempo.time_position
-    tempo.qpm = musicxml_tempo.qpm
+    _add_tempo(sequence, musicxml_tempo)
 
   # Populate notes from each MusicXML part across all voices
   # Unlike MIDI import, notes are not sorted
   sequence.total_time = musicxml_document.total_time_secs
   for part_index, musicxml_part in enumerate(musicxml_document.parts):
-    part_info = sequence.part_infos.add()
-    part_info.part = part_index
-    part_info.name = musicxml_part.score_part.part_name
+    _add_part_info(sequence, part_index, musicxml_part)
 
     for musicxml_measure in musicxml_part.measures:
-      for musicxml_note in musicxml_measure.notes:
-        if not musicxml_note.is_rest:
-          note = sequence.notes.add()
-          note.part = part_index
-          note.voice = musicxml_note.voice
-          note.instrument = musicxml_note.midi_channel
-          note.program = musicxml_note.midi_program
-          note.start_time = musicxml_note.note_duration.time_position
-
-          # Fix negative time errors from incorrect MusicXML
-          if note.start_time < 0:
-            note.start_time = 0
-
-          note.end_time = note.start_time + musicxml_note.note_duration.seconds
-          note.pitch = musicxml_note.pitch[1]  # Index 1 = MIDI pitch number
-          note.velocity = musicxml_note.velocity
-
-          durationratio = musicxml_note.note_duration.duration_ratio()
-          note.numerator = durationratio.numerator
-          note.denominator = durationratio.denominator
+      _add_measure_notes(sequence, part_index, musicxml_measure)
 
   musicxml_chord_symbols = musicxml_document.get_chord_symbols()
   for musicxml_chord_symbol in musicxml_chord_symbols:
-    text_annotation = sequence.text_annotations.add()
-    text_annotation.time = musicxml_chord_symbol.time_position
-    text_annotation.text = musicxml_chord_symbol.get_figure_string()
-    text_annotation.annotation_type = CHORD_SYMBOL
+    _add_chord_symbol(sequence, musicxml_chord_symbol)
+
+  return sequence
+
+
+def streaming_musicxml_to_sequence_proto(streaming_musicxml_document):
+  """Convert a MusicXML file to a NoteSequence proto one measure at a time.
+
+  Produces the same NoteSequence as `musicxml_to_sequence_proto`, but notes,
+  tempos and chord symbols are added to it as each measure is parsed, so the
+  score is never held in memory as a whole.
+
+  Args:
+    streaming_musicxml_document: An unparsed StreamingMusicXMLDocument.
+
+  Returns:
+    A tensorflow.magenta.NoteSequence proto.
+
+  Raises:
+    MusicXMLParseException: An error occurred when parsing the MusicXML file.
+  """
+  sequence = _new_sequence(streaming_musicxml_document)
+
+  # Like MusicXMLDocument, ignore duplicate time and key signatures, and only
+  # use the tempos of the first part.
+  musicxml_time_signatures = []
+  musicxml_key_signatures = []
+  has_tempos = False
+  for part_index, musicxml_measure in (
+      streaming_musicxml_document.iterate_measures()):
+    if (musicxml_measure.time_signature is not None and
+        musicxml_measure.time_signature not in musicxml_time_signatures):
+      musicxml_time_signatures.append(musicxml_measure.time_signature)
+      _add_time_signature(sequence, musicxml_measure.time_signature)
+    if (musicxml_measure.key_signature is not None and
+        musicxml_measure.key_signature not in musicxml_key_signatures):
+      musicxml_key_signatures.append(musicxml_measure.key_signature)
+      _add_key_signature(sequence, musicxml_measure.key_signature)
+    if part_index == 0:
+      for musicxml_tempo in musicxml_measure.tempos:
+        _add_tempo(sequence, musicxml_tempo)
+        has_tempos = True
+    _add_measure_notes(sequence, part_index, musicxml_measure)
+    for musicxml_chord_symbol in musicxml_measure.chord_symbols:
+      _add_chord_symbol(sequence, musicxml_chord_symbol)
+
+  if not musicxml_key_signatures:
+    _add_key_signature(
+        sequence, streaming_musicxml_document.get_default_key_signature())
+  if not has_tempos:
+    _add_tempo(sequence, streaming_musicxml_document.get_default_tempo())
+
+  sequence.total_time = streaming_musicxml_document.total_time_secs
+  for part_index, musicxml_part in enumerate(
+      streaming_musicxml_document.parts):
+    _add_part_info(sequence, part_index, musicxml_part)
 
   return sequence
 
 
-def musicxml_file_to_sequence_proto(musicxml_file):
+def musicxml_file_to_sequence_proto(musicxml_file, streaming=False):
   """Converts a MusicXML file to a tensorflow.magenta.NoteSequence proto.
 
   Args:
     musicxml_file: A string path to a MusicXML file.
+    streaming: Whether to parse the file incrementally with a
+        StreamingMusicXMLDocument, which uses memory proportional to a single
+        measure rather than to the whole score.
 
   Returns:
     A tensorflow.magenta.Sequence proto.
@@ -141,6 +230,9 @@ def musicxml_file_to_sequence_proto(musicxml_file):
     MusicXMLConversionError: Invalid musicxml_file.
   """
   try:
+    if streaming:
+      return streaming_musicxml_to_sequence_proto(
+          musicxml_parser.StreamingMusicXMLDocument(musicxml_file))
     musicxml_document = musicxml_parser.MusicXMLDocument(musicxml_file)
   except musicxml_parser.MusicXMLParseException as e:
     raise MusicXMLConversionError(e)
@@ -13,6 +13,7 @@
 # limitations under the License.
 """Defines sequence of notes objects for creating datasets."""
 
+import bisect
 import collections
 import copy
 import itertools
@@ -243,6 +244,130 @@ def extract_subsequence(sequence, start_time, end_time):
   return subsequence
 
 
+def _extract_time_events(events, subsequences, split_times, field_name):
+  """Copies timed events into each subsequence in one sweep.
+
+  Helper for `_extract_subsequences`. Matches the time signature, key
+  signature, tempo, and chord symbol handling of `extract_subsequence`.
+
+  Args:
+    events: An iterable of timed events (e.g. time signatures) to extract.
+    subsequences: A list of NoteSequences, one for each time range.
+    split_times: A sorted list of float times in seconds, one more than the
+        number of subsequences. Subsequence `i` spans the time range from
+        `split_times[i]` to `split_times[i + 1]`.
+    field_name: The name of the repeated NoteSequence field to extract the
+        events into.
+  """
+  sorted_events = sorted(events, key=lambda event: event.time)
+  event_idx = 0
+  initial_event = None
+  for i, subsequence in enumerate(subsequences):
+    start_time = split_times[i]
+    end_time = split_times[i + 1]
+    subsequence_events = getattr(subsequence, field_name)
+
+    # The most recent event at or before the start time is included at time
+    # zero.
+    while (event_idx < len(sorted_events) and
+           sorted_events[event_idx].time <= start_time):
+      initial_event = sorted_events[event_idx]
+      event_idx += 1
+    if initial_event is not None:
+      new_event = subsequence_events.add()
+      new_event.CopyFrom(initial_event)
+      new_event.time = 0.0
+
+    next_idx = event_idx
+    while (next_idx < len(sorted_events) and
+           sorted_events[next_idx].time < end_time):
+      new_event = subsequence_events.add()
+      new_event.CopyFrom(sorted_events[next_idx])
+      new_event.time -= start_time
+      next_idx += 1
+
+
+def _extract_subsequences(sequence, split_times):
+  """Extracts consecutive subsequences from a NoteSequence.
+
+  Equivalent to calling `extract_subsequence` for each pair of consecutive
+  split times, but much faster for many splits: the sequence is copied once
+  rather than once per subsequence, each type of event is sorted once, and all
+  subsequences are filled in a single pass over the events.
+
+  Args:
+    sequence: The NoteSequence to extract subsequences from.
+    split_times: A sorted list of float times in seconds. A subsequence is
+        extracted between each pair of consecutive split times.
+
+  Returns:
+    A Python list of `len(split_times) - 1` new NoteSequences.
+
+  Raises:
+    QuantizationStatusException: If the sequence has already been quantized.
+    ValueError: If a subsequence would start past the end of `sequence`.
+  """
+  num_subsequences = len(split_times) - 1
+  if num_subsequences < 1:
+    return []
+
+  if is_quantized_sequence(sequence):
+    raise QuantizationStatusException(
+        'Can only extract subsequence from unquantized NoteSequence.')
+
+  if split_times[-2] >= sequence.total_time:
+    raise ValueError('Cannot extract subsequence past end of sequence.')
+
+  # Everything but the notes and timed events is shared by all subsequences.
+  template = music_pb2.NoteSequence()
+  template.CopyFrom(sequence)
+  template.total_time = 0.0
+  del template.notes[:]
+  del template.time_signatures[:]
+  del template.key_signatures[:]
+  del template.tempos[:]
+  del template.text_annotations[:]
+  del template.pitch_bends[:]
+  del template.control_changes[:]
+
+  subsequences = []
+  for _ in range(num_subsequences):
+    subsequence = music_pb2.NoteSequence()
+    subsequence.CopyFrom(template)
+    subsequences.append(subsequence)
+
+  # Extract notes, keeping their original order within each subsequence.
+  for note in sequence.notes:
+    i = bisect.bisect_right(split_times, note.start_time) - 1
+    if i < 0 or i >= num_subsequences:
+      continue
+    subsequence = subsequences[i]
+    new_note = subsequence.notes.add()
+    new_note.CopyFrom(note)
+    new_note.start_time -= split_times[i]
+    new_note.end_time = min(note.end_time, split_times[i + 1]) - split_times[i]
+    if new_note.end_time > subsequence.total_time:
+      subsequence.total_time = new_note.end_time
+
+  _extract_time_events(
+      sequence.time_signatures, subsequences, split_times, 'time_signatures')
+  _extract_time_events(
+      sequence.key_signatures, subsequences, split_times, 'key_signatures')
+  _extract_time_events(sequence.tempos, subsequences, split_times, 'tempos')
+  # Other text annotations are removed.
+  chord_symbols = [annotation for annotation in sequence.text_annotations
+                   if annotation.annotation_type == CHORD_SYMBOL]
+  _extract_time_events(
+      chord_symbols, subsequences, split_times, 'text_annotations')
+
+  for i, subsequence in enumerate(subsequences):
+    subsequence.subsequence_info.start_time_offset = split_times[i]
+    subsequence.subsequence_info.end_time_offset = (
+        sequence.total_time - split_times[i] - subsequence.total_time)
+
+  return subsequences
+
+
 def _is_power_of_2(x):
   return x and not x & (x - 1)
 
@@ -378,15 +503,13 @@ def split_note_sequence(note_sequence, hop_size_seconds,
   Returns:
     A Python list of NoteSequences.
   """
-  prev_split_time = 0.0
+  split_times = [0.0]
 
   notes_by_start_time = sorted(list(note_sequence.notes),
                                key=lambda note: note.start_time)
   note_idx = 0
   notes_crossing_split = []
 
-  subsequences = []
-
   for split_time in np.arange(
       hop_size_seconds, note_sequence.total_time, hop_size_seconds):
     # Update notes crossing potential split.
@@ -398,20 +521,14 @@ def split_note_sequence(note_sequence, hop_size_seconds,
                             if note.end_time > split_time]
 
     if not (skip_splits_inside_notes and notes_crossing_split):
-      # Extract the subsequence between the previous split time and this split
-      # time.
-      subsequence = extract_subsequence(
-          note_sequence, prev_split_time, split_time)
-      subsequences.append(subsequence)
-      prev_split_time = split_time
+      split_times.append(split_time)
 
   # Handle the final subsequence.
-  if note_sequence.total_time > prev_split_time:
-    subsequence = extract_subsequence(note_sequence, prev_split_time,
-                                      note_sequence.total_time)
-    subsequences.append(subsequence)
+  if note_sequence.total_time > split_times[-1]:
+    split_times.append(note_sequence.total_time)
 
-  return subsequences
+  # Extract the subsequences between consecutive split times.
+  return _extract_subsequences(note_sequence, split_times)
 
 
 def split_note_sequence_on_time_changes(note_sequence,
@@ -433,7 +550,7 @@ def split_note_sequence_on_time_changes(note_sequence,
   Returns:
     A Python list of NoteSequences.
   """
-  prev_change_time = 0.0
+  split_times = [0.0]
 
   current_numerator = 4
   current_denominator = 4
@@ -450,8 +567,6 @@ def split_note_sequence_on_time_changes(note_sequence,
   note_idx = 0
   notes_crossing_split = []
 
-  subsequences = []
-
   for time_change in time_signatures_and_tempos:
     if isinstance(time_change, music_pb2.NoteSequence.TimeSignature):
       if (time_change.numerator == current_numerator and
@@ -471,14 +586,9 @@ def split_note_sequence_on_time_changes(note_sequence,
     notes_crossing_split = [note for note in notes_crossing_split
                             if note.end_time > time_change.time]
 
-    if time_change.time > prev_change_time:
+    if time_change.time > split_times[-1]:
       if not (skip_splits_inside_notes and notes_crossing_split):
-        # Extract the subsequence between the previous time change and this
-        # time change.
-        subsequence = extract_subsequence(note_sequence, prev_change_time,
-                                          time_change.time)
-        subsequences.append(subsequence)
-        prev_change_time = time_change.time
+        split_times.append(time_change.time)
 
     # Even if we didn't split here, update the current time signature or tempo.
     if isinstance(time_change, music_pb2.NoteSequence.TimeSignature):
@@ -488,12 +598,11 @@ def split_note_sequence_on_time_changes(note_sequence,
       current_qpm = time_change.qpm
 
   # Handle the final subsequence.
-  if note_sequence.total_time > prev_change_time:
-    subsequence = extract_subsequence(note_sequence, prev_change_time,
-                                      note_sequence.total_time)
-    subsequences.append(subsequence)
+  if note_sequence.total_time > split_times[-1]:
+    split_times.append(note_sequence.total_time)
 
-  return subsequences
+  # Extract the subsequences between consecutive split times.
+  return _extract_subsequences(note_sequence, split_times)
 
 
 def quantize_to_step(unquantized_seconds, steps_per_second,
@@ -537,24 +646,33 @@ def _quantize_notes(note_sequence, steps_per_second):
   Raises:
     NegativeTimeException: If a note or chord occurs at a negative time.
   """
-  for note in note_sequence.notes:
-    # Quantize the start and end times of the note.
-    note.quantized_start_step = quantize_to_step(
-        note.start_time, steps_per_second)
-    note.quantized_end_step = quantize_to_step(
-        note.end_time, steps_per_second)
-    if note.quantized_end_step == note.quantized_start_step:
-      note.quantized_end_step += 1
+  notes = note_sequence.notes
+  if notes:
+    # Quantize the start and end times of all notes at once, the same way as
+    # `quantize_to_step`.
+    times = np.array([(note.start_time, note.end_time) for note in notes],
+                     dtype=np.float64)
+    steps = (times * steps_per_second + (1 - QUANTIZE_CUTOFF)).astype(np.int64)
+    start_steps = steps[:, 0]
+    end_steps = steps[:, 1]
+    end_steps[end_steps == start_steps] += 1
 
     # Do not allow notes to start or end in negative time.
-    if note.quantized_start_step < 0 or note.quantized_end_step < 0:
+    negative = (start_steps < 0) | (end_steps < 0)
+    if negative.any():
+      i = np.argmax(negative)
       raise NegativeTimeException(
           'Got negative note time: start_step = %s, end_step = %s' %
-          (note.quantized_start_step, note.quantized_end_step))
+          (start_steps[i], end_steps[i]))
+
+    for note, start_step, end_step in zip(
+        notes, start_steps.tolist(), end_steps.tolist()):
+      note.quantized_start_step = start_step
+      note.quantized_end_step = end_step
 
     # Extend quantized sequence if necessary.
-    if note.quantized_end_step > note_sequence.total_quantized_steps:
-      note_sequence.total_quantized_steps = note.quantized_end_step
+    note_sequence.total_quantized_steps = max(
+        note_sequence.total_quantized_steps, int(end_steps.max()))
 
   # Also quantize chord symbol annotations.
   for annotation in note_sequence.text_annotations:
@@ -566,12 +684,12 @@ def _quantize_notes(note_sequence, steps_per_second):
           'Got negative chord time: step = %s' % annotation.quantized_step)
 
 
-def quantize_note_sequence(note_sequence, steps_per_quarter):
+def quantize_note_sequence(note_sequence, steps_per_quarter, in_place=False):
   """Quantize a NoteSequence proto relative to tempo.
 
-  The input NoteSequence is copied and quantization-related fields are
-  populated. Sets the `steps_per_quarter` field in the `quantization_info`
-  message in the NoteSequence.
+  The input NoteSequence is copied (unless `in_place` is True) and
+  quantization-related fields are populated. Sets the `steps_per_quarter` field
+  in the `quantization_info` message in the NoteSequence.
 
   Note start and end times, and chord times are snapped to a nearby quantized
   step, and the resulting times are stored in a separate field (e.g.,
@@ -582,9 +700,13 @@ def quantize_note_sequence(note_sequence, steps_per_quarter):
     note_sequence: A music_pb2.NoteSequence protocol buffer.
     steps_per_quarter: Each quarter note of music will be divided into this
         many quantized time steps.
+    in_place: If True, quantize `note_sequence` itself instead of a copy. Use
+        this when the unquantized NoteSequence will not be used again; if an
+        exception is raised it may be left partially modified.
 
   Returns:
-    A copy of the original NoteSequence, with quantized times added.
+    A copy of the original NoteSequence, with quantized times added, or
+    `note_sequence` itself if `in_place` is True.
 
   Raises:
     MultipleTimeSignatureException: If there is a change in time signature
@@ -594,7 +716,7 @@ def quantize_note_sequence(note_sequence, steps_per_quarter):
         has a 0 numerator or a denominator which is not a power of 2.
     NegativeTimeException: If a note or chord occurs at a negative time.
   """
-  qns = copy.deepcopy(note_sequence)
+  qns = note_sequence if in_place else copy.deepcopy(note_sequence)
 
   qns.quantization_info.steps_per_quarter = steps_per_quarter
 
@@ -679,12 +801,13 @@ def quantize_note_sequence(note_sequence, steps_per_quarter):
   return qns
 
 
-def quantize_note_sequence_absolute(note_sequence, steps_per_second):
+def quantize_note_sequence_absolute(note_sequence, steps_per_second,
+                                    in_place=False):
   """Quantize a NoteSequence proto using absolute event times.
 
-  The input NoteSequence is copied and quantization-related fields are
-  populated. Sets the `steps_per_second` field in the `quantization_info`
-  message in the NoteSequence.
+  The input NoteSequence is copied (unless `in_place` is True) and
+  quantization-related fields are populated. Sets the `steps_per_second` field
+  in the `quantization_info` message in the NoteSequence.
 
   Note start and end times, and chord times are snapped to a nearby quantized
   step, and the resulting times are stored in a separate field (e.g.,
@@ -697,14 +820,18 @@ def quantize_note_sequence_absolute(note_sequence, steps_per_second):
     note_sequence: A music_pb2.NoteSequence protocol buffer.
     steps_per_second: Each second will be divided into this many quantized time
         steps.
+    in_place: If True, quantize `note_sequence` itself instead of a copy. Use
+        this when the unquantized NoteSequence will not be used again; if an
+        exception is raised it may be left partially modified.
 
   Returns:
-    A copy of the original NoteSequence, with quantized times added.
+    A copy of the original NoteSequence, with quantized times added, or
+    `note_sequence` itself if `in_place` is True.
 
   Raises:
     NegativeTimeException: If a note or chord occurs at a negative time.
   """
-  qns = copy.deepcopy(note_sequence)
+  qns = note_sequence if in_place else copy.deepcopy(note_sequence)
   qns.quantization_info.steps_per_second = steps_per_second
 
   qns.total_quantized_steps = quantize_to_step(qns.total_time, steps_per_second)
@@ -803,15 +930,17 @@ def apply_sustain_control_changes(note_sequence, sustain_control_number=64):
         'Can only apply sustain to unquantized NoteSequence.')
 
   sequence = copy.deepcopy(note_sequence)
+  notes = list(sequence.notes)
 
-  # Sort all note on/off and sustain on/off events.
+  # Sort all note on/off and sustain on/off events. Events refer to notes and
+  # control changes by index, so sorting never has to compare protos.
   events = []
-  events.extend([(note.start_time, _NOTE_ON, note)
-                 for note in sequence.notes])
-  events.extend([(note.end_time, _NOTE_OFF, note)
-                 for note in sequence.notes])
+  events.extend([(note.start_time, _NOTE_ON, i)
+                 for i, note in enumerate(notes)])
+  events.extend([(note.end_time, _NOTE_OFF, i)
+                 for i, note in enumerate(notes)])
 
-  for cc in sequence.control_changes:
+  for i, cc in enumerate(sequence.control_changes):
     if cc.control_number != sustain_control_number:
       continue
     value = cc.control_value
@@ -819,82 +948,98 @@ def apply_sustain_control_changes(note_sequence, sustain_control_number=64):
       tf.logging.warn(
           'Sustain control change has out of range value: %d', value)
     if value >= 64:
-      events.append((cc.time, _SUSTAIN_ON, cc))
+      events.append((cc.time, _SUSTAIN_ON, i))
     elif value < 64:
-      events.append((cc.time, _SUSTAIN_OFF, cc))
+      events.append((cc.time, _SUSTAIN_OFF, i))
 
   # Sort, using the event type constants to ensure the order events are
   # processed.
   events.sort()
 
-  # Lists of active notes, keyed by instrument.
-  active_notes = collections.defaultdict(list)
+  # Active notes, keyed by instrument and then pitch. Each value is a dict
+  # mapping note index to note.
+  active_notes = collections.defaultdict(lambda: collections.defaultdict(dict))
   # Whether sustain is active for a given instrument.
   sus_active = collections.defaultdict(lambda: False)
+  # Indices of notes to delete once all events have been processed.
+  deleted_notes = set()
 
   # Iterate through all sustain on/off and note on/off events in order.
   time = 0
-  for time, event_type, event in events:
+  for time, event_type, i in events:
     if event_type == _SUSTAIN_ON:
-      sus_active[event.instrument] = True
+      sus_active[sequence.control_changes[i].instrument] = True
     elif event_type == _SUSTAIN_OFF:
-      sus_active[event.instrument] = False
+      instrument = sequence.control_changes[i].instrument
+      sus_active[instrument] = False
       # End all notes for the instrument that were being extended.
-      new_active_notes = []
-      for note in active_notes[event.instrument]:
-        if note.end_time < time:
-          # This note was being extended because of sustain.
-          # Update the end time and don't keep it in the list.
-          note.end_time = time
-        else:
-          # This note is actually still active, keep it.
-          new_active_notes.append(note)
-      active_notes[event.instrument] = new_active_notes
+      for pitch_notes in active_notes[instrument].values():
+        for j, note in list(pitch_notes.items()):
+          if note.end_time < time:
+            # This note was being extended because of sustain.
+            # Update the end time and don't keep it as active.
+            note.end_time = time
+            del pitch_notes[j]
     elif event_type == _NOTE_ON:
-      if sus_active[event.instrument]:
+      note = notes[i]
+      pitch_notes = active_notes[note.instrument][note.pitch]
+      if sus_active[note.instrument]:
         # If sustain is on, end all previous notes with the same pitch.
-        new_active_notes = []
-        for note in active_notes[event.instrument]:
-          if note.pitch == event.pitch:
-            note.end_time = time
-            if note.start_time == note.end_time:
-              # This note now has no duration because another note of the same
-              # pitch started at the same time. Only one of these notes should
-              # be preserved, so delete this one.
-              # TODO(fjord): A more correct solution would probably be to
-              # preserve both notes and make the same duration, but that is a
-              # little more complicated to implement. Will keep this solution
-              # until we find that we need the more complex one.
-              sequence.notes.remove(note)
-          else:
-            new_active_notes.append(note)
-        active_notes[event.instrument] = new_active_notes
-      # Add this new note to the list of active notes.
-      active_notes[event.instrument].append(event)
+        for j, active_note in pitch_notes.items():
+          active_note.end_time = time
+          if active_note.start_time == active_note.end_time:
+            # This note now has no duration because another note of the same
+            # pitch started at the same time. Only one of these notes should
+            # be preserved, so delete this one.
+            # TODO(fjord): A more correct solution would probably be to
+            # preserve both notes and make the same duration, but that is a
+            # little more complicated to implement. Will keep this solution
+            # until we find that we need the more complex one.
+            deleted_notes.add(j)
+        pitch_notes.clear()
+      # Add this new note to the active notes.
+      pitch_notes[i] = note
     elif event_type == _NOTE_OFF:
-      if sus_active[event.instrument]:
+      note = notes[i]
+      if sus_active[note.instrument]:
         # Note continues until another note of the same pitch or sustain ends.
         pass
       else:
-        # Remove this particular note from the active list.
+        # Remove this particular note from the active notes.
         # It may have already been removed if a note of the same pitch was
         # played when sustain was active.
-        if event in active_notes[event.instrument]:
-          active_notes[event.instrument].remove(event)
+        active_notes[note.instrument][note.pitch].pop(i, None)
     else:
       raise AssertionError('Invalid event_type: %s' % event_type)
 
   # End any notes that were still active due to sustain.
-  for instrument in active_notes.values():
-    for note in instrument:
-      note.end_time = time
+  for instrument_notes in active_notes.values():
+    for pitch_notes in instrument_notes.values():
+      for note in pitch_notes.values():
+        note.end_time = time
   sequence.total_time = time
 
+  # Delete notes in a single pass, keeping the remaining notes in order.
+  if deleted_notes:
+    num_kept = 0
+    for i in range(len(sequence.notes)):
+      if i in deleted_notes:
+        continue
+      if i != num_kept:
+        sequence.notes[num_kept].CopyFrom(sequence.notes[i])
+      num_kept += 1
+    del sequence.notes[num_kept:]
+
   return sequence
 
 
+# Chord symbols inferred for pitch sets, shared by calls to
+# infer_chords_for_sequence that don't provide their own cache.
+_CHORD_SYMBOL_CACHE = chord_symbols_lib.ChordSymbolCache()
+
+
 def infer_chords_for_sequence(
-    sequence, instrument=None, min_notes_per_chord=3):
+    sequence, instrument=None, min_notes_per_chord=3, chord_symbol_cache=None):
   """Infers chords for a NoteSequence and adds them as TextAnnotations.
 
   For each set of simultaneously-active notes in a NoteSequence (optionally for
@@ -912,11 +1057,17 @@ def infer_chords_for_sequence(
         inference. If None, all instruments will be used.
     min_notes_per_chord: The minimum number of simultaneous notes for which to
         infer a chord.
+    chord_symbol_cache: A chord_symbols_lib.ChordSymbolCache used to infer
+        chord symbols for each set of simultaneous notes. If None, a cache
+        shared by all calls is used.
 
   Raises:
     ChordSymbolException: If a chord cannot be determined for a set of
     simultaneous notes in `sequence`.
   """
+  if chord_symbol_cache is None:
+    chord_symbol_cache = _CHORD_SYMBOL_CACHE
+
   notes = [note for note in sequence.notes
            if not note.is_drum and (instrument is None or
                                     note.instrument == instrument)]
@@ -946,7 +1097,7 @@ def infer_chords_for_sequence(
       active_pitches = set(sorted_notes[idx].pitch for idx in active_notes)
       if len(active_pitches) >= min_notes_per_chord:
         # Infer a chord symbol for the active pitches.
-        figure = chord_symbols_lib.pitches_to_chord_symbol(active_pitches)
+        figure = chord_symbol_cache.pitches_to_chord_symbol(active_pitches)
 
         if figure != current_figure:
           # Add a text annotation to the sequence.
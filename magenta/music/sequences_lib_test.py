@@ -14,16 +14,27 @@
 """Tests for sequences_lib."""
 
 import copy
+import random
+import time
 
 # internal imports
+import numpy as np
 import tensorflow as tf
 
 from magenta.common import testing_lib as common_testing_lib
+from magenta.music import chord_symbols_lib
 from magenta.music import sequences_lib
 from magenta.music import testing_lib
 from magenta.protobuf import music_pb2
 
 
+class UncachedChordSymbols(object):
+  """Stands in for a ChordSymbolCache without caching anything."""
+
+  def pitches_to_chord_symbol(self, pitches):
+    return chord_symbols_lib.pitches_to_chord_symbol(pitches)
+
+
 class SequencesLibTest(tf.test.TestCase):
 
   def setUp(self):
@@ -158,6 +169,61 @@ class SequencesLibTest(tf.test.TestCase):
     self.assertProtoEquals(expected_subsequence_2, subsequences[1])
     self.assertProtoEquals(expected_subsequence_3, subsequences[2])
 
+  def testSplitNoteSequenceMatchesExtractSubsequence(self):
+    sequence = common_testing_lib.parse_test_proto(
+        music_pb2.NoteSequence,
+        """
+        time_signatures: {
+          time: 3.0
+          numerator: 3
+          denominator: 4}
+        time_signatures: {
+          numerator: 4
+          denominator: 4}
+        key_signatures: {
+          time: 2.0
+          key: 2}
+        key_signatures: {
+          time: 2.0
+          key: 4}
+        tempos: {
+          qpm: 60}
+        tempos: {
+          time: 4.5
+          qpm: 80}
+        text_annotations: {
+          time: 1.0
+          text: "not a chord"}
+        pitch_bends: {
+          time: 1.0
+          bend: 100}
+        control_changes: {
+          time: 1.0
+          control_number: 64
+          control_value: 127}
+        subsequence_info: {
+          start_time_offset: 7.0}""")
+    testing_lib.add_track_to_sequence(
+        sequence, 0,
+        [(52, 99, 4.75, 5.0), (12, 100, 0.01, 10.0), (40, 45, 2.50, 3.50),
+         (11, 55, 0.22, 0.50), (55, 120, 4.0, 4.01), (60, 80, 1.5, 1.75)])
+    testing_lib.add_chords_to_sequence(
+        sequence, [('G7', 3.0), ('C', 1.5), ('F', 4.8), ('N.C.', 1.5)])
+
+    hop_size_seconds = 1.5
+    split_times = list(np.arange(0.0, sequence.total_time, hop_size_seconds))
+    split_times.append(sequence.total_time)
+    expected_subsequences = [
+        sequences_lib.extract_subsequence(sequence, start_time, end_time)
+        for start_time, end_time in zip(split_times[:-1], split_times[1:])]
+
+    subsequences = sequences_lib.split_note_sequence(
+        sequence, hop_size_seconds)
+    self.assertEqual(len(expected_subsequences), len(subsequences))
+    for expected_subsequence, subsequence in zip(
+        expected_subsequences, subsequences):
+      self.assertProtoEquals(expected_subsequence, subsequence)
+
   def testSplitNoteSequenceSkipSplitsInsideNotes(self):
     # Tests splitting a NoteSequence at regular hop size, skipping splits that
     # would have occurred inside a note.
@@ -521,6 +587,32 @@ class SequencesLibTest(tf.test.TestCase):
 
     self.assertProtoEquals(expected_quantized_sequence, quantized_sequence)
 
+  def testQuantizeNoteSequenceInPlace(self):
+    testing_lib.add_track_to_sequence(
+        self.note_sequence, 0,
+        [(12, 100, 0.01, 10.0), (11, 55, 0.22, 0.50), (40, 45, 2.50, 3.50),
+         (55, 120, 4.0, 4.01), (52, 99, 4.75, 5.0)])
+    testing_lib.add_chords_to_sequence(
+        self.note_sequence,
+        [('B7', 0.22), ('Em9', 4.0)])
+
+    expected_quantized_sequence = sequences_lib.quantize_note_sequence(
+        self.note_sequence, steps_per_quarter=self.steps_per_quarter)
+    absolute_sequence = copy.deepcopy(self.note_sequence)
+    expected_absolute_sequence = sequences_lib.quantize_note_sequence_absolute(
+        absolute_sequence, steps_per_second=4)
+
+    quantized_sequence = sequences_lib.quantize_note_sequence(
+        self.note_sequence, steps_per_quarter=self.steps_per_quarter,
+        in_place=True)
+    self.assertIs(self.note_sequence, quantized_sequence)
+    self.assertProtoEquals(expected_quantized_sequence, quantized_sequence)
+
+    quantized_sequence = sequences_lib.quantize_note_sequence_absolute(
+        absolute_sequence, steps_per_second=4, in_place=True)
+    self.assertIs(absolute_sequence, quantized_sequence)
+    self.assertProtoEquals(expected_absolute_sequence, quantized_sequence)
+
   def testAssertIsQuantizedNoteSequence(self):
     testing_lib.add_track_to_sequence(
         self.note_sequence, 0,
@@ -886,6 +978,71 @@ class SequencesLibTest(tf.test.TestCase):
     sus_sequence = sequences_lib.apply_sustain_control_changes(sequence)
     self.assertProtoEquals(expected_sequence, sus_sequence)
 
+  def testApplySustainControlChangesDeletesNotesInOrder(self):
+    """Dropped identical notes should leave the other notes in order."""
+    sequence = copy.copy(self.note_sequence)
+    testing_lib.add_control_changes_to_sequence(
+        sequence, 0,
+        [(1.0, 64, 127), (4.0, 64, 0)])
+    expected_sequence = copy.copy(sequence)
+    testing_lib.add_track_to_sequence(
+        sequence, 0,
+        [(60, 100, 2.00, 2.50), (64, 100, 1.50, 1.75), (60, 100, 2.00, 2.50),
+         (67, 100, 3.00, 3.25), (64, 100, 3.00, 3.50), (64, 100, 3.00, 3.50),
+         (60, 100, 0.50, 0.75)])
+    testing_lib.add_track_to_sequence(
+        expected_sequence, 0,
+        [(64, 100, 1.50, 3.00), (60, 100, 2.00, 4.00), (67, 100, 3.00, 4.00),
+         (64, 100, 3.00, 4.00), (60, 100, 0.50, 0.75)])
+
+    sus_sequence = sequences_lib.apply_sustain_control_changes(sequence)
+    self.assertProtoEquals(expected_sequence, sus_sequence)
+
+  def testApplySustainControlChangesMultipleInstruments(self):
+    """Sustain and repeated pitches only affect notes of the same instrument."""
+    sequence = copy.copy(self.note_sequence)
+    testing_lib.add_control_changes_to_sequence(
+        sequence, 0, [(1.0, 64, 127), (3.0, 64, 0)])
+    testing_lib.add_control_changes_to_sequence(
+        sequence, 1, [(2.0, 64, 127), (5.0, 64, 0)])
+    expected_sequence = copy.copy(sequence)
+    testing_lib.add_track_to_sequence(
+        sequence, 0,
+        [(60, 100, 1.00, 1.50), (60, 100, 2.50, 2.75), (62, 100, 3.50, 4.0)])
+    testing_lib.add_track_to_sequence(
+        sequence, 1,
+        [(60, 100, 1.50, 2.50), (60, 100, 2.25, 2.50), (62, 100, 1.50, 1.75)])
+    testing_lib.add_track_to_sequence(
+        expected_sequence, 0,
+        [(60, 100, 1.00, 2.50), (60, 100, 2.50, 3.00), (62, 100, 3.50, 4.0)])
+    testing_lib.add_track_to_sequence(
+        expected_sequence, 1,
+        [(60, 100, 1.50, 2.25), (60, 100, 2.25, 5.00), (62, 100, 1.50, 1.75)])
+    expected_sequence.total_time = 5.0
+
+    sus_sequence = sequences_lib.apply_sustain_control_changes(sequence)
+    self.assertProtoEquals(expected_sequence, sus_sequence)
+
+  def testApplySustainControlChangesDenseRepeatedNotes(self):
+    """Compare against a direct computation on many repeated notes."""
+    sequence = copy.copy(self.note_sequence)
+    testing_lib.add_control_changes_to_sequence(
+        sequence, 0, [(0.0, 64, 127), (10.0, 64, 0)])
+    expected_sequence = copy.copy(sequence)
+    notes = [(60 + i % 3, 100, i * 0.1, i * 0.1 + 0.05) for i in range(100)]
+    testing_lib.add_track_to_sequence(sequence, 0, notes)
+    # Each note lasts until the next note of the same pitch, and the last
+    # note of each pitch lasts until the sustain ends.
+    testing_lib.add_track_to_sequence(
+        expected_sequence, 0,
+        [(pitch, velocity, start_time,
+          notes[i + 3][2] if i + 3 < len(notes) else 10.0)
+         for i, (pitch, velocity, start_time, _) in enumerate(notes)])
+    expected_sequence.total_time = 10.0
+
+    sus_sequence = sequences_lib.apply_sustain_control_changes(sequence)
+    self.assertProtoEquals(expected_sequence, sus_sequence)
+
   def testInferChordsForSequence(self):
     # Test non-quantized sequence.
     sequence = copy.copy(self.note_sequence)
@@ -919,6 +1076,105 @@ class SequencesLibTest(tf.test.TestCase):
     sequences_lib.infer_chords_for_sequence(sequence)
     self.assertProtoEquals(expected_sequence, sequence)
 
+  def testInferChordsForSequenceCacheMatchesUncached(self):
+    sequence = copy.copy(self.note_sequence)
+    # The pitch sets in the second and third chords are ambiguous, with chord
+    # symbols that used to depend on set iteration order.
+    testing_lib.add_track_to_sequence(
+        sequence, 0,
+        [(60, 100, 0.0, 1.0), (64, 100, 0.0, 1.0), (67, 100, 0.0, 1.0),
+         (60, 100, 1.0, 2.0), (61, 100, 1.0, 2.0), (69, 100, 1.0, 2.0),
+         (60, 100, 2.0, 3.0), (62, 100, 2.0, 3.0), (70, 100, 2.0, 3.0),
+         (60, 100, 3.0, 4.0), (73, 100, 3.0, 4.0), (81, 100, 3.0, 4.0),
+         (60, 100, 4.0, 5.0), (64, 100, 4.0, 5.0), (67, 100, 4.0, 5.0)])
+    uncached_sequence = copy.copy(sequence)
+    sequences_lib.infer_chords_for_sequence(
+        uncached_sequence, chord_symbol_cache=UncachedChordSymbols())
+
+    # Once to fill the cache and once to read from it.
+    cache = chord_symbols_lib.ChordSymbolCache()
+    for _ in range(2):
+      cached_sequence = copy.copy(sequence)
+      sequences_lib.infer_chords_for_sequence(
+          cached_sequence, chord_symbol_cache=cache)
+      self.assertProtoEquals(uncached_sequence, cached_sequence)
+    self.assertEqual(3, cache.misses)
+    self.assertEqual(7, cache.hits)
+
+    self.assertEqual(
+        ['C', 'Cped(addb2)(add6)', 'Cped(add2)(addb7)', 'Cped(addb2)(add6)',
+         'C'],
+        [annotation.text for annotation in uncached_sequence.text_annotations])
+
+
+class SequencesLibBenchmark(tf.test.Benchmark):
+  """Measures splitting and quantizing long performances."""
+
+  def _long_performance(self, num_seconds=3600, notes_per_second=6):
+    rand = random.Random(0)
+    sequence = music_pb2.NoteSequence()
+    sequence.tempos.add(qpm=120)
+    sequence.time_signatures.add(numerator=4, denominator=4)
+    notes = []
+    for i in range(num_seconds * notes_per_second):
+      start_time = i / float(notes_per_second)
+      notes.append((rand.randint(21, 108), rand.randint(1, 127), start_time,
+                    start_time + rand.uniform(0.05, 2.0)))
+    testing_lib.add_track_to_sequence(sequence, 0, notes)
+    return sequence
+
+  def benchmarkApplySustainControlChanges(self):
+    # Dense piano material held under one long sustain, with doubled notes.
+    sequence = music_pb2.NoteSequence()
+    sequence.control_changes.add(time=0.0, control_number=64, control_value=127)
+    for i in range(20000):
+      start_time = (i // 4) * 0.05
+      for _ in range(2 if i % 20 == 0 else 1):
+        sequence.notes.add(pitch=21 + (i * 7) % 88, velocity=80,
+                           start_time=start_time, end_time=start_time + 0.1)
+    sequence.control_changes.add(time=250.0, control_number=64, control_value=0)
+    start = time.time()
+    sequences_lib.apply_sustain_control_changes(sequence)
+    self.report_benchmark(
+        name='apply_sustain_control_changes_dense', iters=1,
+        wall_time=time.time() - start)
+
+  def benchmarkQuantizeNoteSequence(self):
+    sequence = self._long_performance()
+    start = time.time()
+    sequences_lib.quantize_note_sequence(sequence, steps_per_quarter=4)
+    self.report_benchmark(
+        name='quantize_note_sequence_1_hour', iters=1,
+        wall_time=time.time() - start)
+
+  def benchmarkQuantizeNoteSequenceInPlace(self):
+    sequence = self._long_performance()
+    start = time.time()
+    sequences_lib.quantize_note_sequence(
+        sequence, steps_per_quarter=4, in_place=True)
+    self.report_benchmark(
+        name='quantize_note_sequence_in_place_1_hour', iters=1,
+        wall_time=time.time() - start)
+
+  def benchmarkSplitNoteSequence(self):
+    sequence = self._long_performance()
+    start = time.time()
+    sequences_lib.split_note_sequence(sequence, hop_size_seconds=30.0)
+    self.report_benchmark(
+        name='split_note_sequence_1_hour', iters=1,
+        wall_time=time.time() - start)
+
+  def benchmarkExtractSubsequencePerSplit(self):
+    # The cost of extracting each split separately, for comparison.
+    sequence = self._long_performance()
+    start = time.time()
+    for start_time in np.arange(0.0, sequence.total_time, 30.0):
+      sequences_lib.extract_subsequence(
+          sequence, start_time, min(start_time + 30.0, sequence.total_time))
+    self.report_benchmark(
+        name='extract_subsequence_per_split_1_hour', iters=1,
+        wall_time=time.time() - start)
+
 
 if __name__ == '__main__':
   tf.test.main()
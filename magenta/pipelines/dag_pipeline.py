@@ -34,6 +34,7 @@ import itertools
 
 # internal imports
 from magenta.pipelines import pipeline
+from magenta.pipelines import statistics
 
 
 class DagOutput(object):
@@ -195,9 +196,24 @@ class DAGPipeline(pipeline.Pipeline):
   for details.
 
   Use DAGPipeline to compose multiple smaller pipelines together.
+
+  By default each unit is run on all of its inputs before the next unit in
+  topological order runs, so every intermediate output of a call to `transform`
+  is held in memory at once. In streaming mode, each object is instead pushed
+  depth-first through the DAG as soon as it is produced, so only the objects
+  along the current path are held in memory. Units whose input is a dictionary
+  still wait until all of their dependencies are done. Both modes produce the
+  same outputs, in the same order, and the same statistics, as long as units
+  in different branches of the DAG do not share mutable state (such as a
+  global random number generator).
+
+  The outputs of every unit are checked against the unit's `output_type`. Once
+  a DAG is known to produce valid outputs, these checks can be limited to the
+  first few inputs with `max_validated_inputs`.
   """
 
-  def __init__(self, dag, pipeline_name='DAGPipeline'):
+  def __init__(self, dag, pipeline_name='DAGPipeline', streaming=False,
+               max_validated_inputs=None):
     """Constructs a DAGPipeline.
 
     A DAG (direct acyclic graph) is given which fully specifies what the
@@ -208,6 +224,12 @@ class DAGPipeline(pipeline.Pipeline):
          `Pipeline`, `PipelineKey`, `DagInput`. `dag` defines a directed acyclic
          graph.
       pipeline_name: String name of this Pipeline object.
+      streaming: If True, `transform` streams objects through the DAG
+          depth-first instead of running one unit at a time.
+      max_validated_inputs: The number of calls to `transform` for which unit
+          outputs are validated against their `output_type`. Later calls skip
+          validation. If None (default), every call is validated. If 0, no
+          call is validated.
 
     Raises:
       InvalidDAGException: If each key value pair in the `dag` dictionary is
@@ -379,6 +401,37 @@ class DAGPipeline(pipeline.Pipeline):
     call_list.reverse()
     assert call_list[0] == self.input
 
+    # For streaming mode, map each unit to the destinations its outputs are
+    # forwarded to, and find the units which join multiple dependencies.
+    self.streaming = streaming
+    self.max_validated_inputs = max_validated_inputs
+    self._num_validated_inputs = 0
+    self._validate_outputs = True
+    self._forward_connections = dict([(unit, []) for unit in call_list])
+    for unit, dependency in self.dag.items():
+      if isinstance(dependency, dict):
+        for name, subordinate in dependency.items():
+          self._add_forward_connection(subordinate, unit, name)
+      else:
+        self._add_forward_connection(dependency, unit, None)
+    self._join_units = [unit for unit in call_list
+                        if isinstance(self.dag.get(unit), dict)]
+
+  def _add_forward_connection(self, subordinate, unit, name):
+    """Records that outputs of `subordinate` are forwarded to `unit`.
+
+    Args:
+      subordinate: A Pipeline, PipelineKey, or DagInput in the dependency of
+          `unit`.
+      unit: A Pipeline or DagOutput.
+      name: If `unit` takes a dictionary input, the input name `subordinate`
+          feeds. Otherwise None.
+    """
+    key = (subordinate.key if isinstance(subordinate, pipeline.PipelineKey)
+           else None)
+    self._forward_connections[self._validate_subordinate(subordinate)].append(
+        (unit, key, name))
+
   def _expand_dag_shorthands(self, dag):
     """Expand DAG shorthand.
 
@@ -484,14 +537,22 @@ class DAGPipeline(pipeline.Pipeline):
       depend on implementation. Each output name corresponds to an output
       collection. See get_output_names method.
     """
+    self._validate_outputs = (
+        self.max_validated_inputs is None or
+        self._num_validated_inputs < self.max_validated_inputs)
+    if self._validate_outputs:
+      self._num_validated_inputs += 1
+
+    if self.streaming:
+      return self._transform_streaming(input_object)
+
     def stats_accumulator(unit, unit_inputs, cumulative_stats):
       for single_input in unit_inputs:
         results_ = unit.transform(single_input)
-        stats = unit.get_stats()
-        cumulative_stats.extend(stats)
+        cumulative_stats.merge(unit.get_stats())
         yield results_
 
-    stats = []
+    stats = statistics.StatisticsRegistry()
     results = {self.input: [input_object]}
     for unit in self.call_list[1:]:
       # Compute transformation.
@@ -510,9 +571,88 @@ class DAGPipeline(pipeline.Pipeline):
         unit_outputs = self._join_lists_or_dicts(unjoined_outputs, unit)
       results[unit] = unit_outputs
 
-    self._set_stats(stats)
+    self._set_stats(stats.get_stats())
     return dict([(output.name, results[output]) for output in self.outputs])
 
+  def _transform_streaming(self, input_object):
+    """Runs the DAG on the given input, streaming objects depth-first.
+
+    Args:
+      input_object: Any object. The required type depends on implementation.
+
+    Returns:
+      A dictionary mapping output names to lists of objects, identical to the
+      one returned in the default mode.
+    """
+    stats = statistics.StatisticsRegistry()
+    results = dict([(output.name, []) for output in self.outputs])
+    # Inputs waiting for each unit which takes a dictionary input.
+    buffers = dict([(unit, dict([(name, []) for name in self.dag[unit]]))
+                    for unit in self._join_units])
+
+    for output_name, output in self._stream_outputs(
+        self.input, [input_object], stats, buffers):
+      results[output_name].append(output)
+
+    # Join units are in topological order, so everything upstream of each one
+    # has been streamed by the time it runs.
+    for unit in self._join_units:
+      unit_buffers = buffers.pop(unit)
+      names = list(unit_buffers.keys())
+      for values in itertools.product(*[unit_buffers[name] for name in names]):
+        for output_name, output in self._stream_unit(
+            unit, dict(zip(names, values)), stats, buffers):
+          results[output_name].append(output)
+
+    self._set_stats(stats.get_stats())
+    return results
+
+  def _stream_unit(self, unit, unit_input, stats, buffers):
+    """Runs `unit` on a single input and streams its outputs downstream.
+
+    Args:
+      unit: The `Pipeline` to run.
+      unit_input: A single input for `unit`.
+      stats: A `StatisticsRegistry` the statistics of `unit` are merged into.
+      buffers: A dictionary mapping each unit which takes a dictionary input
+          to a dictionary mapping input names to lists of waiting inputs.
+
+    Returns:
+      A generator of (output name, object) pairs for the DAG outputs reached
+      from `unit`.
+    """
+    unit_output = unit.transform(unit_input)
+    stats.merge(unit.get_stats())
+    self._validate_transform_output(unit_output, unit)
+    return self._stream_outputs(unit, unit_output, stats, buffers)
+
+  def _stream_outputs(self, unit, unit_output, stats, buffers):
+    """Forwards the outputs of a single call to `unit` through the DAG.
+
+    Args:
+      unit: The `Pipeline` or `DagInput` that produced `unit_output`.
+      unit_output: A list of objects, or a dictionary mapping names to lists of
+          objects, matching the output type of `unit`.
+      stats: A `StatisticsRegistry` the statistics of downstream units are
+          merged into.
+      buffers: A dictionary mapping each unit which takes a dictionary input
+          to a dictionary mapping input names to lists of waiting inputs.
+
+    Yields:
+      (output name, object) pairs for the DAG outputs reached from `unit`.
+    """
+    for destination, key, name in self._forward_connections[unit]:
+      objects = unit_output if key is None else unit_output[key]
+      for obj in objects:
+        if isinstance(destination, DagOutput):
+          yield destination.name, obj
+        elif name is not None:
+          buffers[destination][name].append(obj)
+        else:
+          for output_name, output in self._stream_unit(
+              destination, obj, stats, buffers):
+            yield output_name, output
+
   def _get_outputs_as_signature(self, dependency, outputs):
     """Returns a list or dict which matches the type signature of dependency.
 
@@ -604,34 +744,53 @@ class DAGPipeline(pipeline.Pipeline):
     if isinstance(unit.output_type, dict):
       concated = dict([(key, list()) for key in unit.output_type.keys()])
       for d in outputs:
-        if not isinstance(d, dict):
-          raise InvalidTransformOutputException(
-              'Expected dictionary output for %s with output type %s but '
-              'instead got type %s' % (unit, unit.output_type, type(d)))
-        if set(d.keys()) != set(unit.output_type.keys()):
-          raise InvalidTransformOutputException(
-              'Got dictionary output with incorrect keys for %s. Got %s. '
-              'Expected %s' % (unit, d.keys(), unit.output_type.keys()))
+        self._validate_transform_output(d, unit)
         for k, val in d.items():
-          if not isinstance(val, list):
-            raise InvalidTransformOutputException(
-                'DagOutput from %s for key %s is not a list.' % (unit, k))
-          if not _all_are_type(val, unit.output_type[k]):
-            raise InvalidTransformOutputException(
-                'Some outputs from %s for key %s are not of expected type %s. '
-                'Got types %s' % (unit, k, unit.output_type[k],
-                                  [type(inst) for inst in val]))
           concated[k] += val
     else:
       concated = []
       for l in outputs:
-        if not isinstance(l, list):
-          raise InvalidTransformOutputException(
-              'Expected list output for %s with outpu type %s but instead got '
-              'type %s' % (unit, unit.output_type, type(l)))
-        if not _all_are_type(l, unit.output_type):
-          raise InvalidTransformOutputException(
-              'Some outputs from %s are not of expected type %s. Got types %s'
-              % (unit, unit.output_type, [type(inst) for inst in l]))
+        self._validate_transform_output(l, unit)
         concated += l
     return concated
+
+  def _validate_transform_output(self, output, unit):
+    """Validates the output of a single call to `unit.transform`.
+
+    Args:
+      output: A list, or a dict which maps string names to lists.
+      unit: The Pipeline which produced `output`.
+
+    Raises:
+      InvalidTransformOutputException: If anything in `output` does not match
+      the type signature given by `unit.output_type`.
+    """
+    if not self._validate_outputs:
+      return
+    if isinstance(unit.output_type, dict):
+      if not isinstance(output, dict):
+        raise InvalidTransformOutputException(
+            'Expected dictionary output for %s with output type %s but '
+            'instead got type %s' % (unit, unit.output_type, type(output)))
+      if set(output.keys()) != set(unit.output_type.keys()):
+        raise InvalidTransformOutputException(
+            'Got dictionary output with incorrect keys for %s. Got %s. '
+            'Expected %s' % (unit, output.keys(), unit.output_type.keys()))
+      for k, val in output.items():
+        if not isinstance(val, list):
+          raise InvalidTransformOutputException(
+              'DagOutput from %s for key %s is not a list.' % (unit, k))
+        if not _all_are_type(val, unit.output_type[k]):
+          raise InvalidTransformOutputException(
+              'Some outputs from %s for key %s are not of expected type %s. '
+              'Got types %s' % (unit, k, unit.output_type[k],
+                                [type(inst) for inst in val]))
+    else:
+      if not isinstance(output, list):
+        raise InvalidTransformOutputException(
+            'Expected list output for %s with outpu type %s but instead got '
+            'type %s' % (unit, unit.output_type, type(output)))
+      if not _all_are_type(output, unit.output_type):
+        raise InvalidTransformOutputException(
+            'Some outputs from %s are not of expected type %s. Got types %s'
+            % (unit, unit.output_type, [type(inst) for inst in output]))
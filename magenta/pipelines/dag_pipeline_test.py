@@ -439,17 +439,112 @@ class DAGPipelineTest(tf.test.TestCase):
       for stat in stats_1:
         self.assertTrue(isinstance(stat, statistics.Counter))
 
+      # Statistics with the same name are merged across calls to each unit.
       names = sorted([stat.name for stat in stats_1])
       self.assertEqual(
           names,
-          (['DAGPipelineName_UnitQ_output_count'] +
-           ['DAGPipelineName_UnitR_input_count'] * z))
+          ['DAGPipelineName_UnitQ_output_count',
+           'DAGPipelineName_UnitR_input_count'])
 
       for stat in stats_1:
-        if stat.name == 'DAGPipelineName_UnitQ_output_count':
-          self.assertEqual(stat.count, z)
-        else:
-          self.assertEqual(stat.count, 1)
+        self.assertEqual(stat.count, z)
+
+  def testStreamingMatchesDefaultMode(self):
+
+    class UnitQ(pipeline.Pipeline):
+
+      def __init__(self):
+        pipeline.Pipeline.__init__(self, Type0, {'xy': Type1, 'z': Type2})
+
+      def transform(self, input_object):
+        self._set_stats([statistics.Counter('output_count', input_object.z)])
+        return {'xy': [Type1(x=input_object.x + i, y=input_object.y + i)
+                       for i in range(input_object.z)],
+                'z': [Type2(z=i) for i in [-input_object.z, input_object.z]]}
+
+    class UnitR(pipeline.Pipeline):
+
+      def __init__(self):
+        pipeline.Pipeline.__init__(self, Type1, Type1)
+
+      def transform(self, input_object):
+        self._set_stats([statistics.Counter('input_count', 1)])
+        return [Type1(x=input_object.x * 10 + i, y=input_object.y)
+                for i in range(abs(input_object.x) % 3)]
+
+    class UnitS(pipeline.Pipeline):
+
+      def __init__(self):
+        pipeline.Pipeline.__init__(self, {'xy': Type1, 'z': Type2}, Type4)
+
+      def transform(self, input_dict):
+        self._set_stats([statistics.Counter('input_count', 1)])
+        return [Type4(input_dict['xy'].x,
+                      input_dict['xy'].y,
+                      input_dict['z'].z)]
+
+    def make_dag():
+      q, r, s = UnitQ(), UnitR(), UnitS()
+      return {q: dag_pipeline.DagInput(Type0),
+              r: q['xy'],
+              s: {'xy': r, 'z': q['z']},
+              dag_pipeline.DagOutput('q_xy'): q['xy'],
+              dag_pipeline.DagOutput('r'): r,
+              dag_pipeline.DagOutput('s'): s}
+
+    default_pipe = dag_pipeline.DAGPipeline(make_dag())
+    streaming_pipe = dag_pipeline.DAGPipeline(make_dag(), streaming=True)
+    for input_object in [Type0(-3, 0, 8), Type0(1, 2, 3), Type0(5, -5, 0)]:
+      self.assertEqual(default_pipe.transform(input_object),
+                       streaming_pipe.transform(input_object))
+      self.assertEqual(
+          sorted([(stat.name, stat.count)
+                  for stat in default_pipe.get_stats()]),
+          sorted([(stat.name, stat.count)
+                  for stat in streaming_pipe.get_stats()]))
+
+  def testStreamingInvalidTransformOutput(self):
+
+    class UnitQ(pipeline.Pipeline):
+
+      def __init__(self):
+        pipeline.Pipeline.__init__(self, Type0, Type1)
+
+      def transform(self, input_object):
+        return [Type2(1)]
+
+    q = UnitQ()
+    dag = {q: dag_pipeline.DagInput(Type0),
+           dag_pipeline.DagOutput('output'): q}
+    dag_pipe_obj = dag_pipeline.DAGPipeline(dag, streaming=True)
+    with self.assertRaises(dag_pipeline.InvalidTransformOutputException):
+      dag_pipe_obj.transform(Type0(1, 2, 3))
+
+  def testMaxValidatedInputs(self):
+
+    class UnitQ(pipeline.Pipeline):
+
+      def __init__(self):
+        pipeline.Pipeline.__init__(self, Type0, Type1)
+
+      def transform(self, input_object):
+        if input_object.x < 0:
+          return [Type2(input_object.z)]
+        return [Type1(input_object.x, input_object.y)]
+
+    for streaming in [False, True]:
+      q = UnitQ()
+      dag = {q: dag_pipeline.DagInput(Type0),
+             dag_pipeline.DagOutput('output'): q}
+      dag_pipe_obj = dag_pipeline.DAGPipeline(
+          dag, streaming=streaming, max_validated_inputs=2)
+      self.assertEqual({'output': [Type1(1, 2)]},
+                       dag_pipe_obj.transform(Type0(1, 2, 3)))
+      with self.assertRaises(dag_pipeline.InvalidTransformOutputException):
+        dag_pipe_obj.transform(Type0(-1, 2, 3))
+      # Validation is turned off after the first two inputs.
+      self.assertEqual({'output': [Type2(3)]},
+                       dag_pipe_obj.transform(Type0(-1, 2, 3)))
 
   def testInvalidDAGException(self):
     class UnitQ(pipeline.Pipeline):
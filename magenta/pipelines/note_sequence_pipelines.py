@@ -18,6 +18,7 @@ import copy
 # internal imports
 import tensorflow as tf
 
+from magenta.music import chord_symbols_lib
 from magenta.music import constants
 from magenta.music import sequences_lib
 from magenta.pipelines import pipeline
@@ -72,7 +73,8 @@ class TimeChangeSplitter(NoteSequencePipeline):
 class Quantizer(NoteSequencePipeline):
   """A Pipeline that quantizes NoteSequence data."""
 
-  def __init__(self, steps_per_quarter=None, steps_per_second=None, name=None):
+  def __init__(self, steps_per_quarter=None, steps_per_second=None,
+               owns_input=False, name=None):
     """Creates a Quantizer pipeline.
 
     Exactly one of `steps_per_quarter` and `steps_per_second` should be defined.
@@ -80,6 +82,10 @@ class Quantizer(NoteSequencePipeline):
     Args:
       steps_per_quarter: Steps per quarter note to use for quantization.
       steps_per_second: Steps per second to use for quantization.
+      owns_input: If True, input NoteSequences are quantized in place instead
+          of being copied first. Only set this when nothing else uses the
+          inputs, e.g. when the Quantizer is the only consumer of a splitter's
+          outputs.
       name: Pipeline name.
 
     Raises:
@@ -92,15 +98,16 @@ class Quantizer(NoteSequencePipeline):
           'Exactly one of steps_per_quarter or steps_per_second must be set.')
     self._steps_per_quarter = steps_per_quarter
     self._steps_per_second = steps_per_second
+    self._owns_input = owns_input
 
   def transform(self, note_sequence):
     try:
       if self._steps_per_quarter is not None:
         quantized_sequence = sequences_lib.quantize_note_sequence(
-            note_sequence, self._steps_per_quarter)
+            note_sequence, self._steps_per_quarter, in_place=self._owns_input)
       else:
         quantized_sequence = sequences_lib.quantize_note_sequence_absolute(
-            note_sequence, self._steps_per_second)
+            note_sequence, self._steps_per_second, in_place=self._owns_input)
       return [quantized_sequence]
     except sequences_lib.MultipleTimeSignatureException as e:
       tf.logging.warning('Multiple time signatures in NoteSequence %s: %s',
@@ -129,6 +136,56 @@ class SustainPipeline(NoteSequencePipeline):
     return [sequences_lib.apply_sustain_control_changes(note_sequence)]
 
 
+class ChordInferencePipeline(NoteSequencePipeline):
+  """Infers chords for a NoteSequence and adds them as chord symbols.
+
+  Chord symbols are cached by pitch class set across calls to `transform`, and
+  the number of cache hits and misses for each NoteSequence is reported in the
+  pipeline statistics.
+  """
+
+  def __init__(self, instrument=None, min_notes_per_chord=3,
+               chord_cache_size=4096, name=None):
+    """Creates a ChordInferencePipeline.
+
+    Args:
+      instrument: The instrument number whose notes will be used for chord
+          inference. If None, all instruments will be used.
+      min_notes_per_chord: The minimum number of simultaneous notes for which
+          to infer a chord.
+      chord_cache_size: The maximum number of chord symbols to cache.
+      name: Pipeline name.
+    """
+    super(ChordInferencePipeline, self).__init__(name=name)
+    self._instrument = instrument
+    self._min_notes_per_chord = min_notes_per_chord
+    self._chord_symbol_cache = chord_symbols_lib.ChordSymbolCache(
+        chord_cache_size)
+
+  def transform(self, note_sequence):
+    hits = self._chord_symbol_cache.hits
+    misses = self._chord_symbol_cache.misses
+    sequence = copy.deepcopy(note_sequence)
+    try:
+      sequences_lib.infer_chords_for_sequence(
+          sequence, instrument=self._instrument,
+          min_notes_per_chord=self._min_notes_per_chord,
+          chord_symbol_cache=self._chord_symbol_cache)
+      sequences = [sequence]
+      stats = []
+    except chord_symbols_lib.ChordSymbolException as detail:
+      tf.logging.warning('Skipped sequence: %s', detail)
+      sequences = []
+      stats = [statistics.Counter('chord_symbol_exception', 1)]
+    stats.extend([
+        statistics.Counter(
+            'chord_cache_hits', self._chord_symbol_cache.hits - hits),
+        statistics.Counter(
+            'chord_cache_misses', self._chord_symbol_cache.misses - misses)])
+    self._set_stats(stats)
+    return sequences
+
+
 class StretchPipeline(NoteSequencePipeline):
   """Creates stretched versions of the input NoteSequence."""
 
@@ -93,6 +93,28 @@ class PipelineUnitsCommonTest(tf.test.TestCase):
     self._unit_transform_test(unit, note_sequence,
                               [expected_quantized_sequence])
 
+  def testQuantizerOwnsInput(self):
+    note_sequence = common_testing_lib.parse_test_proto(
+        music_pb2.NoteSequence,
+        """
+        time_signatures: {
+          numerator: 4
+          denominator: 4}
+        tempos: {
+          qpm: 60}""")
+    testing_lib.add_track_to_sequence(
+        note_sequence, 0,
+        [(12, 100, 0.01, 10.0), (11, 55, 0.22, 0.50), (40, 45, 2.50, 3.50),
+         (55, 120, 4.0, 4.01), (52, 99, 4.75, 5.0)])
+    expected_quantized_sequence = sequences_lib.quantize_note_sequence(
+        note_sequence, 4)
+
+    unit = note_sequence_pipelines.Quantizer(4, owns_input=True)
+    quantized_sequences = unit.transform(note_sequence)
+    self.assertEqual(1, len(quantized_sequences))
+    self.assertIs(note_sequence, quantized_sequences[0])
+    self.assertProtoEquals(expected_quantized_sequence, quantized_sequences[0])
+
   def testSustainPipeline(self):
     note_sequence = common_testing_lib.parse_test_proto(
         music_pb2.NoteSequence,
@@ -116,6 +138,38 @@ class PipelineUnitsCommonTest(tf.test.TestCase):
     unit = note_sequence_pipelines.SustainPipeline()
     self._unit_transform_test(unit, note_sequence, [expected_sequence])
 
+  def testChordInferencePipeline(self):
+    note_sequence = common_testing_lib.parse_test_proto(
+        music_pb2.NoteSequence,
+        """
+        time_signatures: {
+          numerator: 4
+          denominator: 4}
+        tempos: {
+          qpm: 60}""")
+    testing_lib.add_track_to_sequence(
+        note_sequence, 0,
+        [(60, 100, 0.0, 1.0), (64, 100, 0.0, 1.0), (67, 100, 0.0, 1.0),
+         (62, 100, 1.0, 2.0), (65, 100, 1.0, 2.0), (69, 100, 1.0, 2.0),
+         (48, 100, 2.0, 3.0), (55, 100, 2.0, 3.0), (64, 100, 2.0, 3.0)])
+    expected_sequence = music_pb2.NoteSequence()
+    expected_sequence.CopyFrom(note_sequence)
+    testing_lib.add_chords_to_sequence(
+        expected_sequence, [('C', 0.0), ('Dm', 1.0), ('C', 2.0)])
+
+    unit = note_sequence_pipelines.ChordInferencePipeline(
+        name='ChordInferencePipeline')
+    self._unit_transform_test(unit, note_sequence, [expected_sequence])
+    stats = dict((stat.name, stat.count) for stat in unit.get_stats())
+    self.assertEqual({'ChordInferencePipeline_chord_cache_hits': 1,
+                      'ChordInferencePipeline_chord_cache_misses': 2}, stats)
+
+    # Chord symbols are cached across calls to transform.
+    self._unit_transform_test(unit, note_sequence, [expected_sequence])
+    stats = dict((stat.name, stat.count) for stat in unit.get_stats())
+    self.assertEqual({'ChordInferencePipeline_chord_cache_hits': 3,
+                      'ChordInferencePipeline_chord_cache_misses': 0}, stats)
+
   def testStretchPipeline(self):
     note_sequence = common_testing_lib.parse_test_proto(
         music_pb2.NoteSequence,
@@ -15,9 +15,14 @@
 
 import abc
 import inspect
+import multiprocessing
 import os.path
+import threading
+import traceback
 
 # internal imports
+import six
+from six.moves import queue
 import tensorflow as tf
 
 from magenta.pipelines import statistics
@@ -307,6 +312,148 @@ def tf_record_iterator(tfrecord_file, proto):
     yield proto.FromString(raw_bytes)
 
 
+# Put on the queue of `sharded_tf_record_iterator` by a reader thread when it
+# has read all of its files.
+_READER_DONE = object()
+
+
+def sharded_tf_record_iterator(file_pattern,
+                               proto,
+                               num_threads=4,
+                               queue_size=1000,
+                               worker_index=0,
+                               num_workers=1):
+  """Generator that iterates over protocol buffers in many TFRecord files.
+
+  Reads all the TFRecord files matching `file_pattern`, such as the shards
+  written by `run_pipeline_parallel`. Up to `num_threads` background threads
+  each read and parse one file at a time and put the protos on a queue of at
+  most `queue_size` protos, so the records of several files are interleaved and
+  reading overlaps with whatever consumes the protos. Unless a single file is
+  read, the order of the protos is not deterministic.
+
+  For distributed dataset builds, the input can be split between `num_workers`
+  workers, of which this is number `worker_index`. If there are at least as many
+  files as workers, each worker reads every `num_workers`-th file. Otherwise
+  every worker reads all the files, keeping every `num_workers`-th record of
+  each.
+
+  Args:
+    file_pattern: A glob pattern, or a list of glob patterns, matching TFRecord
+        files containing protocol buffers. A plain path matches itself.
+    proto: A protocol buffer class. This type will be used to deserialize the
+        protos from the TFRecord files. This will be the output type.
+    num_threads: The maximum number of files to read at once.
+    queue_size: The maximum number of parsed protos waiting to be consumed.
+    worker_index: The index of this worker, in [0, `num_workers`).
+    num_workers: The number of workers the input is split between.
+
+  Yields:
+    Instances of the given `proto` class from the TFRecord files.
+
+  Raises:
+    ValueError: If no files match `file_pattern`, or if `num_threads`,
+        `queue_size`, `worker_index` or `num_workers` are out of range.
+    RuntimeError: If a file could not be read.
+  """
+  if num_threads < 1:
+    raise ValueError('num_threads must be positive, got %d' % num_threads)
+  if queue_size < 1:
+    raise ValueError('queue_size must be positive, got %d' % queue_size)
+  if not 0 <= worker_index < num_workers:
+    raise ValueError('worker_index must be in [0, %d), got %d'
+                     % (num_workers, worker_index))
+
+  if isinstance(file_pattern, six.string_types):
+    file_pattern = [file_pattern]
+  paths = sorted(set(path for pattern in file_pattern
+                     for path in tf.gfile.Glob(pattern)))
+  if not paths:
+    raise ValueError('No files match %s' % file_pattern)
+  if len(paths) >= num_workers:
+    paths = paths[worker_index::num_workers]
+    record_worker_index, record_num_workers = 0, 1
+  else:
+    record_worker_index, record_num_workers = worker_index, num_workers
+
+  path_queue = queue.Queue()
+  for path in paths:
+    path_queue.put(path)
+  proto_queue = queue.Queue(maxsize=queue_size)
+  stopped = threading.Event()
+
+  def put(item):
+    # Waits for room on the queue, unless the consumer has stopped iterating.
+    while not stopped.is_set():
+      try:
+        proto_queue.put(item, timeout=0.1)
+        return True
+      except queue.Full:
+        pass
+    return False
+
+  def read():
+    path = None
+    try:
+      while not stopped.is_set():
+        try:
+          path = path_queue.get_nowait()
+        except queue.Empty:
+          break
+        for i, raw_bytes in enumerate(tf.python_io.tf_record_iterator(path)):
+          if (i % record_num_workers == record_worker_index and
+              not put(proto.FromString(raw_bytes))):
+            return
+    except Exception:  # pylint: disable=broad-except
+      put(RuntimeError('Failed to read %s:\n%s'
+                       % (path, traceback.format_exc())))
+      return
+    put(_READER_DONE)
+
+  threads = [threading.Thread(target=read)
+             for _ in range(min(num_threads, len(paths)))]
+  for thread in threads:
+    thread.daemon = True
+    thread.start()
+  try:
+    readers_done = 0
+    while readers_done < len(threads):
+      item = proto_queue.get()
+      if item is _READER_DONE:
+        readers_done += 1
+      elif isinstance(item, RuntimeError):
+        raise item
+      else:
+        yield item
+  finally:
+    stopped.set()
+    for thread in threads:
+      thread.join()
+
+
+def _assert_serializable_output_type(pipeline):
+  """Checks that all of `pipeline`'s outputs can be written to TFRecord.
+
+  Args:
+    pipeline: A Pipeline instance.
+
+  Raises:
+    ValueError: If any of `pipeline`'s output types do not have a
+        SerializeToString method.
+  """
+  if isinstance(pipeline.output_type, dict):
+    for name, type_ in pipeline.output_type.items():
+      if not hasattr(type_, 'SerializeToString'):
+        raise ValueError(
+            'Pipeline output "%s" does not have method SerializeToString. '
+            'Output type = %s' % (name, pipeline.output_type))
+  else:
+    if not hasattr(pipeline.output_type, 'SerializeToString'):
+      raise ValueError(
+          'Pipeline output type %s does not have method SerializeToString.'
+          % pipeline.output_type)
+
+
 def run_pipeline_serial(pipeline,
                         input_iterator,
                         output_dir,
@@ -336,17 +483,7 @@ def run_pipeline_serial(pipeline,
     ValueError: If any of `pipeline`'s output types do not have a
         SerializeToString method.
   """
-  if isinstance(pipeline.output_type, dict):
-    for name, type_ in pipeline.output_type.items():
-      if not hasattr(type_, 'SerializeToString'):
-        raise ValueError(
-            'Pipeline output "%s" does not have method SerializeToString. '
-            'Output type = %s' % (name, pipeline.output_type))
-  else:
-    if not hasattr(pipeline.output_type, 'SerializeToString'):
-      raise ValueError(
-          'Pipeline output type %s does not have method SerializeToString.'
-          % pipeline.output_type)
+  _assert_serializable_output_type(pipeline)
 
   if not tf.gfile.Exists(output_dir):
     tf.gfile.MakeDirs(output_dir)
@@ -366,7 +503,7 @@ def run_pipeline_serial(pipeline,
 
   total_inputs = 0
   total_outputs = 0
-  stats = []
+  stats = statistics.StatisticsRegistry()
   for input_ in input_iterator:
     total_inputs += 1
     for name, outputs in _guarantee_dict(pipeline.transform(input_),
@@ -374,15 +511,268 @@ def run_pipeline_serial(pipeline,
       for output in outputs:
         writers[name].write(output.SerializeToString())
       total_outputs += len(outputs)
-    stats = statistics.merge_statistics(stats + pipeline.get_stats())
+    stats.merge(pipeline.get_stats())
     if total_inputs % 500 == 0:
       tf.logging.info('Processed %d inputs so far. Produced %d outputs.',
                       total_inputs, total_outputs)
-      statistics.log_statistics_list(stats, tf.logging.info)
+      statistics.log_statistics_list(stats.get_stats(), tf.logging.info)
+  tf.logging.info('\n\nCompleted.\n')
+  tf.logging.info('Processed %d inputs total. Produced %d outputs.',
+                  total_inputs, total_outputs)
+  statistics.log_statistics_list(stats.get_stats(), tf.logging.info)
+
+
+# How often, in seconds, run_pipeline_parallel checks that its workers are
+# still alive while waiting on them.
+_WORKER_POLL_SECONDS = 1.0
+
+
+def _shard_path(output_dir, output_file_base, name, shard, num_shards):
+  """Returns the path of one TFRecord shard of a dataset.
+
+  For example, shard 3 of 16 of the dataset 'training_melodies' is written to
+  'training_melodies-00003-of-00016.tfrecord'.
+  """
+  if output_file_base is None:
+    file_name = '%s-%05d-of-%05d.tfrecord' % (name, shard, num_shards)
+  else:
+    file_name = '%s_%s-%05d-of-%05d.tfrecord' % (
+        output_file_base, name, shard, num_shards)
+  return os.path.join(output_dir, file_name)
+
+
+def _run_pipeline_worker(pipeline, shard, output_paths, input_queue,
+                         result_queue):
+  """Runs a pipeline on batches of inputs from a queue in a worker process.
+
+  Outputs are written to this worker's own TFRecord shard for each dataset.
+  Batches are read from `input_queue` until a None batch is received. When
+  done, a tuple (shard, total_outputs, stats, error) is put on
+  `result_queue`, where `error` is None on success or the formatted traceback
+  of the exception raised by the pipeline. After an error the remaining
+  batches are drained without being transformed so that the producer never
+  blocks.
+
+  Args:
+    pipeline: A Pipeline instance.
+    shard: The index of this worker's shard.
+    output_paths: A dictionary mapping dataset names to the shard path this
+        worker writes that dataset to.
+    input_queue: A multiprocessing.Queue of lists of inputs.
+    result_queue: A multiprocessing.Queue the worker's results are put on.
+  """
+  total_outputs = 0
+  stats = statistics.StatisticsRegistry()
+  error = None
+  try:
+    default_name = list(output_paths.keys())[0]
+    writers = dict([(name, tf.python_io.TFRecordWriter(path))
+                    for name, path in output_paths.items()])
+    try:
+      for batch in iter(input_queue.get, None):
+        for input_ in batch:
+          for name, outputs in _guarantee_dict(pipeline.transform(input_),
+                                               default_name).items():
+            for output in outputs:
+              writers[name].write(output.SerializeToString())
+            total_outputs += len(outputs)
+          stats.merge(pipeline.get_stats())
+    finally:
+      for writer in writers.values():
+        writer.close()
+  except Exception:  # pylint: disable=broad-except
+    error = traceback.format_exc()
+    for _ in iter(input_queue.get, None):
+      pass
+  result_queue.put((shard, total_outputs, stats.get_stats(), error))
+
+
+def _dead_workers_error(workers, shards):
+  """Returns a RuntimeError describing workers that exited unexpectedly."""
+  return RuntimeError(
+      'Pipeline worker for shard %s exited with code %s without posting its '
+      'result.' % (', '.join(str(shard) for shard in shards),
+                   ', '.join(str(workers[shard].exitcode) for shard in shards)))
+
+
+def _put_to_workers(input_queue, item, workers):
+  """Puts an item on the workers' input queue without blocking forever.
+
+  Workers exit cleanly only after receiving a None batch, so a worker that
+  has exited with a nonzero code died while inputs were still being sent (for
+  example it was killed for running out of memory) and may have taken a batch
+  with it.
+
+  Args:
+    input_queue: The multiprocessing.Queue the workers read batches from.
+    item: The batch, or None, to put on the queue.
+    workers: The list of worker multiprocessing.Process instances.
+
+  Raises:
+    RuntimeError: If a worker died while the queue was full.
+  """
+  while True:
+    try:
+      input_queue.put(item, timeout=_WORKER_POLL_SECONDS)
+      return
+    except queue.Full:
+      dead = [shard for shard, worker in enumerate(workers)
+              if worker.exitcode]
+      if dead:
+        raise _dead_workers_error(workers, dead)
+
+
+def _get_worker_results(result_queue, workers):
+  """Gets the result of every worker without blocking forever.
+
+  A worker's result is flushed to `result_queue` before the worker exits, so
+  a worker that has exited and whose result has still not arrived one poll
+  interval later died without posting it.
+
+  Args:
+    result_queue: The multiprocessing.Queue the workers put results on.
+    workers: The list of worker multiprocessing.Process instances.
+
+  Returns:
+    A list of (total_outputs, stats, error) tuples, indexed by shard.
+
+  Raises:
+    RuntimeError: If a worker exited without posting its result.
+  """
+  results = {}
+  exited = set()
+  while len(results) < len(workers):
+    try:
+      shard, total_outputs, stats, error = result_queue.get(
+          timeout=_WORKER_POLL_SECONDS)
+      results[shard] = (total_outputs, stats, error)
+    except queue.Empty:
+      lost = sorted(exited - set(results))
+      if lost:
+        raise _dead_workers_error(workers, lost)
+      exited = set(shard for shard, worker in enumerate(workers)
+                   if worker.exitcode is not None)
+  return [results[shard] for shard in range(len(workers))]
+
+
+def run_pipeline_parallel(pipeline,
+                          input_iterator,
+                          output_dir,
+                          output_file_base=None,
+                          num_shards=None,
+                          batch_size=16):
+  """Runs a pipeline on a data source in parallel and writes sharded datasets.
+
+  Like `run_pipeline_serial`, but inputs are spread over `num_shards` worker
+  processes. Each worker writes its outputs to its own TFRecord shard of each
+  dataset, so dataset 'training_melodies' is written to files
+  'training_melodies-00000-of-00016.tfrecord' through
+  'training_melodies-00015-of-00016.tfrecord' when `num_shards` is 16. The
+  Statistics of all the workers are merged together at the end.
+
+  The union of the shards contains the same records as the file written by
+  `run_pipeline_serial` for the same inputs, although not in the same order.
+  Pipelines whose output depends on random state (such as `RandomPartition`)
+  draw from each worker's own copy of that state.
+
+  Inputs are sent to the workers through a bounded queue, so `input_iterator`
+  is consumed lazily. Inputs must be picklable.
+
+  Args:
+    pipeline: A Pipeline instance. `pipeline.output_type` must be a protocol
+        buffer or a dictionary mapping names to protocol buffers.
+    input_iterator: Iterates over the input data. Items returned by it are fed
+        directly into the pipeline's `transform` method.
+    output_dir: Path to directory where datasets will be written. Each dataset
+        is a set of files whose names contain the pipeline's dataset name. If
+        the directory does not exist, it will be created.
+    output_file_base: An optional string prefix for all datasets output by this
+        run. The prefix will also be followed by an underscore.
+    num_shards: The number of worker processes, which is also the number of
+        shards each dataset is split into. If None, the number of CPUs is used.
+    batch_size: The number of inputs sent to a worker at a time.
+
+  Raises:
+    ValueError: If any of `pipeline`'s output types do not have a
+        SerializeToString method, or if `num_shards` or `batch_size` is not
+        positive.
+    RuntimeError: If the pipeline raised an exception in any of the workers,
+        or if a worker process exited unexpectedly.
+  """
+  _assert_serializable_output_type(pipeline)
+  if num_shards is None:
+    num_shards = multiprocessing.cpu_count()
+  if num_shards < 1:
+    raise ValueError('num_shards must be positive, got %d' % num_shards)
+  if batch_size < 1:
+    raise ValueError('batch_size must be positive, got %d' % batch_size)
+
+  if not tf.gfile.Exists(output_dir):
+    tf.gfile.MakeDirs(output_dir)
+
+  output_names = pipeline.output_type_as_dict.keys()
+
+  input_queue = multiprocessing.Queue(maxsize=2 * num_shards)
+  result_queue = multiprocessing.Queue()
+  workers = []
+  for shard in range(num_shards):
+    output_paths = dict(
+        [(name, _shard_path(output_dir, output_file_base, name, shard,
+                            num_shards))
+         for name in output_names])
+    worker = multiprocessing.Process(
+        target=_run_pipeline_worker,
+        args=(pipeline, shard, output_paths, input_queue, result_queue))
+    worker.daemon = True
+    worker.start()
+    workers.append(worker)
+
+  try:
+    total_inputs = 0
+    batch = []
+    for input_ in input_iterator:
+      total_inputs += 1
+      batch.append(input_)
+      if len(batch) == batch_size:
+        _put_to_workers(input_queue, batch, workers)
+        batch = []
+      if total_inputs % 500 == 0:
+        tf.logging.info('Sent %d inputs to %d workers so far.',
+                        total_inputs, num_shards)
+    if batch:
+      _put_to_workers(input_queue, batch, workers)
+    for _ in workers:
+      _put_to_workers(input_queue, None, workers)
+
+    # Results must be read before joining, otherwise a worker can block while
+    # flushing its result to the queue.
+    results = _get_worker_results(result_queue, workers)
+  except:  # pylint: disable=bare-except
+    # The surviving workers would otherwise wait for inputs forever.
+    for worker in workers:
+      if worker.is_alive():
+        worker.terminate()
+    raise
+  for worker in workers:
+    worker.join()
+
+  total_outputs = 0
+  stats = statistics.StatisticsRegistry()
+  errors = []
+  for worker_outputs, worker_stats, error in results:
+    total_outputs += worker_outputs
+    stats.merge(worker_stats)
+    if error is not None:
+      errors.append(error)
+  if errors:
+    raise RuntimeError(
+        'Pipeline failed in %d of %d workers:\n%s'
+        % (len(errors), num_shards, '\n'.join(errors)))
+
   tf.logging.info('\n\nCompleted.\n')
   tf.logging.info('Processed %d inputs total. Produced %d outputs.',
                   total_inputs, total_outputs)
-  statistics.log_statistics_list(stats, tf.logging.info)
+  statistics.log_statistics_list(stats.get_stats(), tf.logging.info)
 
 
 def load_pipeline(pipeline, input_iterator):
@@ -405,7 +795,7 @@ def load_pipeline(pipeline, input_iterator):
       [(name, []) for name in pipeline.output_type_as_dict])
   total_inputs = 0
   total_outputs = 0
-  stats = []
+  stats = statistics.StatisticsRegistry()
   for input_object in input_iterator:
     total_inputs += 1
     outputs = _guarantee_dict(pipeline.transform(input_object),
@@ -413,13 +803,13 @@ def load_pipeline(pipeline, input_iterator):
     for name, output_list in outputs.items():
       aggregated_outputs[name].extend(output_list)
       total_outputs += len(output_list)
-    stats = statistics.merge_statistics(stats + pipeline.get_stats())
+    stats.merge(pipeline.get_stats())
     if total_inputs % 500 == 0:
       tf.logging.info('Processed %d inputs so far. Produced %d outputs.',
                       total_inputs, total_outputs)
-      statistics.log_statistics_list(stats, tf.logging.info)
+      statistics.log_statistics_list(stats.get_stats(), tf.logging.info)
   tf.logging.info('\n\nCompleted.\n')
   tf.logging.info('Processed %d inputs total. Produced %d outputs.',
                   total_inputs, total_outputs)
-  statistics.log_statistics_list(stats, tf.logging.info)
+  statistics.log_statistics_list(stats.get_stats(), tf.logging.info)
   return aggregated_outputs
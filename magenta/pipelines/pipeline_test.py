@@ -13,6 +13,7 @@
 # limitations under the License.
 """Tests for pipeline."""
 
+import glob
 import os
 import tempfile
 
@@ -103,6 +104,45 @@ class PipelineTest(tf.test.TestCase):
          for string in ['hello world', '12345', 'success']],
         list(pipeline.tf_record_iterator(tfrecord_file, MockStringProto)))
 
+  def testShardedTFRecordIterator(self):
+    root_dir = tempfile.mkdtemp(dir=self.get_temp_dir())
+    strings = []
+    for shard in range(3):
+      writer = tf.python_io.TFRecordWriter(
+          os.path.join(root_dir, 'input-%05d-of-00003.tfrecord' % shard))
+      for i in range(10 + shard):
+        strings.append('%d_%d' % (shard, i))
+        writer.write(strings[-1])
+      writer.close()
+    pattern = os.path.join(root_dir, 'input-*.tfrecord')
+
+    self.assertEqual(
+        sorted(strings),
+        sorted(proto.string for proto in pipeline.sharded_tf_record_iterator(
+            pattern, MockStringProto, num_threads=2, queue_size=3)))
+
+    # A single file is read in order.
+    self.assertEqual(
+        [MockStringProto('1_%d' % i) for i in range(11)],
+        list(pipeline.sharded_tf_record_iterator(
+            os.path.join(root_dir, 'input-00001-of-00003.tfrecord'),
+            MockStringProto)))
+
+    # Workers split the files between them, or the records if there are more
+    # workers than files.
+    for num_workers in [2, 5]:
+      worker_strings = []
+      for worker_index in range(num_workers):
+        worker_strings.extend(
+            proto.string for proto in pipeline.sharded_tf_record_iterator(
+                pattern, MockStringProto, worker_index=worker_index,
+                num_workers=num_workers))
+      self.assertEqual(sorted(strings), sorted(worker_strings))
+
+    with self.assertRaises(ValueError):
+      list(pipeline.sharded_tf_record_iterator(
+          os.path.join(root_dir, 'missing-*.tfrecord'), MockStringProto))
+
   def testRunPipelineSerial(self):
     strings = ['abcdefg', 'helloworld!', 'qwerty']
     root_dir = tempfile.mkdtemp(dir=self.get_temp_dir())
@@ -125,6 +165,63 @@ class PipelineTest(tf.test.TestCase):
         set(['serialized:%s_C' % s for s in strings]),
         set(dataset_2_reader))
 
+  def testRunPipelineParallel(self):
+    strings = ['abcdefg', 'helloworld!', 'qwerty', '12345', 'zzz']
+    root_dir = tempfile.mkdtemp(dir=self.get_temp_dir())
+    pipeline.run_pipeline_parallel(
+        MockPipeline(), iter(strings), root_dir, num_shards=3, batch_size=2)
+
+    for name in ['dataset_1', 'dataset_2']:
+      self.assertEqual(
+          [os.path.join(root_dir, '%s-%05d-of-00003.tfrecord' % (name, shard))
+           for shard in range(3)],
+          sorted(glob.glob(os.path.join(root_dir, name + '-*.tfrecord'))))
+
+    serial_dir = tempfile.mkdtemp(dir=self.get_temp_dir())
+    pipeline.run_pipeline_serial(MockPipeline(), iter(strings), serial_dir)
+    for name in ['dataset_1', 'dataset_2']:
+      parallel_records = []
+      for path in glob.glob(os.path.join(root_dir, name + '-*.tfrecord')):
+        parallel_records.extend(tf.python_io.tf_record_iterator(path))
+      serial_records = list(tf.python_io.tf_record_iterator(
+          os.path.join(serial_dir, name + '.tfrecord')))
+      self.assertEqual(sorted(serial_records), sorted(parallel_records))
+
+  def testRunPipelineParallelError(self):
+
+    class FailingPipeline(pipeline.Pipeline):
+
+      def __init__(self):
+        super(FailingPipeline, self).__init__(str, MockStringProto)
+
+      def transform(self, input_object):
+        raise ValueError('Bad input %s' % input_object)
+
+    root_dir = tempfile.mkdtemp(dir=self.get_temp_dir())
+    with self.assertRaises(RuntimeError):
+      pipeline.run_pipeline_parallel(
+          FailingPipeline(), iter(['abc', 'def']), root_dir, num_shards=2)
+
+  def testRunPipelineParallelWorkerDies(self):
+
+    class DyingPipeline(pipeline.Pipeline):
+
+      def __init__(self):
+        super(DyingPipeline, self).__init__(str, MockStringProto)
+
+      def transform(self, input_object):
+        # Exit without running any cleanup, as if the worker had been killed.
+        os._exit(1)  # pylint: disable=protected-access
+
+    # With few inputs the worker dies after all inputs were sent; with many
+    # inputs it dies while the input queue is full.
+    for num_inputs in [1, 100]:
+      root_dir = tempfile.mkdtemp(dir=self.get_temp_dir())
+      with self.assertRaisesRegexp(RuntimeError, 'exited with code'):
+        pipeline.run_pipeline_parallel(
+            DyingPipeline(), iter(['abc'] * num_inputs), root_dir,
+            num_shards=2, batch_size=1)
+
   def testPipelineIterator(self):
     strings = ['abcdefg', 'helloworld!', 'qwerty']
     result = pipeline.load_pipeline(MockPipeline(), iter(strings))
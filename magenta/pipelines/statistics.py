@@ -125,6 +125,54 @@ def merge_statistics(stats_list):
   return name_map.values()
 
 
+class StatisticsRegistry(object):
+  """Accumulates Statistics in place, merging them by name.
+
+  Unlike `merge_statistics`, which re-merges the whole list it is given,
+  merging into a `StatisticsRegistry` only touches the Statistics being added.
+  This keeps the cost of aggregating the Statistics from each call to
+  `Pipeline.transform` independent of how many distinct Statistics have been
+  seen so far.
+
+  A copy of each Statistic is made the first time its name is seen, so the
+  Statistics passed to `merge` are never modified.
+  """
+
+  def __init__(self, stats_list=None):
+    """Constructs a `StatisticsRegistry`.
+
+    Args:
+      stats_list: An optional list of `Statistic` objects to start with.
+    """
+    self._stats = {}
+    if stats_list is not None:
+      self.merge(stats_list)
+
+  def merge(self, stats_list):
+    """Merges the given Statistics into the registry.
+
+    Args:
+      stats_list: An iterable of `Statistic` objects.
+
+    Raises:
+      MergeStatisticsException: If a Statistic cannot be merged with the
+          registered Statistic of the same name.
+    """
+    for stat in stats_list:
+      registered = self._stats.get(stat.name)
+      if registered is None:
+        self._stats[stat.name] = stat.copy()
+      else:
+        registered.merge_from(stat)
+
+  def get_stats(self):
+    """Returns a list of the accumulated Statistics, one per name."""
+    return list(self._stats.values())
+
+  def __len__(self):
+    return len(self._stats)
+
+
 def log_statistics_list(stats_list, logger_fn=tf.logging.info):
   """Calls the given logger function on each `Statistic` in the list.
 
@@ -270,4 +318,6 @@ class Histogram(Statistic):
          if self.verbose_pretty_print or self.counters[lower]])
 
   def copy(self):
-    return copy.copy(self)
+    histogram_copy = copy.copy(self)
+    histogram_copy.counters = dict(self.counters)
+    return histogram_copy
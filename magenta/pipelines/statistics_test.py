@@ -13,6 +13,8 @@
 # limitations under the License.
 """Tests for statistics."""
 
+import time
+
 # internal imports
 import tensorflow as tf
 
@@ -91,6 +93,37 @@ class StatisticsTest(tf.test.TestCase):
                      {float('-inf'): 6, 1: 1, 2: 13, 10: 3})
     self.assertEqual(histo_copy.name, 'name_123')
 
+  def testHistogramCopyIsIndependent(self):
+    histo = statistics.Histogram('name_123', [1, 2])
+    histo.increment(1)
+    histo_copy = histo.copy()
+    histo_copy.increment(1)
+    self.assertEqual(histo.counters, {float('-inf'): 0, 1: 1, 2: 0})
+    self.assertEqual(histo_copy.counters, {float('-inf'): 0, 1: 2, 2: 0})
+
+  def testStatisticsRegistry(self):
+    counter_1 = statistics.Counter('counter_1', 5)
+    registry = statistics.StatisticsRegistry([counter_1])
+    registry.merge([statistics.Counter('counter_1', 2),
+                    statistics.Counter('counter_2', 1)])
+    registry.merge([statistics.Counter('counter_2', 3)])
+    histo = statistics.Histogram('histo', [1, 2])
+    histo.increment(1)
+    registry.merge([histo, histo])
+
+    self.assertEqual(3, len(registry))
+    stats = dict([(stat.name, stat) for stat in registry.get_stats()])
+    self.assertEqual(7, stats['counter_1'].count)
+    self.assertEqual(4, stats['counter_2'].count)
+    self.assertEqual({float('-inf'): 0, 1: 2, 2: 0}, stats['histo'].counters)
+
+    # The merged Statistics are not modified.
+    self.assertEqual(5, counter_1.count)
+    self.assertEqual({float('-inf'): 0, 1: 1, 2: 0}, histo.counters)
+
+    with self.assertRaises(statistics.MergeStatisticsException):
+      registry.merge([statistics.Histogram('counter_1', [1])])
+
   def testMergeDifferentNames(self):
     counter_1 = statistics.Counter('counter_1')
     counter_2 = statistics.Counter('counter_2')
@@ -99,5 +132,45 @@ class StatisticsTest(tf.test.TestCase):
       counter_1.merge_from(counter_2)
 
 
+class StatisticsRegistryBenchmark(tf.test.Benchmark):
+  """Compares per-input overhead of `merge_statistics` and the registry.
+
+  Each simulated input produces a few Statistics, as returned by
+  `Pipeline.get_stats`, drawn from a growing pool of distinct names.
+  """
+
+  def _run(self, merge_fn, num_names, num_inputs=2000, stats_per_input=10):
+    inputs = [[statistics.Counter('stat_%d' % ((i + j) % num_names), 1)
+               for j in range(stats_per_input)]
+              for i in range(num_inputs)]
+    start = time.time()
+    merge_fn(inputs)
+    return (time.time() - start) / num_inputs
+
+  def benchmarkMergeStatistics(self):
+    def merge_fn(inputs):
+      stats = []
+      for input_stats in inputs:
+        stats = statistics.merge_statistics(stats + input_stats)
+
+    for num_names in [10, 100, 1000]:
+      self.report_benchmark(
+          name='merge_statistics_%d_names' % num_names,
+          iters=1,
+          wall_time=self._run(merge_fn, num_names))
+
+  def benchmarkStatisticsRegistry(self):
+    def merge_fn(inputs):
+      stats = statistics.StatisticsRegistry()
+      for input_stats in inputs:
+        stats.merge(input_stats)
+
+    for num_names in [10, 100, 1000]:
+      self.report_benchmark(
+          name='statistics_registry_%d_names' % num_names,
+          iters=1,
+          wall_time=self._run(merge_fn, num_names))
+
+
 if __name__ == '__main__':
   tf.test.main()
@@ -22,18 +22,36 @@ Example usage:
     --input_dir=/path/to/input/dir \
     --output_file=/path/to/tfrecord/file \
     --num_threads=4 \
+    --backend=process \
     --log=INFO
 """
 
+import hashlib
 import os
+import uuid
 
 # internal imports
 from concurrent import futures
 import tensorflow as tf
 
+from magenta import version
 from magenta.music import midi_io
 from magenta.music import musicxml_reader
 from magenta.music import note_sequence_io
+from magenta.protobuf import music_pb2
+
+# Kinds of worker pools to convert files with.
+THREAD_BACKEND = 'thread'
+PROCESS_BACKEND = 'process'
+BACKENDS = [THREAD_BACKEND, PROCESS_BACKEND]
+
+# Statuses of the files recorded in a resume manifest.
+CONVERTED = 'converted'
+SKIPPED = 'skipped'
+DUPLICATE = 'duplicate'
+
+# The number of conversions kept in flight for each worker.
+_IN_FLIGHT_PER_WORKER = 4
 
 FLAGS = tf.app.flags.FLAGS
 
@@ -41,47 +59,73 @@ tf.app.flags.DEFINE_string('input_dir', None,
                            'Directory containing files to convert.')
 tf.app.flags.DEFINE_string('output_file', None,
                            'Path to output TFRecord file. Will be overwritten '
-                           'if it already exists.')
+                           'if it already exists, unless --resume is set.')
 tf.app.flags.DEFINE_bool('recursive', False,
                          'Whether or not to recurse into subdirectories.')
 tf.app.flags.DEFINE_integer('num_threads', 1,
-                            'Number of worker threads to run in parallel.')
+                            'Number of worker threads or processes to run in '
+                            'parallel.')
+tf.app.flags.DEFINE_string('backend', THREAD_BACKEND,
+                           'The kind of worker pool to convert files with: '
+                           '"thread" or "process". Parsing is CPU bound, so '
+                           '"process" scales with --num_threads where threads '
+                           'contend for the Python GIL.')
+tf.app.flags.DEFINE_integer('num_shards', 1,
+                            'Number of TFRecord files to split the output '
+                            'into. If greater than 1, shard 3 of 16 of '
+                            '/path/out.tfrecord is written to '
+                            '/path/out-00003-of-00016.tfrecord.')
+tf.app.flags.DEFINE_bool('resume', False,
+                         'Whether to resume an interrupted conversion to the '
+                         'same --output_file and --num_shards. Files recorded '
+                         'as done in its manifest are not converted again.')
+tf.app.flags.DEFINE_string('cache_dir', None,
+                           'Optional directory to cache converted '
+                           'NoteSequences in, keyed by the content hash of '
+                           'each file and the converter version. Files '
+                           'unchanged since a previous run with the same '
+                           'cache are not parsed again.')
+tf.app.flags.DEFINE_bool('dedupe', False,
+                         'Whether to skip files that are byte-identical to a '
+                         'file found before, without parsing them.')
+tf.app.flags.DEFINE_string('midi_engine', midi_io.PRETTY_MIDI_ENGINE,
+                           'The engine to decode MIDI files with: '
+                           '"pretty_midi" or "native". "native" decodes them '
+                           'directly into NoteSequences, which is faster. It '
+                           'follows how pretty_midi 0.2.8 decodes MIDI files, '
+                           'so results may differ from other pretty_midi '
+                           'versions.')
 tf.app.flags.DEFINE_string('log', 'INFO',
                            'The threshold for what messages will be logged '
                            'DEBUG, INFO, WARN, ERROR, or FATAL.')
 
 
-def queue_conversions(root_dir, sub_dir, pool, recursive=False):
-  """Queues callables for converting files to NoteSequences via threadpool.
+def iterate_files(root_dir, sub_dir='', recursive=False):
+  """Lazily walks a directory for files that can be converted.
+
+  Only one directory listing is held in memory at a time, so directories with
+  millions of files can be converted without first collecting all of their
+  paths.
 
   Args:
     root_dir: A string specifying a root directory.
     sub_dir: A string specifying a path to a directory under `root_dir` in which
-        to convert contents.
-    pool: A ThreadPoolExecutor submit the conversion callables to.
-    recursive: A boolean specifying whether or not recursively convert files
-        contained in subdirectories of the specified directory.
+        to find files.
+    recursive: A boolean specifying whether or not to recurse into
+        subdirectories of the specified directory.
 
-  Returns:
-    A map from the resulting Futures to the file paths being converted.
+  Yields:
+    Tuples (sub_dir, full_file_path) of the directory under `root_dir` that
+    contains each file to convert, and the full path to the file.
   """
   dir_to_convert = os.path.join(root_dir, sub_dir)
   tf.logging.info("Converting files in '%s'.", dir_to_convert)
   files_in_dir = tf.gfile.ListDirectory(os.path.join(dir_to_convert))
-  future_to_path = {}
   recurse_sub_dirs = []
   for file_in_dir in files_in_dir:
-    tf.logging.log_every_n(tf.logging.INFO, 'Queued %d files for conversion.',
-                           1000, len(future_to_path))
     full_file_path = os.path.join(dir_to_convert, file_in_dir)
-    if (full_file_path.lower().endswith('.mid') or
-        full_file_path.lower().endswith('.midi')):
-      future_to_path[pool.submit(
-          convert_midi, root_dir, sub_dir, full_file_path)] = full_file_path
-    elif (full_file_path.lower().endswith('.xml') or
-          full_file_path.lower().endswith('.mxl')):
-      future_to_path[pool.submit(
-          convert_musicxml, root_dir, sub_dir, full_file_path)] = full_file_path
+    if _is_midi_file(full_file_path) or _is_musicxml_file(full_file_path):
+      yield sub_dir, full_file_path
     else:
       if recursive and tf.gfile.IsDirectory(full_file_path):
         recurse_sub_dirs.append(os.path.join(sub_dir, file_in_dir))
@@ -90,12 +134,28 @@ def queue_conversions(root_dir, sub_dir, pool, recursive=False):
             'Unable to find a converter for file %s', full_file_path)
 
   for recurse_sub_dir in recurse_sub_dirs:
-    future_to_path.update(queue_conversions(
-        root_dir, recurse_sub_dir, pool, recursive))
-  return future_to_path
+    for sub_dir_and_path in iterate_files(root_dir, recurse_sub_dir, recursive):
+      yield sub_dir_and_path
+
 
+def _is_midi_file(path):
+  return path.lower().endswith('.mid') or path.lower().endswith('.midi')
+
+
+def _is_musicxml_file(path):
+  return path.lower().endswith('.xml') or path.lower().endswith('.mxl')
+
+
+def _set_file_info(sequence, root_dir, sub_dir, full_file_path, source_type):
+  """Sets the collection_name, filename and id of a converted sequence."""
+  sequence.collection_name = os.path.basename(root_dir)
+  sequence.filename = os.path.join(sub_dir, os.path.basename(full_file_path))
+  sequence.id = note_sequence_io.generate_note_sequence_id(
+      sequence.filename, sequence.collection_name, source_type)
 
-def convert_midi(root_dir, sub_dir, full_file_path):
+
+def convert_midi(root_dir, sub_dir, full_file_path,
+                 midi_engine=midi_io.PRETTY_MIDI_ENGINE):
   """Converts a midi file to a sequence proto.
 
   Args:
@@ -103,22 +163,21 @@ def convert_midi(root_dir, sub_dir, full_file_path):
         converted.
     sub_dir: The directory being converted currently.
     full_file_path: the full path to the file to convert.
+    midi_engine: One of midi_io.MIDI_ENGINES, the engine to decode the MIDI
+        file with.
 
   Returns:
     Either a NoteSequence proto or None if the file could not be converted.
   """
   try:
     sequence = midi_io.midi_to_sequence_proto(
-        tf.gfile.FastGFile(full_file_path, 'rb').read())
+        tf.gfile.FastGFile(full_file_path, 'rb').read(), midi_engine)
   except midi_io.MIDIConversionError as e:
     tf.logging.warning(
         'Could not parse MIDI file %s. It will be skipped. Error was: %s',
         full_file_path, e)
     return None
-  sequence.collection_name = os.path.basename(root_dir)
-  sequence.filename = os.path.join(sub_dir, os.path.basename(full_file_path))
-  sequence.id = note_sequence_io.generate_note_sequence_id(
-      sequence.filename, sequence.collection_name, 'midi')
+  _set_file_info(sequence, root_dir, sub_dir, full_file_path, 'midi')
   tf.logging.info('Converted MIDI file %s.', full_file_path)
   return sequence
 
@@ -142,16 +201,276 @@ def convert_musicxml(root_dir, sub_dir, full_file_path):
         'Could not parse MusicXML file %s. It will be skipped. Error was: %s',
         full_file_path, e)
     return None
-  sequence.collection_name = os.path.basename(root_dir)
-  sequence.filename = os.path.join(sub_dir, os.path.basename(full_file_path))
-  sequence.id = note_sequence_io.generate_note_sequence_id(
-      sequence.filename, sequence.collection_name, 'musicxml')
+  _set_file_info(sequence, root_dir, sub_dir, full_file_path, 'musicxml')
   tf.logging.info('Converted MusicXML file %s.', full_file_path)
   return sequence
 
 
+def convert_file(root_dir, sub_dir, full_file_path,
+                 midi_engine=midi_io.PRETTY_MIDI_ENGINE):
+  """Converts a MIDI or MusicXML file to a sequence proto.
+
+  Args:
+    root_dir: A string specifying the root directory for the files being
+        converted.
+    sub_dir: The directory being converted currently.
+    full_file_path: the full path to the file to convert.
+    midi_engine: One of midi_io.MIDI_ENGINES, the engine to decode MIDI files
+        with.
+
+  Returns:
+    Either a NoteSequence proto or None if the file could not be converted.
+  """
+  if _is_midi_file(full_file_path):
+    return convert_midi(root_dir, sub_dir, full_file_path, midi_engine)
+  else:
+    return convert_musicxml(root_dir, sub_dir, full_file_path)
+
+
+def converter_version(full_file_path, midi_engine=midi_io.PRETTY_MIDI_ENGINE):
+  """Returns a string identifying the converter used for a file.
+
+  Cached conversions are only reused by the same converter version, so entries
+  written by another Magenta release or MIDI engine are ignored.
+
+  Args:
+    full_file_path: The path to the file to convert.
+    midi_engine: One of midi_io.MIDI_ENGINES, the engine to decode MIDI files
+        with.
+
+  Returns:
+    A string such as 'midi-native-0.2.4' or 'musicxml-0.2.4'.
+  """
+  if _is_midi_file(full_file_path):
+    return 'midi-%s-%s' % (midi_engine, version.__version__)
+  else:
+    return 'musicxml-%s' % version.__version__
+
+
+def conversion_cache_path(cache_dir, content_hash, full_file_path,
+                          midi_engine=midi_io.PRETTY_MIDI_ENGINE):
+  """Returns the path of the conversion cache entry for a file.
+
+  Args:
+    cache_dir: The root directory of the conversion cache.
+    content_hash: The SHA-1 hex digest of the contents of the file.
+    full_file_path: The path to the file to convert.
+    midi_engine: One of midi_io.MIDI_ENGINES, the engine to decode MIDI files
+        with.
+
+  Returns:
+    The path of the cache entry, which holds the serialized NoteSequence of the
+    file, or is empty if the file could not be converted.
+  """
+  return os.path.join(
+      cache_dir, converter_version(full_file_path, midi_engine),
+      content_hash[:2], content_hash)
+
+
+def _write_cache_entry(cache_path, serialized_sequence):
+  """Writes a cache entry atomically, so readers never see a partial entry."""
+  tf.gfile.MakeDirs(os.path.dirname(cache_path))
+  temp_path = '%s.tmp-%s' % (cache_path, uuid.uuid4().hex)
+  with tf.gfile.GFile(temp_path, 'wb') as f:
+    f.write(serialized_sequence)
+  tf.gfile.Rename(temp_path, cache_path, overwrite=True)
+
+
+def _content_hash(full_file_path):
+  """Returns the SHA-1 hex digest of the contents of a file."""
+  return hashlib.sha1(
+      tf.gfile.FastGFile(full_file_path, 'rb').read()).hexdigest()
+
+
+def _convert_file_to_string(root_dir, sub_dir, full_file_path, midi_engine,
+                            cache_dir=None, content_hash=None):
+  """Like `convert_file`, but returns the serialized NoteSequence proto.
+
+  Serialized protos are what gets written to the output, and they are much
+  cheaper to send back from a worker process than pickled ones.
+
+  If `cache_dir` is given and holds an entry for the contents of the file, the
+  cached NoteSequence is returned with the file's collection_name, filename and
+  id, instead of parsing the file again. Otherwise the result of the conversion
+  is added to the cache.
+
+  Args:
+    root_dir: A string specifying the root directory for the files being
+        converted.
+    sub_dir: The directory being converted currently.
+    full_file_path: the full path to the file to convert.
+    midi_engine: One of midi_io.MIDI_ENGINES, the engine to decode MIDI files
+        with.
+    cache_dir: Optional root directory of the conversion cache.
+    content_hash: The SHA-1 hex digest of the file contents, if it is already
+        known. Otherwise it is computed if `cache_dir` is given.
+
+  Returns:
+    A tuple (content_hash, serialized_sequence). `content_hash` is the SHA-1 hex
+    digest of the file contents, or None if it was neither given nor needed
+    for `cache_dir`. `serialized_sequence` is None if the file could not be
+    converted.
+  """
+  if cache_dir is not None and content_hash is None:
+    content_hash = _content_hash(full_file_path)
+
+  cache_path = None
+  if cache_dir is not None:
+    cache_path = conversion_cache_path(
+        cache_dir, content_hash, full_file_path, midi_engine)
+    if tf.gfile.Exists(cache_path):
+      with tf.gfile.GFile(cache_path, 'rb') as f:
+        cached = f.read()
+      if not cached:
+        tf.logging.warning(
+            'Could not convert file %s before. It will be skipped.',
+            full_file_path)
+        return content_hash, None
+      sequence = music_pb2.NoteSequence.FromString(cached)
+      _set_file_info(sequence, root_dir, sub_dir, full_file_path,
+                     'midi' if _is_midi_file(full_file_path) else 'musicxml')
+      tf.logging.info('Copied cached conversion of file %s.', full_file_path)
+      return content_hash, sequence.SerializeToString()
+
+  sequence = convert_file(root_dir, sub_dir, full_file_path, midi_engine)
+  serialized_sequence = (
+      None if sequence is None else sequence.SerializeToString())
+  if cache_path is not None:
+    _write_cache_entry(cache_path, serialized_sequence or b'')
+  return content_hash, serialized_sequence
+
+
+def output_shard_paths(output_file, num_shards):
+  """Returns the paths of the TFRecord shards written for `output_file`.
+
+  With a single shard this is `output_file` itself. Otherwise shard 3 of 16 of
+  '/tmp/notesequences.tfrecord' is written to
+  '/tmp/notesequences-00003-of-00016.tfrecord'.
+
+  Args:
+    output_file: Path to the TFRecord file given to `convert_directory`.
+    num_shards: The number of shards the output is split into.
+
+  Returns:
+    A list of `num_shards` file paths.
+  """
+  if num_shards == 1:
+    return [output_file]
+  base, extension = os.path.splitext(output_file)
+  return ['%s-%05d-of-%05d%s' % (base, shard, num_shards, extension)
+          for shard in range(num_shards)]
+
+
+def _stale_output_paths(output_file, num_shards):
+  """Returns the outputs of earlier runs that a new run would not overwrite.
+
+  These are the shards of runs to `output_file` with a different number of
+  shards, and the previous outputs kept by resumed runs that were interrupted.
+
+  Args:
+    output_file: Path to the TFRecord file given to `convert_directory`.
+    num_shards: The number of shards the new run splits the output into.
+
+  Returns:
+    A list of paths of existing files.
+  """
+  base, extension = os.path.splitext(output_file)
+  shard_pattern = '%s-?????-of-?????%s' % (base, extension)
+  output_paths = set(output_shard_paths(output_file, num_shards))
+  stale_paths = [path for path in tf.gfile.Glob(shard_pattern)
+                 if path not in output_paths]
+  stale_paths.extend(tf.gfile.Glob(shard_pattern + '.previous'))
+  if tf.gfile.Exists(output_file + '.previous'):
+    stale_paths.append(output_file + '.previous')
+  return sorted(stale_paths)
+
+
+def manifest_path(output_file):
+  """Returns the path of the resume manifest written next to `output_file`."""
+  return output_file + '.manifest'
+
+
+def _read_manifest(path):
+  """Reads the status of each file recorded in a resume manifest.
+
+  Every line of a manifest is a status, the content hash of the file if it was
+  computed, and the filename relative to the root directory, separated by tabs.
+  A last line without a newline was cut off by an interruption and is ignored.
+
+  Args:
+    path: Path to the manifest file.
+
+  Returns:
+    A dictionary mapping filenames to tuples (status, content_hash), where
+    status is `CONVERTED`, `SKIPPED` or `DUPLICATE` and content_hash is a hex
+    digest or an empty string. Empty if the manifest does not exist.
+  """
+  statuses = {}
+  if not tf.gfile.Exists(path):
+    return statuses
+  with tf.gfile.GFile(path, 'r') as f:
+    lines = f.read().split('\n')[:-1]
+  for line in lines:
+    fields = line.split('\t', 2)
+    if len(fields) == 3 and fields[0] in (CONVERTED, SKIPPED, DUPLICATE):
+      status, content_hash, filename = fields
+      statuses[filename] = (status, content_hash)
+  return statuses
+
+
+def _read_intact_records(paths):
+  """Yields the serialized records of TFRecord files that may be truncated.
+
+  A file written by an interrupted run can end with a partial record. Reading
+  each file stops at its first corrupt record.
+
+  Args:
+    paths: Paths to TFRecord files. Files that do not exist are ignored.
+
+  Yields:
+    Serialized records.
+  """
+  for path in paths:
+    if not tf.gfile.Exists(path):
+      continue
+    try:
+      for record in tf.python_io.tf_record_iterator(path):
+        yield record
+    except tf.errors.DataLossError:
+      tf.logging.warning("Ignoring truncated records at the end of '%s'", path)
+
+
+def _bounded_completions(pool, fn, args_iterator, max_in_flight):
+  """Submits calls to a pool and yields them as they complete.
+
+  At most `max_in_flight` calls are pending at any time, so `args_iterator` is
+  consumed lazily rather than queueing a future for every call up front.
+
+  Args:
+    pool: An Executor to submit the calls to.
+    fn: The callable to submit.
+    args_iterator: Iterates over tuples of arguments to call `fn` with.
+    max_in_flight: The maximum number of calls submitted but not yet yielded.
+
+  Yields:
+    Tuples (args, future) for each completed call.
+  """
+  future_to_args = {}
+  for args in args_iterator:
+    if len(future_to_args) >= max_in_flight:
+      done, _ = futures.wait(
+          list(future_to_args), return_when=futures.FIRST_COMPLETED)
+      for future in done:
+        yield future_to_args.pop(future), future
+    future_to_args[pool.submit(fn, *args)] = args
+  for future in futures.as_completed(future_to_args):
+    yield future_to_args[future], future
+
+
 def convert_directory(root_dir, output_file, num_threads,
-                      recursive=False):
+                      recursive=False, midi_engine=midi_io.PRETTY_MIDI_ENGINE,
+                      backend=THREAD_BACKEND, num_shards=1, resume=False,
+                      cache_dir=None, dedupe=False):
   """Converts files to NoteSequences and writes to `output_file`.
 
   Input files found in `root_dir` are converted to NoteSequence protos with the
@@ -159,34 +478,142 @@ def convert_directory(root_dir, output_file, num_threads,
   file from `root_dir` as the filename. If `recursive` is true, recursively
   converts any subdirectories of the specified directory.
 
+  The directory is walked lazily and only a bounded number of conversions are
+  in flight at once. If `num_shards` is greater than 1, the NoteSequences are
+  spread round-robin over the files returned by `output_shard_paths`.
+
+  Every input file is recorded in a manifest next to `output_file` once its
+  NoteSequence is written, or once it was found to be unconvertible. If
+  `resume` is true, the NoteSequences of an interrupted run with the same
+  `output_file` and `num_shards` that are both in its manifest and intact in
+  its output are kept, and their files are not converted again. Otherwise any
+  shards of earlier runs with a different `num_shards`, and any outputs kept
+  by interrupted resumed runs, are deleted.
+
+  If `cache_dir` is given, files whose contents were converted before by the
+  same converter version are copied from the cache instead of being parsed
+  again. If `dedupe` is true, the contents of each file are hashed before it is
+  converted, and files that are byte-identical to one found before are skipped
+  without being parsed.
+
   Args:
     root_dir: A string specifying a root directory.
     output_file: Path to TFRecord file to write results to.
-    num_threads: The number of threads to use for conversions.
+    num_threads: The number of threads or processes to use for conversions.
     recursive: A boolean specifying whether or not recursively convert files
         contained in subdirectories of the specified directory.
+    midi_engine: One of midi_io.MIDI_ENGINES, the engine to decode MIDI files
+        with.
+    backend: One of BACKENDS, the kind of worker pool to convert files with.
+    num_shards: The number of TFRecord files to split the output into.
+    resume: Whether to resume an interrupted conversion to `output_file`.
+    cache_dir: Optional directory to cache converted NoteSequences in.
+    dedupe: Whether to skip files that are byte-identical to one found before.
+
+  Raises:
+    ValueError: If `backend` is unknown or `num_shards` is not positive.
   """
-  with futures.ThreadPoolExecutor(max_workers=num_threads) as pool:
-    future_to_path = queue_conversions(root_dir, '', pool, recursive)
+  if backend == THREAD_BACKEND:
+    executor_class = futures.ThreadPoolExecutor
+  elif backend == PROCESS_BACKEND:
+    executor_class = futures.ProcessPoolExecutor
+  else:
+    raise ValueError('Unknown backend: %s' % backend)
+  if num_shards < 1:
+    raise ValueError('num_shards must be positive, got %d' % num_shards)
+
+  output_paths = output_shard_paths(output_file, num_shards)
+  previous_paths = [path + '.previous' for path in output_paths]
+  previous_statuses = {}
+  if resume:
+    previous_statuses = _read_manifest(manifest_path(output_file))
+    for path, previous_path in zip(output_paths, previous_paths):
+      # If a resumed run was itself interrupted while copying, the previous
+      # output is still complete and the partial copy is discarded.
+      if tf.gfile.Exists(path) and not tf.gfile.Exists(previous_path):
+        tf.gfile.Rename(path, previous_path)
+  else:
+    for path in _stale_output_paths(output_file, num_shards):
+      tf.logging.info("Deleting stale output '%s'.", path)
+      tf.gfile.Remove(path)
+
+  writers = [tf.python_io.TFRecordWriter(path) for path in output_paths]
+  manifest = tf.gfile.GFile(manifest_path(output_file), 'w')
+  done_filenames = set()
+  # Content hashes of the files that were converted or are being converted.
+  dedupe_hashes = set()
+  sequences_written = 0
+
+  def write(filename, status, content_hash, serialized_sequence=None):
+    if status == CONVERTED:
+      writers[sequences_written % num_shards].write(serialized_sequence)
+      if content_hash:
+        dedupe_hashes.add(content_hash)
+    # Files are only recorded as done once their NoteSequence is written.
+    manifest.write('%s\t%s\t%s\n' % (status, content_hash or '', filename))
+    done_filenames.add(filename)
 
-    with note_sequence_io.NoteSequenceRecordWriter(output_file) as writer:
-      sequences_written = 0
-      for future in futures.as_completed(future_to_path):
-        path = future_to_path[future]
+  try:
+    if resume:
+      for serialized_sequence in _read_intact_records(previous_paths):
+        filename = music_pb2.NoteSequence.FromString(
+            serialized_sequence).filename
+        status, content_hash = previous_statuses.get(filename, (None, None))
+        if status == CONVERTED and filename not in done_filenames:
+          write(filename, status, content_hash, serialized_sequence)
+          sequences_written += 1
+      for filename, (status, content_hash) in previous_statuses.items():
+        if status in (SKIPPED, DUPLICATE):
+          write(filename, status, content_hash)
+      for previous_path in previous_paths:
+        if tf.gfile.Exists(previous_path):
+          tf.gfile.Remove(previous_path)
+      tf.logging.info('Resuming with %d files already done.',
+                      len(done_filenames))
+
+    def conversions():
+      for sub_dir, full_file_path in iterate_files(root_dir, '', recursive):
+        filename = os.path.join(sub_dir, os.path.basename(full_file_path))
+        if filename in done_filenames:
+          continue
+        content_hash = None
+        if dedupe:
+          content_hash = _content_hash(full_file_path)
+          if content_hash in dedupe_hashes:
+            tf.logging.info('Skipping duplicate file %s.', full_file_path)
+            write(filename, DUPLICATE, content_hash)
+            continue
+          dedupe_hashes.add(content_hash)
+        yield (root_dir, sub_dir, full_file_path, midi_engine, cache_dir,
+               content_hash)
+
+    with executor_class(max_workers=num_threads) as pool:
+      for args, future in _bounded_completions(
+          pool, _convert_file_to_string, conversions(),
+          num_threads * _IN_FLIGHT_PER_WORKER):
+        sub_dir, full_file_path = args[1:3]
         try:
-          sequence = future.result()
+          content_hash, serialized_sequence = future.result()
         except Exception as exc:  # pylint: disable=broad-except
-          tf.logging.fatal('%r generated an exception: %s', path, exc)
-
-        if sequence:
-          writer.write(sequence)
+          tf.logging.fatal('%r generated an exception: %s', full_file_path, exc)
+          continue
+
+        filename = os.path.join(sub_dir, os.path.basename(full_file_path))
+        if serialized_sequence is None:
+          write(filename, SKIPPED, content_hash)
+        else:
+          write(filename, CONVERTED, content_hash, serialized_sequence)
           sequences_written += 1
         tf.logging.log_every_n(
-            tf.logging.INFO, "Wrote %d of %d NoteSequence protos to '%s'", 100,
-            sequences_written, len(future_to_path), output_file)
+            tf.logging.INFO, "Wrote %d NoteSequence protos to '%s'", 100,
+            sequences_written, output_file)
+  finally:
+    for writer in writers:
+      writer.close()
+    manifest.close()
 
-    tf.logging.info("Wrote %d NoteSequence protos to '%s'", sequences_written,
-                    output_file)
+  tf.logging.info("Wrote %d NoteSequence protos to '%s'", sequences_written,
+                  output_file)
 
 
 def main(unused_argv):
@@ -198,15 +625,29 @@ def main(unused_argv):
   if not FLAGS.output_file:
     tf.logging.fatal('--output_file required')
     return
+  if FLAGS.midi_engine not in midi_io.MIDI_ENGINES:
+    tf.logging.fatal('--midi_engine must be one of %s', midi_io.MIDI_ENGINES)
+    return
+  if FLAGS.backend not in BACKENDS:
+    tf.logging.fatal('--backend must be one of %s', BACKENDS)
+    return
+  if FLAGS.num_shards < 1:
+    tf.logging.fatal('--num_shards must be positive')
+    return
 
   input_dir = os.path.expanduser(FLAGS.input_dir)
   output_file = os.path.expanduser(FLAGS.output_file)
   output_dir = os.path.dirname(output_file)
+  cache_dir = None
+  if FLAGS.cache_dir:
+    cache_dir = os.path.expanduser(FLAGS.cache_dir)
 
   if output_dir:
     tf.gfile.MakeDirs(output_dir)
 
-  convert_directory(input_dir, output_file, FLAGS.num_threads, FLAGS.recursive)
+  convert_directory(input_dir, output_file, FLAGS.num_threads, FLAGS.recursive,
+                    FLAGS.midi_engine, FLAGS.backend, FLAGS.num_shards,
+                    FLAGS.resume, cache_dir, FLAGS.dedupe)
 
 
 def console_entry_point():
@@ -13,13 +13,16 @@
 # limitations under the License.
 """Tests for converting a directory of MIDIs to a NoteSequence TFRecord file."""
 
+import hashlib
 import os
 import tempfile
 
 # internal imports
 import tensorflow as tf
 
+from magenta.music import midi_io
 from magenta.music import note_sequence_io
+from magenta.protobuf import music_pb2
 from magenta.scripts import convert_dir_to_note_sequences
 
 
@@ -63,7 +66,10 @@ class ConvertMidiDirToSequencesTest(tf.test.TestCase):
     }
     self.root_dir = root_dir
 
-  def runTest(self, relative_root, recursive):
+  def runTest(self, relative_root, recursive,
+              midi_engine=midi_io.PRETTY_MIDI_ENGINE,
+              backend=convert_dir_to_note_sequences.THREAD_BACKEND,
+              num_shards=1, num_threads=1):
     """Tests the output for the given parameters."""
     root_dir = os.path.join(self.root_dir, relative_root)
     expected_filenames = self.expected_dir_midi_contents[relative_root]
@@ -76,10 +82,10 @@ class ConvertMidiDirToSequencesTest(tf.test.TestCase):
     with tempfile.NamedTemporaryFile(
         prefix='ConvertMidiDirToSequencesTest') as output_file:
       convert_dir_to_note_sequences.convert_directory(
-          root_dir, output_file.name, 1, recursive)
+          root_dir, output_file.name, num_threads, recursive, midi_engine,
+          backend, num_shards)
       actual_filenames = set()
-      for sequence in note_sequence_io.note_sequence_record_iterator(
-          output_file.name):
+      for sequence in self.readSequences(output_file.name, num_shards):
         self.assertEquals(
             note_sequence_io.generate_note_sequence_id(
                 sequence.filename, os.path.basename(relative_root), 'midi'),
@@ -90,6 +96,13 @@ class ConvertMidiDirToSequencesTest(tf.test.TestCase):
 
     self.assertEquals(expected_filenames, actual_filenames)
 
+  def readSequences(self, output_file, num_shards):
+    sequences = []
+    for path in convert_dir_to_note_sequences.output_shard_paths(
+        output_file, num_shards):
+      sequences.extend(note_sequence_io.note_sequence_record_iterator(path))
+    return sequences
+
   def testConvertMidiDirToSequences_NoRecurse(self):
     self.runTest('', recursive=False)
     self.runTest('sub_1', recursive=False)
@@ -102,6 +115,148 @@ class ConvertMidiDirToSequencesTest(tf.test.TestCase):
     self.runTest('sub_1/sub', recursive=True)
     self.runTest('sub_2', recursive=True)
 
+  def testConvertMidiDirToSequences_NativeMidiEngine(self):
+    self.runTest('', recursive=True, midi_engine=midi_io.NATIVE_ENGINE)
+
+  def testConvertMidiDirToSequences_ProcessBackend(self):
+    self.runTest('', recursive=True,
+                 backend=convert_dir_to_note_sequences.PROCESS_BACKEND)
+
+  def testConvertMidiDirToSequences_Sharded(self):
+    self.runTest('', recursive=True, num_shards=3)
+
+  def testConvertMidiDirToSequences_MultipleWorkers(self):
+    for backend in convert_dir_to_note_sequences.BACKENDS:
+      self.runTest('', recursive=True, backend=backend, num_threads=3)
+
+  def testConvertMidiDirToSequences_DeletesStaleOutputs(self):
+    output_file = os.path.join(self.get_temp_dir(), 'stale.tfrecord')
+    convert_dir_to_note_sequences.convert_directory(
+        self.root_dir, output_file, 1, recursive=True, num_shards=3)
+    # Leftovers of a resumed run that was interrupted.
+    stale_previous_paths = [
+        path + '.previous' for path in
+        convert_dir_to_note_sequences.output_shard_paths(output_file, 3)[:2]]
+    for path in stale_previous_paths:
+      tf.gfile.Copy(path[:-len('.previous')], path)
+
+    convert_dir_to_note_sequences.convert_directory(
+        self.root_dir, output_file, 1, recursive=True, num_shards=2)
+    output_dir_contents = set(tf.gfile.ListDirectory(self.get_temp_dir()))
+    for path in convert_dir_to_note_sequences.output_shard_paths(
+        output_file, 3) + stale_previous_paths:
+      self.assertNotIn(os.path.basename(path), output_dir_contents)
+    self.assertEquals(6, len(self.readSequences(output_file, 2)))
+
+  def testOutputShardPaths(self):
+    self.assertEquals(
+        ['/tmp/out.tfrecord'],
+        convert_dir_to_note_sequences.output_shard_paths(
+            '/tmp/out.tfrecord', 1))
+    self.assertEquals(
+        ['/tmp/out-00000-of-00002.tfrecord',
+         '/tmp/out-00001-of-00002.tfrecord'],
+        convert_dir_to_note_sequences.output_shard_paths(
+            '/tmp/out.tfrecord', 2))
+
+  def testConvertMidiDirToSequences_Resume(self):
+    output_file = os.path.join(self.get_temp_dir(), 'resume.tfrecord')
+    tf.gfile.FastGFile(
+        os.path.join(self.root_dir, 'invalid.mid'), mode='w').write('invalid')
+    convert_dir_to_note_sequences.convert_directory(
+        self.root_dir, output_file, 1, recursive=True, num_shards=2)
+
+    # Simulate an interruption that lost the record of sub_2/midi_3.mid from
+    # the manifest, and delete midi_1.mid, which is recorded as done.
+    manifest_path = convert_dir_to_note_sequences.manifest_path(output_file)
+    manifest_lines = [
+        line for line in tf.gfile.FastGFile(manifest_path).read().splitlines()
+        if not line.endswith('\tsub_2/midi_3.mid')]
+    self.assertIn('skipped\t\tinvalid.mid', manifest_lines)
+    tf.gfile.FastGFile(manifest_path, mode='w').write(
+        '\n'.join(manifest_lines) + '\nconver')
+    tf.gfile.Remove(os.path.join(self.root_dir, 'midi_1.mid'))
+
+    convert_dir_to_note_sequences.convert_directory(
+        self.root_dir, output_file, 1, recursive=True, num_shards=2,
+        resume=True)
+    filenames = [sequence.filename
+                 for sequence in self.readSequences(output_file, 2)]
+    self.assertEquals(
+        sorted(['midi_1.mid', 'midi_2.mid', 'sub_1/midi_3.mid',
+                'sub_2/midi_3.mid', 'sub_2/midi_4.mid',
+                'sub_1/sub/midi_5.mid']),
+        sorted(filenames))
+
+  def testConvertMidiDirToSequences_Cache(self):
+    output_file = os.path.join(self.get_temp_dir(), 'cache.tfrecord')
+    cache_dir = os.path.join(self.get_temp_dir(), 'cache')
+    tf.gfile.FastGFile(
+        os.path.join(self.root_dir, 'invalid.mid'), mode='w').write('invalid')
+    convert_dir_to_note_sequences.convert_directory(
+        self.root_dir, output_file, 1, recursive=True, cache_dir=cache_dir)
+    converted = dict((sequence.filename, sequence)
+                     for sequence in self.readSequences(output_file, 1))
+
+    # All the valid files have the same contents, so they share a cache entry.
+    # Replace it to check that the second run copies it instead of parsing.
+    midi_1_path = os.path.join(self.root_dir, 'midi_1.mid')
+    cache_path = convert_dir_to_note_sequences.conversion_cache_path(
+        cache_dir, hashlib.sha1(
+            tf.gfile.FastGFile(midi_1_path, 'rb').read()).hexdigest(),
+        midi_1_path)
+    cached_sequence = music_pb2.NoteSequence.FromString(
+        tf.gfile.FastGFile(cache_path, 'rb').read())
+    cached_sequence.total_time = 1234.0
+    tf.gfile.FastGFile(cache_path, mode='wb').write(
+        cached_sequence.SerializeToString())
+
+    convert_dir_to_note_sequences.convert_directory(
+        self.root_dir, output_file, 1, recursive=True, cache_dir=cache_dir)
+    sequences = self.readSequences(output_file, 1)
+    self.assertEquals(sorted(converted), sorted(s.filename for s in sequences))
+    for sequence in sequences:
+      self.assertEquals(1234.0, sequence.total_time)
+      self.assertEquals(converted[sequence.filename].id, sequence.id)
+      self.assertEquals(converted[sequence.filename].collection_name,
+                        sequence.collection_name)
+
+  def testConvertMidiDirToSequences_Dedupe(self):
+    output_file = os.path.join(self.get_temp_dir(), 'dedupe.tfrecord')
+    convert_dir_to_note_sequences.convert_directory(
+        self.root_dir, output_file, 1, recursive=True, dedupe=True)
+    self.assertEquals(1, len(self.readSequences(output_file, 1)))
+
+    manifest_path = convert_dir_to_note_sequences.manifest_path(output_file)
+    statuses = [line.split('\t')[0] for line in
+                tf.gfile.FastGFile(manifest_path).read().splitlines()]
+    self.assertEquals(
+        [convert_dir_to_note_sequences.CONVERTED] +
+        [convert_dir_to_note_sequences.DUPLICATE] * 5, sorted(statuses))
+
+  def testConvertMidiDirToSequences_DedupeSkipsParsing(self):
+    converted_paths = []
+    convert_file = convert_dir_to_note_sequences.convert_file
+
+    def counting_convert_file(root_dir, sub_dir, full_file_path, midi_engine):
+      converted_paths.append(full_file_path)
+      return convert_file(root_dir, sub_dir, full_file_path, midi_engine)
+
+    output_file = os.path.join(self.get_temp_dir(), 'dedupe_parse.tfrecord')
+    convert_dir_to_note_sequences.convert_file = counting_convert_file
+    try:
+      convert_dir_to_note_sequences.convert_directory(
+          self.root_dir, output_file, 2, recursive=True, dedupe=True)
+    finally:
+      convert_dir_to_note_sequences.convert_file = convert_file
+
+    # All six files have the same contents, so only the first is parsed.
+    self.assertEquals(1, len(converted_paths))
+    self.assertEquals(
+        [os.path.relpath(converted_paths[0], self.root_dir)],
+        [sequence.filename
+         for sequence in self.readSequences(output_file, 1)])
+
 
 if __name__ == '__main__':
   tf.test.main()
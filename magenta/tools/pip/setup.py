@@ -32,7 +32,7 @@ REQUIRED_PACKAGES = [
     'matplotlib >= 1.5.3',
     'mido == 1.2.6',
     'pandas >= 0.18.1',
-    'pretty_midi >= 0.2.6',
+    'pretty_midi >= 0.2.8',
     'python-rtmidi',
     'scipy >= 0.18.1',
     'tensorflow >= 1.1.0',